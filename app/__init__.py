@@ -43,7 +43,8 @@ def create_app():
                 'health': '/health',
                 'auth': '/api/auth',
                 'analysis': '/api/analysis',
-                'dossier': '/api/dossier'
+                'dossier': '/api/dossier',
+                'admin': '/api/admin'
             }
         }
     
@@ -53,7 +54,7 @@ def create_app():
         return {'status': 'healthy', 'message': 'Gradalyze API is running'}
     
     # Register blueprints
-    from app.routes import auth, dossier, users, ocr_cert, ocr_tor, objective_1, objective_1_cs, objective_2, objective_3, subject_codes
+    from app.routes import auth, dossier, users, ocr_cert, ocr_tor, objective_1, objective_1_cs, objective_2, objective_3, subject_codes, admin_metrics, career
     app.register_blueprint(auth.bp)
     app.register_blueprint(dossier.bp)
     app.register_blueprint(users.bp)
@@ -61,7 +62,9 @@ def create_app():
     app.register_blueprint(ocr_tor.bp)
     app.register_blueprint(objective_1.bp)
     app.register_blueprint(objective_1_cs.bp)
+    app.register_blueprint(career.bp)
     app.register_blueprint(objective_2.bp)
     app.register_blueprint(objective_3.bp)
+    app.register_blueprint(admin_metrics.bp)
     
     return app
@@ -0,0 +1,226 @@
+"""
+Admin Metrics
+Operational metrics for LLM usage (tokens, cost, retries), gateway health and model loading
+"""
+
+from flask import Blueprint, request, jsonify
+import os
+from app.routes.auth import admin_required
+from app.services.llm_gateway import get_llm_gateway
+from app.services.feature_builder import get_feature_cache
+from app.services.forecast_memo import get_forecast_memo
+from app.services.forecast_recompute import checkpoint_path, read_checkpoint, recompute_job_spec
+from app.services.llm_usage import get_usage_ledger
+from app.services.model_registry import get_model_registry, read_manifest, rollback_bundle
+from app.services.program_registry import get_program_registry
+from app.services.prompt_compaction import compaction_totals
+from app.services.shadow_eval import get_shadow_evaluator
+from app.services.training_jobs import get_training_queue
+
+bp = Blueprint('admin_metrics', __name__, url_prefix='/api/admin')
+
+MODELS_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', '..', 'models'))
+
+
+def _model_path(name):
+    """models/<name>.joblib for a manifest name such as 'dt_career' or 'cs/dt_career_cs_75f'; None if outside models/."""
+    name = (name or '').strip()
+    if not name:
+        return None
+    path = os.path.realpath(os.path.join(MODELS_DIR, name if name.endswith('.joblib') else f'{name}.joblib'))
+    return path if path.startswith(MODELS_DIR + os.sep) else None
+
+
+@bp.route('/llm-usage', methods=['GET'])
+@admin_required
+def get_llm_usage(current_user):
+    """Token/cost totals grouped by endpoint, user, day or caller.
+
+    Query params: group_by (endpoint|user|day|caller, default endpoint), day (YYYY-MM-DD),
+    user (email), top (number of heaviest individual calls to include, default 20).
+    """
+    try:
+        group_by = (request.args.get('group_by') or 'endpoint').strip().lower()
+        day = (request.args.get('day') or '').strip() or None
+        user = (request.args.get('user') or '').strip().lower() or None
+        top = request.args.get('top', default=20, type=int)
+
+        ledger = get_usage_ledger()
+        try:
+            summary = ledger.summary(group_by=group_by, day=day, user=user)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        summary['heaviest_calls'] = ledger.heaviest_calls(limit=max(0, top))
+        return jsonify(summary), 200
+    except Exception as e:
+        print(f"[ADMIN] LLM usage error: {e}")
+        return jsonify({'message': 'Failed to fetch LLM usage', 'error': str(e)}), 500
+
+
+@bp.route('/llm-metrics', methods=['GET'])
+@admin_required
+def get_llm_metrics(current_user):
+    """Gateway per-caller latency/error metrics, response cache stats and prompt compaction totals."""
+    try:
+        return jsonify({
+            'gateway': get_llm_gateway().metrics(),
+            'prompt_compaction': compaction_totals(),
+        }), 200
+    except Exception as e:
+        print(f"[ADMIN] LLM metrics error: {e}")
+        return jsonify({'message': 'Failed to fetch LLM metrics', 'error': str(e)}), 500
+
+
+@bp.route('/model-metrics', methods=['GET'])
+@admin_required
+def get_model_metrics(current_user):
+    """Career model registry (load times, load counts, cache hits, memory), forecast memo and feature cache."""
+    try:
+        return jsonify({**get_model_registry().stats(), 'forecast_memo': get_forecast_memo().stats(),
+                        'feature_cache': get_feature_cache().stats()}), 200
+    except Exception as e:
+        print(f"[ADMIN] Model metrics error: {e}")
+        return jsonify({'message': 'Failed to fetch model metrics', 'error': str(e)}), 500
+
+
+@bp.route('/training-jobs', methods=['GET'])
+@admin_required
+def get_training_jobs(current_user):
+    """Recent model training jobs with state, progress, fit time and OOB score (?limit=50)."""
+    try:
+        queue = get_training_queue()
+        limit = request.args.get('limit', default=50, type=int)
+        return jsonify({'cpu_cores': queue.cpu_cores, 'max_workers': queue.max_workers,
+                        'jobs': queue.list(limit=max(1, limit))}), 200
+    except Exception as e:
+        print(f"[ADMIN] Training jobs error: {e}")
+        return jsonify({'message': 'Failed to fetch training jobs', 'error': str(e)}), 500
+
+
+@bp.route('/model-versions', methods=['GET'])
+@admin_required
+def get_model_versions(current_user):
+    """Published versions per model (manifest), or one model with ?model=dt_career."""
+    try:
+        name = request.args.get('model')
+        if name:
+            path = _model_path(name)
+            if not path:
+                return jsonify({'message': 'Invalid model name'}), 400
+            return jsonify({'model': name, **read_manifest(path)}), 200
+        manifests = {}
+        for root, _, files in os.walk(MODELS_DIR):
+            for f in files:
+                if f.endswith('.manifest.json'):
+                    rel = os.path.relpath(os.path.join(root, f[:-len('.manifest.json')]), MODELS_DIR)
+                    manifest = read_manifest(os.path.join(MODELS_DIR, rel + '.joblib'))
+                    manifests[rel] = {'current': manifest.get('current'), 'versions': len(manifest.get('versions', []))}
+        return jsonify({'models': manifests}), 200
+    except Exception as e:
+        print(f"[ADMIN] Model versions error: {e}")
+        return jsonify({'message': 'Failed to fetch model versions', 'error': str(e)}), 500
+
+
+@bp.route('/model-versions/rollback', methods=['POST'])
+@admin_required
+def rollback_model_version(current_user):
+    """Make an earlier published version live again: {"model": "dt_career", "version": "..."}."""
+    try:
+        data = request.get_json(silent=True) or {}
+        path = _model_path(data.get('model'))
+        version = (data.get('version') or '').strip()
+        if not path or not version:
+            return jsonify({'message': 'model and version are required'}), 400
+        try:
+            record = rollback_bundle(path, version)
+        except (KeyError, FileNotFoundError) as e:
+            return jsonify({'message': str(e)}), 404
+        print(f"[ADMIN] {current_user} rolled {data.get('model')} back to {version}")
+        return jsonify({'message': 'Model rolled back', 'model': data.get('model'), 'current': record}), 200
+    except Exception as e:
+        print(f"[ADMIN] Model rollback error: {e}")
+        return jsonify({'message': 'Failed to roll back model', 'error': str(e)}), 500
+
+
+@bp.route('/recompute-forecasts', methods=['GET'])
+@admin_required
+def get_forecast_recompute_status(current_user):
+    """Checkpoint of the stale-forecast recompute per program (last user_id, counts, state)."""
+    try:
+        return jsonify({program: read_checkpoint(checkpoint_path(program)) or None
+                        for program in get_program_registry().programs()}), 200
+    except Exception as e:
+        print(f"[ADMIN] Recompute status error: {e}")
+        return jsonify({'message': 'Failed to fetch recompute status', 'error': str(e)}), 500
+
+
+@bp.route('/recompute-forecasts', methods=['POST'])
+@admin_required
+def start_forecast_recompute(current_user):
+    """Queue a stale-forecast recompute on the training worker: {"program": "IT", "max_minutes": 30}.
+
+    Resumes from the program's checkpoint; returns 202 with the job to poll via /training-jobs.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        program = (data.get('program') or 'IT').upper()
+        if program not in get_program_registry().programs():
+            return jsonify({'message': f'Unknown program {program}'}), 400
+        options = {}
+        if data.get('max_minutes'):
+            options['max_seconds'] = float(data['max_minutes']) * 60
+        if data.get('page_size'):
+            options['page_size'] = max(1, int(data['page_size']))
+        try:
+            spec = recompute_job_spec(program, **options)
+        except ValueError as e:
+            # No serving model yet (e.g. the CS variant is still warming up)
+            return jsonify({'message': str(e), 'program': program}), 409
+        job = get_training_queue().submit('forecast_recompute', spec,
+                                          meta={'requested_by': current_user, 'program': program})
+        print(f"[ADMIN] {current_user} queued {program} forecast recompute ({job['id']})")
+        return jsonify({'message': 'Forecast recompute queued', 'job': job}), 202
+    except Exception as e:
+        print(f"[ADMIN] Recompute queue error: {e}")
+        return jsonify({'message': 'Failed to queue forecast recompute', 'error': str(e)}), 500
+
+
+@bp.route('/shadow', methods=['GET'])
+@admin_required
+def get_shadow_report(current_user):
+    """Candidate vs production agreement (top-6 overlap, top-1, Spearman) and latency on live traffic."""
+    try:
+        recent = int(request.args.get('recent', 10))
+        return jsonify(get_shadow_evaluator().report(recent=max(0, recent))), 200
+    except Exception as e:
+        print(f"[ADMIN] Shadow report error: {e}")
+        return jsonify({'message': 'Failed to fetch shadow report', 'error': str(e)}), 500
+
+
+@bp.route('/shadow', methods=['POST'])
+@admin_required
+def set_shadow_candidate(current_user):
+    """Shadow a candidate: {"model": "versions/dt_career/<version>", "production": "dt_career"};
+    {"model": null} stops shadowing.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        evaluator = get_shadow_evaluator()
+        if not data.get('model'):
+            evaluator.set_candidate(None)
+            print(f"[ADMIN] {current_user} stopped shadow evaluation")
+            return jsonify({'message': 'Shadow evaluation stopped'}), 200
+        path = _model_path(data.get('model'))
+        production = _model_path(data.get('production') or 'dt_career')
+        if not path or not production:
+            return jsonify({'message': 'Invalid model name'}), 400
+        if not os.path.exists(path):
+            return jsonify({'message': f"Model {data.get('model')} not found"}), 404
+        if path == production:
+            return jsonify({'message': 'Candidate must differ from the production model'}), 400
+        candidate = evaluator.set_candidate(path, production_path=production, set_by=current_user)
+        print(f"[ADMIN] {current_user} is shadowing {data.get('model')} against {data.get('production') or 'dt_career'}")
+        return jsonify({'message': 'Shadow evaluation started', 'candidate': candidate}), 200
+    except Exception as e:
+        print(f"[ADMIN] Shadow candidate error: {e}")
+        return jsonify({'message': 'Failed to set shadow candidate', 'error': str(e)}), 500
@@ -6,6 +6,7 @@ from werkzeug.security import check_password_hash
 from app.services.supabase_client import get_supabase_client
 import jwt
 import datetime
+import os
 from functools import wraps
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -52,6 +53,40 @@ def token_required(f):
     
     return decorated
 
+def request_identity():
+    """Email from a valid Bearer token on the current request, else 'anonymous'.
+
+    For attributing work (e.g. LLM usage) on routes that do not require a login;
+    identities sent in the request body are not trusted.
+    """
+    token = request.headers.get('Authorization') or ''
+    if token.startswith('Bearer '):
+        token = token[7:]
+    if not token:
+        return 'anonymous'
+    try:
+        secret = current_app.config.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+        return jwt.decode(token, secret, algorithms=['HS256']).get('email') or 'anonymous'
+    except jwt.InvalidTokenError:
+        return 'anonymous'
+
+def admin_required(f):
+    """Decorator for admin-only routes: a valid JWT whose email is listed in ADMIN_EMAILS.
+
+    With no ADMIN_EMAILS configured every request is refused; set
+    ADMIN_ALLOW_ALL=true to accept any authenticated user (local development only).
+    """
+    @wraps(f)
+    @token_required
+    def decorated(current_user, *args, **kwargs):
+        admins = [e.strip().lower() for e in os.getenv('ADMIN_EMAILS', '').split(',') if e.strip()]
+        allow_all = os.getenv('ADMIN_ALLOW_ALL', 'false').lower() == 'true'
+        if not (allow_all or (current_user or '').lower() in admins):
+            return jsonify({'message': 'Admin access required'}), 403
+        return f(current_user, *args, **kwargs)
+    
+    return decorated
+
 
 @bp.route('/register', methods=['POST'])
 def register():
@@ -0,0 +1,160 @@
+"""
+Career Forecasting (all programs)
+One endpoint for every program in the program manifest; the program is taken
+from the request, detected from the TOR text, or inferred from the subjects
+in the grades, and the matching model is loaded on first use.
+"""
+
+from flask import Blueprint, request, jsonify
+from app.services.supabase_client import get_supabase_client
+from app.services.program_registry import get_program_registry
+from app.routes.objective_1_cs import MODEL_WARMING, TARGET_FEATURE_LEN, warming_response
+from app.services.model_registry import bundle_version
+from app.services.career_batch import bulk_write_forecasts, top_k_careers
+from app.services.feature_builder import (_usable_grade, fit_width, get_feature_builder, get_feature_cache,
+                                          tor_to_model_scale)
+from app.services.forecast_memo import forecast_key, get_forecast_memo
+import numpy as np
+import os
+
+bp = Blueprint('career', __name__, url_prefix='/api/career')
+
+SKIP_UNCHANGED_WRITE = os.getenv('CAREER_FORECAST_SKIP_UNCHANGED_WRITE', 'true').lower() == 'true'
+
+
+def _program_features(program, email, grades_data):
+    """(features, grades_count) on the program's canonical columns; positional when it has none."""
+    try:
+        builder = get_feature_builder(program)
+    except ValueError:
+        values = []
+        for g in grades_data if isinstance(grades_data, list) else []:
+            # Grade objects are on the TOR scale (1.00 best .. 5.00); plain numbers already on the model's 0..4
+            x = tor_to_model_scale(g.get('grade')) if isinstance(g, dict) else _usable_grade(g)
+            if x is not None:
+                values.append(x)
+        return np.asarray(values, dtype=np.float32), len(values)
+    features, mask, _ = get_feature_cache().get_or_build(builder, email, grades_data)
+    return features, int(mask.sum())
+
+
+def forecast_for_program(program, features):
+    """
+    Top 6 careers for one student with the program's model.
+    Returns ((labels, scores), error, meta) with meta = {model_version, forecast_key, memo_hit}.
+    """
+    meta = {}
+    registry = get_program_registry()
+    model_path, model_error = registry.serving_path(program)
+    if model_path is None:
+        return ([], []), model_error, meta
+    model_bundle, predict = registry.models.predictor(model_path)
+    if model_bundle is None:
+        return ([], []), f'No model available for program {program}', meta
+    model = model_bundle.get('model')
+    labels = model_bundle.get('labels')
+    if model is None or not labels:
+        return ([], []), 'Model bundle missing required keys {model, labels}', meta
+    n_features = int(getattr(model, 'n_features_in_', len(features)))
+    X = fit_width(np.asarray(features, dtype=np.float32).reshape(1, -1), n_features)
+
+    memo = get_forecast_memo()
+    meta['model_version'] = bundle_version(model_bundle)
+    meta['forecast_key'] = forecast_key(meta['model_version'], X[0], n_features)
+    cached = memo.get(meta['forecast_key'])
+    if cached is not None:
+        meta['memo_hit'] = True
+        return cached, None, meta
+
+    y_pred = np.asarray(predict(X))
+    if y_pred.ndim == 1:
+        return ([], []), 'Model output shape invalid (expected multi-target)', meta
+    top = top_k_careers(y_pred, labels)[0]
+    if top is None:
+        return ([], []), 'Model produced constant scores', meta
+    memo.put(meta['forecast_key'], *top)
+    return top, None, meta
+
+
+@bp.route('/programs', methods=['GET'])
+def list_programs():
+    """Programs from the manifest, whether their model exists and whether it is loaded"""
+    try:
+        return jsonify(get_program_registry().status()), 200
+    except Exception as e:
+        print(f"[CAREER] Programs error: {e}")
+        return jsonify({'message': 'Failed to list programs', 'error': str(e)}), 500
+
+
+@bp.route('/process', methods=['POST'])
+def process_career_forecast_any_program():
+    """Career forecast routed by program.
+
+    Body: {"email", "grades", optional "program" (e.g. "IT"), optional "full_text"
+    (the OCR text returned by /api/ocr-tor/process), optional "skip_unchanged_write"}.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        email = (data.get('email') or '').strip().lower()
+        grades_data = data.get('grades') or []
+
+        program, program_source = get_program_registry().detect(
+            program=data.get('program'), full_text=data.get('full_text'), grades=grades_data)
+        if not program:
+            return jsonify({'message': 'No programs configured'}), 503
+        print(f"[CAREER] Forecast for {email}: program {program} ({program_source})")
+
+        features, grades_count = _program_features(program, email, grades_data)
+        if not grades_count:
+            return jsonify({'message': 'Invalid or empty grades input', 'email': email, 'program': program,
+                            'grades_count': 0}), 422
+        (career_labels, career_probs), forecast_error, meta = forecast_for_program(program, features)
+        if forecast_error == MODEL_WARMING:
+            return warming_response(email, TARGET_FEATURE_LEN)
+        if not career_labels:
+            return jsonify({'message': forecast_error or 'Career forecast unavailable', 'email': email,
+                            'program': program, 'grades_count': grades_count}), 422
+
+        saved = False
+        write_skipped = False
+        skip_unchanged = data.get('skip_unchanged_write')
+        if skip_unchanged is None:
+            skip_unchanged = SKIP_UNCHANGED_WRITE
+        if email:
+            try:
+                supabase = get_supabase_client()
+                user_resp = supabase.table('users').select('user_id, career_forecast_key').eq('email', email).limit(1).execute()
+                if user_resp.data:
+                    row = user_resp.data[0]
+                    if skip_unchanged and meta.get('forecast_key') and row.get('career_forecast_key') == meta['forecast_key']:
+                        write_skipped = True
+                    else:
+                        write = bulk_write_forecasts(supabase, [{
+                            'user_id': row['user_id'],
+                            'career_top_jobs': career_labels,
+                            'career_top_jobs_scores': career_probs,
+                            'career_model_version': meta.get('model_version'),
+                            'career_forecast_key': meta.get('forecast_key'),
+                            'career_program': program,
+                        }])
+                        saved = write['written'] > 0
+                    get_forecast_memo().record_db_write(skipped=write_skipped)
+            except Exception as db_error:
+                print(f"[CAREER] Database save error: {db_error}")
+
+        return jsonify({
+            'message': 'Career forecast processed',
+            'email': email,
+            'program': program,
+            'program_source': program_source,
+            'grades_count': grades_count,
+            'career_top_jobs': career_labels,
+            'career_top_jobs_scores': career_probs,
+            'career_model_version': meta.get('model_version'),
+            'memoized': bool(meta.get('memo_hit')),
+            'saved': saved,
+            'write_skipped': write_skipped
+        }), 200
+    except Exception as e:
+        print(f"[CAREER] Error: {e}")
+        return jsonify({'message': 'Career forecast failed', 'error': str(e)}), 500
@@ -5,12 +5,18 @@ Handles career prediction and analysis based on academic performance
 
 from flask import Blueprint, request, jsonify
 from app.services.supabase_client import get_supabase_client
-from app.routes.auth import token_required
+from app.routes.auth import token_required, admin_required
+from app.services.model_registry import get_model_registry, bundle_version
+from app.services.career_batch import parse_batch_request, run_batch_forecast
+from app.services.training_jobs import get_training_queue
+from app.services.forecast_memo import forecast_key, get_forecast_memo
+from app.services.feature_builder import fit_width, get_feature_builder, get_feature_cache
+from app.services.forecast_explain import explain_forecast
+from app.services.shadow_eval import get_shadow_evaluator
 import json
 from datetime import datetime, timezone
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-from joblib import dump, load
 import os
 
 bp = Blueprint('objective_1', __name__, url_prefix='/api/objective-1')
@@ -30,40 +36,43 @@ JOBS_MASTER = [
 ]
 
 @bp.route('/bootstrap-model', methods=['POST'])
-def bootstrap_model():
-    """Create a lightweight decision-tree model and save it to dt_career.joblib.
-    Intended for development to unblock Objective 1 when no model exists."""
+@admin_required
+def bootstrap_model(current_user):
+    """Queue training of a lightweight RandomForest saved to dt_career.joblib.
+    Intended for development to unblock Objective 1 when no model exists.
+    Returns 202 with a job id; poll /train-jobs/<job_id> for progress."""
     try:
         feature_len = int(request.args.get('feature_len') or 70)
-        n_samples = max(500, feature_len * 20)
+        if feature_len <= 0:
+            return jsonify({'message': 'feature_len must be positive'}), 400
 
-        rng = np.random.default_rng(42)
-        X = rng.uniform(0.0, 4.0, size=(n_samples, feature_len)).astype(float)
+        job = get_training_queue().submit('it_bootstrap', {
+            'target_path': MODEL_PATH,
+            'labels': JOBS_MASTER,
+            # Synthetic multi-target signals: each job weights a sliding window of features
+            'dataset': {'type': 'synthetic_it', 'feature_len': feature_len, 'seed': 42},
+            'model_params': {'n_estimators': 120, 'max_depth': 18, 'random_state': 42},
+        }, meta={'feature_len': feature_len})
 
-        # Build synthetic multi-target signals: weight groups of features to jobs
-        n_labels = len(JOBS_MASTER)
-        Y = np.zeros((n_samples, n_labels), dtype=float)
-
-        for j in range(n_labels):
-            # Each job emphasizes a sliding window of features
-            start = (j * 3) % max(1, feature_len - 5)
-            end = min(feature_len, start + 10)
-            weights = np.linspace(1.0, 2.0, end - start)
-            signal = (X[:, start:end] * weights).mean(axis=1)
-            # Add small noise to vary targets
-            Y[:, j] = signal + rng.normal(0, 0.05, size=n_samples)
-
-        model = RandomForestRegressor(random_state=42, n_estimators=120, max_depth=18, n_jobs=-1)
-        model.fit(X, Y)
-
-        bundle = {'model': model, 'labels': JOBS_MASTER}
-        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-        dump(bundle, MODEL_PATH)
-
-        return jsonify({'message': 'Model bootstrapped (RandomForest)', 'labels_count': n_labels, 'model_path': MODEL_PATH}), 200
+        return jsonify({
+            'message': 'Model bootstrap queued (RandomForest)',
+            'job': job,
+            'status_url': f"/api/objective-1/train-jobs/{job['id']}",
+            'labels_count': len(JOBS_MASTER),
+            'model_path': MODEL_PATH,
+        }), 202
     except Exception as e:
         return jsonify({'message': 'Bootstrap failed', 'error': str(e)}), 500
 
+@bp.route('/train-jobs/<job_id>', methods=['GET'])
+@admin_required
+def get_training_job(current_user, job_id):
+    """Status, progress and metrics (fit_seconds, oob_score) of a training job."""
+    job = get_training_queue().get(job_id)
+    if not job:
+        return jsonify({'message': 'Training job not found', 'job_id': job_id}), 404
+    return jsonify(job), 200
+
 @bp.route('/latest', methods=['GET'])
 def get_latest_career_forecast():
     """Return latest saved career forecast for a user by email."""
@@ -73,7 +82,7 @@ def get_latest_career_forecast():
             return jsonify({'message': 'email is required'}), 400
 
         supabase = get_supabase_client()
-        resp = supabase.table('users').select('career_top_jobs, career_forecast_analyzed_at').eq('email', email).execute()
+        resp = supabase.table('users').select('career_top_jobs, career_forecast_analyzed_at, career_model_version').eq('email', email).execute()
         if not resp.data:
             return jsonify({'message': 'User not found', 'email': email}), 404
 
@@ -83,7 +92,8 @@ def get_latest_career_forecast():
         return jsonify({
             'email': email,
             'career_top_jobs': jobs,
-            'career_forecast_analyzed_at': row.get('career_forecast_analyzed_at')
+            'career_forecast_analyzed_at': row.get('career_forecast_analyzed_at'),
+            'career_model_version': row.get('career_model_version')
         }), 200
     except Exception as e:
         print(f"[OBJECTIVE-1] Latest fetch error: {e}")
@@ -99,39 +109,62 @@ def process_career_forecast():
         
         print(f"[OBJECTIVE-1] Career forecast processing for email: {email}")
         print(f"[OBJECTIVE-1] Received {len(grades_data)} grade records for career analysis")
-        if grades_data:
+        if grades_data and isinstance(grades_data, list):
             print(f"[OBJECTIVE-1] First grade record: {grades_data[0]}")
         
-        # Handle grades as simple array of numbers
-        grades = []
-        for grade_value in grades_data:
-            if isinstance(grade_value, (int, float)) and 0 <= grade_value <= 4:
-                grades.append(float(grade_value))
+        # Grade objects (or a numeric array in table order) -> canonical subject columns, cached per user
+        features, mask, feature_info = get_feature_cache().get_or_build(get_feature_builder('IT'), email, grades_data)
+        grades_count = int(mask.sum())
         
-        print(f"[OBJECTIVE-1] Processing {len(grades)} grade values: {grades}")
+        print(f"[OBJECTIVE-1] Processing {grades_count} grade values ({feature_info['mode']}, "
+              f"{feature_info['unmatched']} unmatched subjects)")
         
         # Career forecasting logic based on academic performance
-        (career_labels, career_probs), forecast_error = calculate_career_forecast(grades)
+        forecast_meta = {}
+        (career_labels, career_probs), forecast_error = calculate_career_forecast(
+            features if grades_count else [], meta=forecast_meta)
         
-        # Save to database
+        # Save to database (skipped when the row already holds this exact forecast)
+        saved = False
+        write_skipped = False
+        skip_unchanged = data.get('skip_unchanged_write')
+        if skip_unchanged is None:
+            skip_unchanged = SKIP_UNCHANGED_WRITE
         if career_labels:
             try:
                 supabase = get_supabase_client()
+                key = forecast_meta.get('forecast_key')
                 
                 # Get user by email
-                user_response = supabase.table('users').select('user_id').eq('email', email).execute()
+                try:
+                    user_response = supabase.table('users').select('user_id, career_forecast_key').eq('email', email).execute()
+                except Exception:
+                    # career_forecast_key column not migrated yet
+                    key = None
+                    user_response = supabase.table('users').select('user_id').eq('email', email).execute()
                 if user_response.data:
                     user_id = user_response.data[0]['user_id']
+                    stored_key = user_response.data[0].get('career_forecast_key')
                     
-                    # Save as array of top jobs (ordered)
-                    update_data = {
-                        'career_forecast_analyzed_at': datetime.now(timezone.utc).isoformat(),
-                        'career_top_jobs': career_labels,
-                        'career_top_jobs_scores': career_probs
-                    }
-                    
-                    supabase.table('users').update(update_data).eq('user_id', user_id).execute()
-                    print(f"[OBJECTIVE-1] Saved career forecast to database for user {user_id}")
+                    if skip_unchanged and key and stored_key == key:
+                        write_skipped = True
+                        print(f"[OBJECTIVE-1] Forecast unchanged for user {user_id}; skipped database write")
+                    else:
+                        # Save as array of top jobs (ordered)
+                        update_data = {
+                            'career_forecast_analyzed_at': datetime.now(timezone.utc).isoformat(),
+                            'career_top_jobs': career_labels,
+                            'career_top_jobs_scores': career_probs,
+                            'career_model_version': forecast_meta.get('model_version'),
+                            'career_program': 'IT'
+                        }
+                        if key is not None:
+                            update_data['career_forecast_key'] = key
+                        
+                        supabase.table('users').update(update_data).eq('user_id', user_id).execute()
+                        saved = True
+                        print(f"[OBJECTIVE-1] Saved career forecast to database for user {user_id}")
+                    get_forecast_memo().record_db_write(skipped=write_skipped)
                 else:
                     print(f"[OBJECTIVE-1] User not found for email: {email}")
             except Exception as db_error:
@@ -143,21 +176,100 @@ def process_career_forecast():
             return jsonify({
                 'message': msg,
                 'email': email,
-                'grades_count': len(grades)
+                'grades_count': grades_count
             }), status
 
-        return jsonify({
+        # Compare a candidate model on the same input off the request path (no-op unless configured)
+        try:
+            get_shadow_evaluator().mirror(features, MODEL_PATH)
+        except Exception as shadow_error:
+            print(f"[OBJECTIVE-1] Shadow mirror error: {shadow_error}")
+
+        response = {
             'message': 'Career forecast processed (Objective 1)',
             'email': email,
-            'grades_count': len(grades),
+            'grades_count': grades_count,
             'career_top_jobs': career_labels,
-            'career_top_jobs_scores': career_probs
-        }), 200
+            'career_top_jobs_scores': career_probs,
+            'career_model_version': forecast_meta.get('model_version'),
+            'memoized': bool(forecast_meta.get('memo_hit')),
+            'saved': saved,
+            'write_skipped': write_skipped
+        }
+        if data.get('explain'):
+            response['explanation'], explain_error = explain_career_forecast(features, mask, career_labels, forecast_meta)
+            if explain_error:
+                response['explanation_error'] = explain_error
+        return jsonify(response), 200
         
     except Exception as e:
         print(f"[OBJECTIVE-1] Error: {e}")
         return jsonify({'message': 'Career forecast failed', 'error': str(e)}), 500
 
+@bp.route('/explain', methods=['POST'])
+def explain_career_forecast_endpoint():
+    """Why these jobs: per-subject contributions for the top 6 (same body as /process; nothing is saved)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        email = (data.get('email') or '').strip().lower()
+        features, mask, _ = get_feature_cache().get_or_build(get_feature_builder('IT'), email, data.get('grades') or [])
+        grades_count = int(mask.sum())
+        forecast_meta = {}
+        (career_labels, career_probs), forecast_error = calculate_career_forecast(
+            features if grades_count else [], meta=forecast_meta)
+        if not career_labels:
+            return jsonify({'message': forecast_error or 'Career forecast unavailable', 'email': email,
+                            'grades_count': grades_count}), 422
+        explanation, explain_error = explain_career_forecast(features, mask, career_labels, forecast_meta)
+        if explanation is None:
+            return jsonify({'message': explain_error, 'email': email}), 422
+        return jsonify({
+            'message': 'Career forecast explained (Objective 1)',
+            'email': email,
+            'grades_count': grades_count,
+            'career_top_jobs': career_labels,
+            'career_top_jobs_scores': career_probs,
+            'career_model_version': forecast_meta.get('model_version'),
+            'explanation': explanation
+        }), 200
+    except Exception as e:
+        print(f"[OBJECTIVE-1] Explain error: {e}")
+        return jsonify({'message': 'Career forecast explanation failed', 'error': str(e)}), 500
+
+@bp.route('/process-batch', methods=['POST'])
+@admin_required
+def process_career_forecast_batch(current_user):
+    """Forecast a whole cohort in one call.
+
+    Body: {"items": [{"email": ..., "grades": [...]}, ...]} and/or {"emails": [...]}
+    (grades are read from users.grades when omitted), optional "save" (default true).
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items, error = parse_batch_request(data)
+        if error:
+            return jsonify({'message': error}), 400
+
+        model_bundle, predict = get_model_registry().predictor(MODEL_PATH)
+        if model_bundle is None:
+            return jsonify({'message': f'Model file not found at {MODEL_PATH}'}), 422
+        model = model_bundle.get('model')
+        labels = model_bundle.get('labels')
+        if model is None or not labels:
+            return jsonify({'message': 'Model bundle missing required keys {model, labels}'}), 422
+
+        supabase = get_supabase_client()
+        result = run_batch_forecast(supabase, items, predict, labels,
+                                    n_features=getattr(model, 'n_features_in_', 70),
+                                    model_version=bundle_version(model_bundle),
+                                    save=bool(data.get('save', True)))
+        print(f"[OBJECTIVE-1] Batch forecast by {current_user}: {result['forecasted']}/{result['requested']} "
+              f"forecasted, {result['saved']} saved ({result['write_mode']}) in {result['timings']['total_seconds']}s")
+        return jsonify({'message': 'Batch career forecast processed (Objective 1)', **result}), 200
+    except Exception as e:
+        print(f"[OBJECTIVE-1] Batch error: {e}")
+        return jsonify({'message': 'Batch career forecast failed', 'error': str(e)}), 500
+
 @bp.route('/save-results', methods=['POST'])
 def save_career_results():
     """Save career forecast results to database"""
@@ -204,6 +316,8 @@ def clear_career_results():
                 'career_forecast_analyzed_at': None,
                 'career_top_jobs': [],
                 'career_top_jobs_scores': [],
+                'career_model_version': None,
+                'career_forecast_key': None,
             }
             supabase.table('users').update(update_data).eq('user_id', user_id).execute()
             return jsonify({'message': 'Career results cleared (Objective 1)'}), 200
@@ -215,29 +329,39 @@ def clear_career_results():
         return jsonify({'message': 'Failed to clear career results', 'error': str(e)}), 500
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'models', 'dt_career.joblib')
+# /process skips rewriting users when career_forecast_key already matches (per request: skip_unchanged_write)
+SKIP_UNCHANGED_WRITE = os.getenv('CAREER_FORECAST_SKIP_UNCHANGED_WRITE', 'true').lower() == 'true'
 
-def calculate_career_forecast(grades):
+def calculate_career_forecast(grades, meta=None):
     """
     Career forecast via RandomForestRegressor over course-grade features.
-    - Input: fixed numeric grades aligned with ITStaticTable order.
+    - Input: numeric grades aligned with ITStaticTable order (a list, or the
+      canonical float32 vector from feature_builder).
     - Output: dict of career -> probability (0..1), top 6 only.
     No fallbacks: returns {} if model cannot run or input invalid.
+    meta (optional dict) receives 'model_version' of the bundle that produced the forecast,
+    'forecast_key' (model version + grade-vector hash, see forecast_memo) and 'memo_hit'.
     """
     try:
-        if not grades or not isinstance(grades, list):
-            return [], 'Invalid or empty grades input'
-        X = np.array([[float(g) for g in grades]])
+        if isinstance(grades, np.ndarray):
+            X = grades.astype(float).reshape(1, -1)
+        elif not grades or not isinstance(grades, list):
+            return ([], []), 'Invalid or empty grades input'
+        else:
+            X = np.array([[float(g) for g in grades]])
         if X.size == 0:
-            return [], 'Empty feature vector'
+            return ([], []), 'Empty feature vector'
 
-        # Load pre-trained model
-        if not os.path.exists(MODEL_PATH):
-            return [], f'Model file not found at {MODEL_PATH}'
-        model_bundle = load(MODEL_PATH)
+        # Pre-trained model, loaded once per process by the registry; predict runs on the flattened forest
+        model_bundle, predict = get_model_registry().predictor(MODEL_PATH)
+        if model_bundle is None:
+            return ([], []), f'Model file not found at {MODEL_PATH}'
         model: RandomForestRegressor = model_bundle.get('model')
         labels: list[str] = model_bundle.get('labels')
         if model is None or not labels:
-            return [], 'Model bundle missing required keys {model, labels}'
+            return ([], []), 'Model bundle missing required keys {model, labels}'
+        if meta is not None:
+            meta['model_version'] = bundle_version(model_bundle)
         # Validate feature compatibility
         n_features = 70
         if hasattr(model, "n_features_in_"):
@@ -258,21 +382,59 @@ def calculate_career_forecast(grades):
                 # Truncate
                 X = X[:, :n_features]
 
+        # Same model version + same normalized grades -> reuse the earlier forecast
+        memo = get_forecast_memo()
+        key = forecast_key(bundle_version(model_bundle), X[0], n_features)
+        if meta is not None:
+            meta['forecast_key'] = key
+        cached = memo.get(key)
+        if cached is not None:
+            if meta is not None:
+                meta['memo_hit'] = True
+            return cached, None
+
         # Predict per-career score (regression per label stacked)
-        y_pred = model.predict(X)
+        y_pred = predict(X)
         if y_pred.ndim == 1:
             # single target not supported for multi-career; treat as invalid
-            return [], 'Model output shape invalid (expected multi-target)'
+            return ([], []), 'Model output shape invalid (expected multi-target)'
         scores = y_pred[0]
         # Normalize to 0..1 via min-max if needed
         s_min, s_max = float(np.min(scores)), float(np.max(scores))
         if s_max == s_min:
-            return [], 'Model produced constant scores'
+            return ([], []), 'Model produced constant scores'
         probs = (scores - s_min) / (s_max - s_min)
         pairs = sorted(zip(labels, probs.tolist()), key=lambda x: x[1], reverse=True)
         top_pairs = pairs[:6]
         top_labels = [k for k, _ in top_pairs]
         top_probs = [round(float(v), 4) for _, v in top_pairs]
+        memo.put(key, top_labels, top_probs)
         return (top_labels, top_probs), None
     except Exception as e: # noqa: E722
         return ([], []), f'Model inference error: {e}'
+
+def explain_career_forecast(features, mask, top_labels, meta):
+    """
+    Per-subject contributions for the forecast's top jobs, from the flattened forest.
+    Cached in the forecast memo next to the forecast (same model version + grades key).
+    Returns (explanation, error).
+    """
+    memo = get_forecast_memo()
+    key = meta.get('forecast_key')
+    cached = memo.get_explanation(key)
+    if cached is not None:
+        return cached, None
+    try:
+        model_bundle, forest = get_model_registry().flat_forest(MODEL_PATH)
+        if model_bundle is None:
+            return None, f'Model file not found at {MODEL_PATH}'
+        if forest is None:
+            return None, 'Explanations need a tree model served by the flat engine (FOREST_ENGINE=flat)'
+        X = fit_width(np.asarray(features, dtype=np.float32).reshape(1, -1), forest.n_features)
+        explanation = explain_forecast(forest, X[0], model_bundle.get('labels') or [], top_labels,
+                                       columns=get_feature_builder('IT').columns, mask=mask)
+        explanation['career_model_version'] = bundle_version(model_bundle)
+        memo.put_explanation(key, explanation)
+        return explanation, None
+    except Exception as e:
+        return None, f'Explanation error: {e}'
@@ -8,16 +8,41 @@ namespace so the frontend can call program-specific routes if desired.
 from flask import Blueprint, request, jsonify
 from app.services.supabase_client import get_supabase_client
 from datetime import datetime, timezone
-from joblib import load, dump
 from app.routes.objective_1 import JOBS_MASTER
+from app.routes.auth import admin_required
+from app.services.model_registry import get_model_registry, bundle_version
+from app.services.model_variants import FeatureLengthModelStore
+from app.services.career_training import samples_to_arrays
+from app.services.training_ingest import detect_format, ingest_file, ingest_stream, save_arrays
+from app.services.training_jobs import get_training_queue
+from app.services.career_batch import parse_batch_request, run_batch_forecast
+from app.services.feature_builder import fit_width, get_feature_builder, get_feature_cache
+from app.services.program_registry import get_program_registry
 import numpy as np
 import os
+import uuid
 
 bp = Blueprint('objective_1_cs', __name__, url_prefix='/api/objective-1-cs')
 
 # CS-specific model path
 MODEL_PATH_CS = os.path.join(os.path.dirname(__file__), '..', '..', 'models', 'dt_career_cs.joblib')
 
+MODEL_WARMING = 'Model warming'
+WARMING_RETRY_AFTER_SECONDS = 15
+
+def warming_response(email, feature_len):
+    """202 while the canonical-width CS model is being trained."""
+    resp = jsonify({
+        'message': 'Model warming: the CS career model is being prepared. Retry shortly.',
+        'status': 'warming',
+        'email': email,
+        'feature_len': feature_len,
+        'warmup': CS_MODEL_STORE.state(feature_len),
+        'retry_after_seconds': WARMING_RETRY_AFTER_SECONDS,
+    })
+    resp.headers['Retry-After'] = str(WARMING_RETRY_AFTER_SECONDS)
+    return resp, 202
+
 @bp.route('/process', methods=['POST'])
 def process_career_forecast_cs():
     try:
@@ -25,21 +50,18 @@ def process_career_forecast_cs():
         email = (data.get('email') or '').strip().lower()
         grades_data = data.get('grades') or []
 
-        # Coerce numeric grades (0..4)
-        grades = []
-        for g in grades_data:
-            try:
-                x = float(g)
-            except Exception:
-                continue
-            if 0 <= x <= 4:
-                grades.append(x)
+        # Grade objects (or a numeric array in table order) -> canonical CS subject columns, as in /process-batch
+        features, mask, _ = get_feature_cache().get_or_build(get_feature_builder('CS'), email, grades_data)
+        grades_count = int(mask.sum())
 
-        # Inference identical to IT variant for now
-        (career_labels, career_probs), forecast_error = _run_model(grades)
+        forecast_meta = {}
+        (career_labels, career_probs), forecast_error = _run_model(features if grades_count else None,
+                                                                   meta=forecast_meta)
 
+        if forecast_error == MODEL_WARMING:
+            return warming_response(email, TARGET_FEATURE_LEN)
         if not career_labels:
-            return jsonify({'message': forecast_error or 'Career forecast unavailable', 'email': email, 'grades_count': len(grades)}), 422
+            return jsonify({'message': forecast_error or 'Career forecast unavailable', 'email': email, 'grades_count': grades_count}), 422
 
         # Persist denormalized result
         try:
@@ -50,7 +72,9 @@ def process_career_forecast_cs():
                 supabase.table('users').update({
                     'career_forecast_analyzed_at': datetime.now(timezone.utc).isoformat(),
                     'career_top_jobs': career_labels,
-                    'career_top_jobs_scores': career_probs
+                    'career_top_jobs_scores': career_probs,
+                    'career_model_version': forecast_meta.get('model_version'),
+                    'career_program': 'CS'
                 }).eq('user_id', user_id).execute()
         except Exception:
             pass
@@ -58,13 +82,60 @@ def process_career_forecast_cs():
         return jsonify({
             'message': 'Career forecast processed (Objective 1 - CS)',
             'email': email,
-            'grades_count': len(grades),
+            'grades_count': grades_count,
             'career_top_jobs': career_labels,
-            'career_top_jobs_scores': career_probs
+            'career_top_jobs_scores': career_probs,
+            'career_model_version': forecast_meta.get('model_version')
         }), 200
     except Exception as e:
         return jsonify({'message': 'Career forecast failed', 'error': str(e)}), 500
 
+@bp.route('/process-batch', methods=['POST'])
+@admin_required
+def process_career_forecast_cs_batch(current_user):
+    """Batch variant of /process; same body as /api/objective-1/process-batch.
+
+    Vectors are padded/truncated to the current CS model instead of retraining it per length.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items, error = parse_batch_request(data)
+        if error:
+            return jsonify({'message': error}), 400
+
+        model_path, model_error = _serving_model_path()
+        if model_error == MODEL_WARMING:
+            return warming_response(None, TARGET_FEATURE_LEN)
+        if model_path is None:
+            return jsonify({'message': model_error}), 422
+        model_bundle, predict = get_model_registry().predictor(model_path)
+        if model_bundle is None:
+            return jsonify({'message': f'Model file not found at {model_path}'}), 422
+        model = model_bundle.get('model')
+        labels = model_bundle.get('labels')
+        if model is None or not labels:
+            return jsonify({'message': 'Model bundle missing required keys {model, labels}'}), 422
+
+        supabase = get_supabase_client()
+        result = run_batch_forecast(supabase, items, predict, labels,
+                                    n_features=getattr(model, 'n_features_in_', TARGET_FEATURE_LEN),
+                                    model_version=bundle_version(model_bundle),
+                                    save=bool(data.get('save', True)), program='CS')
+        return jsonify({'message': 'Batch career forecast processed (Objective 1 - CS)', **result}), 200
+    except Exception as e:
+        return jsonify({'message': 'Batch career forecast failed', 'error': str(e)}), 500
+
+@bp.route('/model-status', methods=['GET'])
+def cs_model_status():
+    """Warm-up state of the CS model for ?feature_len=n (or all variants when omitted)."""
+    try:
+        feature_len = request.args.get('feature_len', type=int)
+        if feature_len:
+            return jsonify({'feature_len': feature_len, **CS_MODEL_STORE.state(feature_len)}), 200
+        return jsonify(CS_MODEL_STORE.stats()), 200
+    except Exception as e:
+        return jsonify({'message': 'Failed to fetch model status', 'error': str(e)}), 500
+
 @bp.route('/clear-results', methods=['POST'])
 def clear_career_results_cs():
     try:
@@ -81,13 +152,15 @@ def clear_career_results_cs():
             'career_forecast_analyzed_at': None,
             'career_top_jobs': [],
             'career_top_jobs_scores': [],
+            'career_model_version': None,
         }).eq('user_id', user_id).execute()
         return jsonify({'message': 'Career results cleared (Objective 1 - CS)'}), 200
     except Exception as e:
         return jsonify({'message': 'Failed to clear career results', 'error': str(e)}), 500
 
 @bp.route('/train', methods=['POST'])
-def train_career_model_cs():
+@admin_required
+def train_career_model_cs(current_user):
     """
     Train a CS-specific career forecasting model from labeled data.
 
@@ -100,6 +173,9 @@ def train_career_model_cs():
     }
     - grades: numeric vector aligned with the CS table order you use in the frontend
     - labels: dict of job -> score (0..1). Jobs not present default to 0.
+
+    Returns 202 with a job id; the forest is fitted by the training worker and
+    swapped into serving when done. Poll /train-jobs/<job_id>.
     """
     try:
         data = request.get_json(silent=True) or {}
@@ -110,76 +186,138 @@ def train_career_model_cs():
         # Use shared JOBS_MASTER for consistent label space with IT
         labels = list(JOBS_MASTER)
 
-        # Build X, Y
-        X_rows = []
-        Y_rows = []
-        for s in samples:
-            g = s.get('grades') or []
-            try:
-                vec = [float(x) for x in g]
-            except Exception:
-                vec = []
-            if not vec:
-                continue
-            # normalize invalid values
-            vec = [min(4.0, max(0.0, x)) for x in vec]
-            X_rows.append(vec)
-            lbs = s.get('labels') or {}
-            target = []
-            for name in labels:
-                try:
-                    v = float(lbs.get(name, 0.0))
-                except Exception:
-                    v = 0.0
-                target.append(min(1.0, max(0.0, v)))
-            Y_rows.append(target)
-
-        if not X_rows:
+        # Build X, Y (clamped, padded to the longest grade vector)
+        X, Y = samples_to_arrays(samples, labels)
+        if not len(X):
             return jsonify({'message': 'no valid samples with grades found'}), 400
+        feat_len = X.shape[1]
+
+        job = get_training_queue().submit('cs_train', {
+            'target_path': MODEL_PATH_CS,
+            'labels': labels,
+            'dataset': {'type': 'arrays', 'X': X, 'Y': Y},
+            'model_params': {'n_estimators': 180, 'max_depth': 22, 'random_state': 42},
+        }, meta={'feature_len': int(feat_len), 'samples': int(len(X))})
 
-        # Pad/truncate feature vectors to the same length
-        feat_len = max(len(r) for r in X_rows)
-        X = []
-        for r in X_rows:
-            if len(r) < feat_len:
-                X.append(r + [0.0] * (feat_len - len(r)))
-            else:
-                X.append(r[:feat_len])
-        X = np.array(X, dtype=float)
-        Y = np.array(Y_rows, dtype=float)
-
-        # Train multi-output regressor
-        from sklearn.ensemble import RandomForestRegressor
-        model = RandomForestRegressor(random_state=42, n_estimators=180, max_depth=22, n_jobs=-1)
-        model.fit(X, Y)
-
-        bundle = {'model': model, 'labels': labels}
-        os.makedirs(os.path.dirname(MODEL_PATH_CS), exist_ok=True)
-        from joblib import dump
-        dump(bundle, MODEL_PATH_CS)
-
-        return jsonify({'message': 'CS model trained', 'labels_count': len(labels), 'feature_len': int(feat_len), 'model_path': MODEL_PATH_CS}), 200
+        return jsonify({
+            'message': 'CS model training queued',
+            'job': job,
+            'status_url': f"/api/objective-1-cs/train-jobs/{job['id']}",
+            'labels_count': len(labels),
+            'feature_len': int(feat_len),
+            'model_path': MODEL_PATH_CS,
+        }), 202
     except Exception as e:
         return jsonify({'message': 'Training failed', 'error': str(e)}), 500
 
-def _run_model(grades):
+@bp.route('/train-stream', methods=['POST'])
+@admin_required
+def train_career_model_cs_stream(current_user):
+    """
+    Train the CS model from a large NDJSON or CSV dataset without a JSON `samples` body.
+
+    Sources (first match wins):
+    - multipart upload field `file` (.ndjson/.jsonl or .csv)
+    - raw request body (Content-Type application/x-ndjson or text/csv)
+    - ?path=<file> relative to TRAINING_DATA_DIR on the server
+    Query params: format (ndjson|csv), feature_len (fixed width), max_rows.
+    Rows are packed into float32 arrays chunk by chunk and handed to the
+    training worker as .npy files; returns 202 with a job id and an ingestion report.
+    """
     try:
-        if not grades or not isinstance(grades, list):
+        # Datasets are far larger than the app-wide 25 MB form limit
+        request.max_content_length = int(os.getenv('TRAINING_UPLOAD_MAX_MB', 1024)) * 1024 * 1024
+        fmt = (request.args.get('format') or '').strip().lower() or None
+        feature_len = request.args.get('feature_len', type=int)
+        max_rows = request.args.get('max_rows', type=int)
+        labels = list(JOBS_MASTER)
+        options = {'feature_len': feature_len, 'max_rows': max_rows}
+
+        rel_path = (request.args.get('path') or '').strip()
+        if 'file' in request.files:
+            upload = request.files['file']
+            source = upload.filename or 'upload'
+            X, Y, report = ingest_stream(upload.stream, labels,
+                                         fmt=fmt or detect_format(upload.filename, upload.content_type), **options)
+        elif rel_path:
+            data_dir = os.getenv('TRAINING_DATA_DIR')
+            if not data_dir:
+                return jsonify({'message': 'TRAINING_DATA_DIR is not configured for server-side files'}), 400
+            root = os.path.realpath(data_dir)
+            full_path = os.path.realpath(os.path.join(root, rel_path))
+            if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path):
+                return jsonify({'message': 'Training file not found', 'path': rel_path}), 404
+            source = rel_path
+            X, Y, report = ingest_file(full_path, labels, fmt=fmt, **options)
+        elif request.content_length:
+            source = 'request body'
+            X, Y, report = ingest_stream(request.stream, labels,
+                                         fmt=fmt or detect_format(content_type=request.content_type), **options)
+        else:
+            return jsonify({'message': 'Provide a file upload, an NDJSON/CSV body, or ?path='}), 400
+
+        if not len(X):
+            return jsonify({'message': 'no valid samples with grades found', 'ingest': report}), 400
+
+        queue = get_training_queue()
+        arrays = save_arrays(X, Y, os.path.join(queue.state_dir, 'datasets'), uuid.uuid4().hex[:16])
+        job = queue.submit('cs_train', {
+            'target_path': MODEL_PATH_CS,
+            'labels': labels,
+            'dataset': {'type': 'npy', 'cleanup': True, **arrays},
+            'model_params': {'n_estimators': 180, 'max_depth': 22, 'random_state': 42},
+        }, meta={'feature_len': report['feature_len'], 'samples': report['rows'], 'source': source})
+        print(f"[OBJECTIVE-1-CS] Streamed {report['rows']} samples from {source} for training ({report['array_bytes']} bytes)")
+
+        return jsonify({
+            'message': 'CS model training queued',
+            'job': job,
+            'status_url': f"/api/objective-1-cs/train-jobs/{job['id']}",
+            'ingest': report,
+            'model_path': MODEL_PATH_CS,
+        }), 202
+    except Exception as e:
+        return jsonify({'message': 'Training failed', 'error': str(e)}), 500
+
+@bp.route('/train-jobs/<job_id>', methods=['GET'])
+@admin_required
+def get_training_job_cs(current_user, job_id):
+    """Status, progress and metrics (fit_seconds, oob_score) of a CS training job."""
+    job = get_training_queue().get(job_id)
+    if not job:
+        return jsonify({'message': 'Training job not found', 'job_id': job_id}), 404
+    return jsonify(job), 200
+
+def _serving_model_path():
+    """(path, error) of the bundle CS forecasts are served from, for /process and /process-batch alike:
+    a /train-produced dt_career_cs.joblib, else the bootstrapped canonical-width variant."""
+    if os.path.exists(MODEL_PATH_CS):
+        return MODEL_PATH_CS, None
+    state = CS_MODEL_STORE.ensure(TARGET_FEATURE_LEN)
+    if state != 'ready':
+        return None, MODEL_WARMING if state == 'warming' else 'Model warm-up failed; retry later'
+    return CS_MODEL_STORE.resolve(TARGET_FEATURE_LEN), None
+
+def _run_model(features, meta=None):
+    """Top 6 careers for one canonical CS feature vector (feature_builder), padded/truncated to the model."""
+    try:
+        if features is None or not len(features):
             return ([], []), 'Invalid or empty grades input'
-        X = np.array([[float(g) for g in grades]])
-        if X.size == 0:
-            return ([], []), 'Empty feature vector'
-        # Ensure a CS model exists; if not, bootstrap a fresh CS model tuned to input length
-        _ensure_model(len(grades))
-        model_path = MODEL_PATH_CS
-        if not os.path.exists(model_path):
+        model_path, model_error = _serving_model_path()
+        if model_path is None:
+            return ([], []), model_error
+        model_bundle, predict = get_model_registry().predictor(model_path)
+        if model_bundle is None:
             return ([], []), f'Model file not found at {model_path}'
-        model_bundle = load(model_path)
         model = model_bundle.get('model')
         labels = model_bundle.get('labels')
         if model is None or not labels:
             return ([], []), 'Model bundle missing required keys {model, labels}'
-        y_pred = model.predict(X)
+        if meta is not None:
+            meta['model_version'] = bundle_version(model_bundle)
+        X = fit_width(np.asarray(features, dtype=np.float32).reshape(1, -1),
+                      getattr(model, 'n_features_in_', TARGET_FEATURE_LEN))
+        y_pred = predict(X)
         if y_pred.ndim == 1:
             return ([], []), 'Model output shape invalid (expected multi-target)'
         scores = y_pred[0]
@@ -198,48 +336,32 @@ def _run_model(grades):
 # Default fallback feature length if no hint provided
 TARGET_FEATURE_LEN = 75
 
-def _ensure_model(feature_len_hint: int | None = None):
-    """Guarantee a CS model file exists.
-    If missing, bootstrap a small CS bundle with default labels.
+def _bootstrap_variant(feature_len: int):
+    """Train the synthetic CS bundle for ``feature_len`` inputs in the training worker process.
+
+    Runs on the warm-up thread, which waits for the job; the worker publishes the file itself.
     """
-    try:
-        # Determine desired feature length (prefer runtime hint)
-        desired_len = int(feature_len_hint) if feature_len_hint and feature_len_hint > 0 else TARGET_FEATURE_LEN
-
-        # Case 1: CS model exists and matches desired feature length
-        if os.path.exists(MODEL_PATH_CS):
-            try:
-                bundle = load(MODEL_PATH_CS)
-                model = bundle.get('model')
-                n_in = getattr(model, 'n_features_in_', None)
-                if n_in == desired_len:
-                    return
-                # else retrain/refresh to desired length
-            except Exception:
-                pass
-        # Case 2: bootstrap lightweight CS model
-        from sklearn.ensemble import RandomForestRegressor
-        seed = 42
-        feature_len = desired_len
-        n_samples = max(800, feature_len * 30)
-        rng = np.random.default_rng(seed)
-        X = rng.uniform(0.0, 4.0, size=(n_samples, feature_len)).astype(float)
-        labels = list(JOBS_MASTER)
-        Y = np.zeros((n_samples, len(labels)), dtype=float)
-        for j, _ in enumerate(labels):
-            start = (j * 3) % max(1, feature_len - 8)
-            end = min(feature_len, start + 12)
-            weights = np.linspace(0.6, 1.8, end - start)
-            base = (X[:, start:end] * weights).mean(axis=1)
-            noise = rng.normal(0, 0.05, size=n_samples)
-            Y[:, j] = np.tanh(base / 3.0) + noise
-        model = RandomForestRegressor(random_state=seed, n_estimators=160, max_depth=20, n_jobs=-1)
-        model.fit(X, Y)
-        bundle = {'model': model, 'labels': labels}
-        os.makedirs(os.path.dirname(MODEL_PATH_CS), exist_ok=True)
-        dump(bundle, MODEL_PATH_CS)
-    except Exception:
-        # Best-effort; processing will surface errors if still missing
-        pass
+    queue = get_training_queue()
+    job = queue.submit('cs_variant', {
+        'target_path': CS_MODEL_STORE.path_for(feature_len),
+        'labels': list(JOBS_MASTER),
+        'dataset': {'type': 'synthetic_cs', 'feature_len': int(feature_len), 'seed': 42},
+        'model_params': {'n_estimators': 160, 'max_depth': 20, 'random_state': 42},
+    }, meta={'feature_len': int(feature_len)})
+    job = queue.wait(job['id'])
+    if job.get('state') != 'succeeded':
+        raise RuntimeError(job.get('error') or f"training job {job['id']} {job.get('state')}")
+    return None
 
+# One bootstrapped model per supported grade-vector length (models/cs/dt_career_cs_<n>f.joblib),
+# i.e. the canonical CS width; a /train-produced dt_career_cs.joblib is used whenever its length matches.
+CS_MODEL_STORE = FeatureLengthModelStore(
+    directory=os.path.join(os.path.dirname(MODEL_PATH_CS), 'cs'),
+    prefix='dt_career_cs',
+    trainer=_bootstrap_variant,
+    fallback_path=MODEL_PATH_CS,
+    allowed_lengths=(TARGET_FEATURE_LEN,),
+)
 
+# /api/career and the forecast recompute resolve CS the same way as this blueprint
+get_program_registry().register_resolver('CS', _serving_model_path)
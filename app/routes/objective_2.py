@@ -3,87 +3,91 @@
 
 from flask import Blueprint, request, jsonify
 from app.services.supabase_client import get_supabase_client
+from app.routes.auth import admin_required, request_identity
+from app.services.llm_gateway import get_llm_gateway
+from app.services.llm_usage import usage_scope
+from app.services.archetype_analysis import (format_transcript, load_notes, normalize_llm_analysis, riasec_prompt,
+                                            stored_analysis, transcript_hash)
+from app.services.archetype_population import get_archetype_population
+from app.services.archetype_batch import run_batch_archetypes
+from app.services.career_batch import parse_batch_request
+from app.services.riasec_scorer import get_riasec_scorer
 import json
 from datetime import datetime, timezone
 import os
-import google.generativeai as genai
 
 bp = Blueprint('objective_2', __name__, url_prefix='/api/objective-2')
 
-# --- INITIALIZE GEMINI ---
-try:
-    GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-    if GEMINI_API_KEY:
-        genai.configure(api_key=GEMINI_API_KEY)
-        # Use the same model logic as ocr_tor.py (User preference)
-        selected_model = os.getenv('GEMINI_MODEL_NAME', 'models/gemini-2.5-flash')
-        gemini_model = genai.GenerativeModel(selected_model)
-        print(f"[OBJECTIVE-2] Gemini model initialized: {selected_model}")
-    else:
-        gemini_model = None
-except Exception as e:
-    gemini_model = None
-    print(f"[OBJECTIVE-2] Failed to init Gemini: {e}")
+# --- LLM GATEWAY (shared with ocr_tor) ---
+llm_gateway = get_llm_gateway()
+
+# 'lexicon' scores RIASEC locally (riasec_scorer) and calls the LLM only for "enrich";
+# 'llm' sends the whole transcript to Gemini
+ARCHETYPE_SCORER = os.getenv('ARCHETYPE_SCORER', 'lexicon').lower()
 
 @bp.route('/process', methods=['POST'])
 def process_archetype_analysis():
-    """Process RIASEC archetype analysis (UNIVERSAL)"""
+    """Process RIASEC archetype analysis (UNIVERSAL)
+
+    Body: {"email", "grades", optional "scorer" ("lexicon" | "llm", default
+    ARCHETYPE_SCORER), "enrich" (ask the LLM for transferable skills and
+    cross-disciplinary careers of a lexicon analysis), "refresh"}.
+    A stored analysis made from the same normalized transcript is returned
+    without recomputing it; send "refresh": true to recompute it anyway.
+    """
     try:
         data = request.get_json(silent=True) or {}
         email = (data.get('email') or '').strip().lower()
         grades_data = data.get('grades') or []
         
-        # 1. Format Data
-        transcript_text = ""
-        if grades_data and isinstance(grades_data[0], dict):
-            lines = []
-            for item in grades_data:
-                subject = item.get('subject', 'Unknown')
-                grade = item.get('grade', 'N/A')
-                lines.append(f"- {subject}: {grade}")
-            transcript_text = "\n".join(lines)
-        else:
-            transcript_text = f"{grades_data}"
-
-        # 2. Ask Gemini
-        archetype_analysis = calculate_riasec_with_gemini(transcript_text)
-        
-        # 3. Get Population Stats
-        population_counts = {}
-        try:
-            supabase = get_supabase_client()
-            # Group by primary_archetype and count
-            # Note: Supabase-py might not support complex group_by easily without rpc, 
-            # so we might need to fetch all or use a known rpc if available.
-            # For now, let's try a simple select of primary_archetype and aggregate in python 
-            # if the dataset is small, OR separate counts. 
-            # Optimized way: use .select('primary_archetype', count='exact') with .eq? No.
-            # Let's just fetch all primary_archetypes for now (assuming < 10k users).
-            # If scaling is needed, we should create a Postgres View or RPC.
-            
-            # Fetching all primary archetypes to count
-            rows = supabase.table('users').select('primary_archetype').execute()
-            print(f"[OBJECTIVE-2] Population Stats - Rows found: {len(rows.data) if rows.data else 0}")
-            if rows.data:
-                counts = {}
-                for r in rows.data:
-                    pa = r.get('primary_archetype')
-                    if pa:
-                        # Normalize to Title Case
-                        pa = pa.capitalize()
-                        counts[pa] = counts.get(pa, 0) + 1
-                population_counts = counts
-                print(f"[OBJECTIVE-2] Population Counts: {population_counts}")
-        except Exception as e:
-            print(f"[OBJECTIVE-2] Stats Error: {e}")
+        refresh = bool(data.get('refresh')) or (request.args.get('refresh') or '').lower() in ('1', 'true', 'yes')
+        enrich = bool(data.get('enrich'))
+        # Local scoring takes well under a millisecond; transcripts without lexicon subjects go to the LLM
+        lexicon_analysis = None
+        if (data.get('scorer') or ARCHETYPE_SCORER).lower() != 'llm':
+            lexicon_analysis = get_riasec_scorer().score(grades_data)
+        method = lexicon_analysis['method'] if lexicon_analysis else None
+        digest = transcript_hash(grades_data, method=method)
 
-        # 4. Save to Database (Existing Logic)
-        if archetype_analysis:
+        # 1. Reuse the stored analysis when the transcript has not changed since it was made
+        user_row = None
+        if email:
             try:
                 supabase = get_supabase_client()
-                user_resp = supabase.table('users').select('user_id, tor_notes').eq('email', email).execute()
+                user_resp = supabase.table('users').select('user_id, tor_notes, primary_archetype').eq('email', email).execute()
                 if user_resp.data:
                     user_row = user_resp.data[0]
+            except Exception as e:
+                print(f"[OBJECTIVE-2] User lookup error: {e}")
+        archetype_analysis = None
+        if user_row and not refresh:
+            archetype_analysis = stored_analysis(load_notes(user_row.get('tor_notes')), digest)
+        cached = archetype_analysis is not None
+        if cached:
+            print(f"[OBJECTIVE-2] Transcript unchanged for {email}; returning stored analysis")
+
+        # 2. Use the lexicon scores, or ask Gemini for the whole analysis
+        changed = not cached
+        if not cached and lexicon_analysis:
+            archetype_analysis = lexicon_analysis
+        elif not cached:
+            transcript_text = format_transcript(grades_data)
+            with usage_scope(user=request_identity()):
+                archetype_analysis = calculate_riasec_with_gemini(transcript_text)
+
+        # Skills and careers of a lexicon analysis come from the LLM, only when asked for
+        if enrich and archetype_analysis and archetype_analysis.get('method') and not archetype_analysis.get('enriched'):
+            with usage_scope(user=request_identity()):
+                enriched = enrich_riasec_with_gemini(archetype_analysis)
+            if enriched is not archetype_analysis:
+                archetype_analysis = enriched
+                changed = True
+        
+        # 3. Save to Database (nothing to save when the stored analysis was reused as is)
+        if archetype_analysis and changed:
+            try:
+                supabase = get_supabase_client()
+                if user_row:
                     user_id = user_row['user_id']
                     
                     update_data = {
@@ -104,136 +108,132 @@ def process_archetype_analysis():
                     
                     # Merge into JSON (tor_notes) for full object storage
                     try:
-                        existing_notes = user_row.get('tor_notes') or '{}'
-                        notes_obj = json.loads(existing_notes) if isinstance(existing_notes, str) else (existing_notes or {})
+                        notes_obj = load_notes(user_row.get('tor_notes'))
                         ar = notes_obj.get('analysis_results') or {}
                         
                         # Inject population stats into the saved object? Maybe not strictly necessary to save stats 
                         # as they change, but we definitely save the contributing subjects.
                         ar['archetype_analysis'] = archetype_analysis
+                        ar['archetype_transcript_hash'] = digest
                         notes_obj['analysis_results'] = ar
                         update_data['tor_notes'] = json.dumps(notes_obj)
                     except:
                         pass
 
                     supabase.table('users').update(update_data).eq('user_id', user_id).execute()
+                    get_archetype_population().record_change(user_row.get('primary_archetype'),
+                                                              update_data['primary_archetype'])
             except Exception as e:
                 print(f"[OBJECTIVE-2] DB Save Error: {e}")
 
+        # 4. Get Population Stats (trigger-maintained counter table via RPC, cached; see archetype_population)
+        population_counts = {}
+        try:
+            population_counts = get_archetype_population().counts(get_supabase_client())
+            print(f"[OBJECTIVE-2] Population Counts: {population_counts}")
+        except Exception as e:
+            print(f"[OBJECTIVE-2] Stats Error: {e}")
+
         return jsonify({
             'message': 'Archetype analysis processed (Universal AI)',
             'email': email,
             'archetype_analysis': archetype_analysis,
-            'population_counts': population_counts
+            'population_counts': population_counts,
+            'cached': cached
         }), 200
 
     except Exception as e:
         return jsonify({'message': 'Analysis failed', 'error': str(e)}), 500
 
 
-def generate_with_retry(model, prompt, retries=3, initial_delay=60):
-    """
-    Wraps model.generate_content with retry logic for 429 Rate Limit errors.
+@bp.route('/process-batch', methods=['POST'])
+@admin_required
+def process_archetype_batch(current_user):
+    """Analyze a whole cohort in one call.
+
+    Body: {"items": [{"email": ..., "grades": [...]}, ...]} and/or {"emails": [...]}
+    (grades are read from users.grades when omitted), optional "scorer"
+    ("lexicon" | "llm", default ARCHETYPE_SCORER), "save" (default true) and "refresh".
     """
-    import time
-    if not model: return None
-    
-    current_delay = initial_delay
-    
-    for attempt in range(retries):
-        try:
-            # Add strict timeout
-            return model.generate_content(prompt, request_options={"timeout": 600})
-        except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "quota" in error_str.lower():
-                print(f"[OBJECTIVE-2] Rate Limit Hit (429). Waiting {current_delay}s before retry {attempt+1}/{retries}...")
-                time.sleep(current_delay)
-                current_delay *= 2 # Exponential backoff
-            else:
-                print(f"[OBJECTIVE-2] Gemini Error (Non-Retryable): {e}")
-                raise e
-    
-    print("[OBJECTIVE-2] Max retries exceeded for Gemini API.")
-    return None
+    try:
+        data = request.get_json(silent=True) or {}
+        items, error = parse_batch_request(data)
+        if error:
+            return jsonify({'message': error}), 400
+
+        with usage_scope(user=current_user, endpoint='objective_2.process-batch'):
+            result = run_batch_archetypes(get_supabase_client(), items,
+                                          scorer=(data.get('scorer') or ARCHETYPE_SCORER).lower(),
+                                          llm=llm_gateway,
+                                          save=bool(data.get('save', True)),
+                                          refresh=bool(data.get('refresh')))
+        print(f"[OBJECTIVE-2] Batch analysis by {current_user}: {result['analyzed']} analyzed, "
+              f"{result['cached']} unchanged of {result['requested']}, {result['llm_requests']} LLM requests, "
+              f"{result['saved']} saved ({result['write_mode']}) in {result['timings']['total_seconds']}s")
+        return jsonify({'message': 'Batch archetype analysis processed (Objective 2)', **result}), 200
+    except Exception as e:
+        print(f"[OBJECTIVE-2] Batch error: {e}")
+        return jsonify({'message': 'Batch archetype analysis failed', 'error': str(e)}), 500
+
 
 def calculate_riasec_with_gemini(transcript_text):
-    if not gemini_model:
+    if not llm_gateway.is_available():
         return {}
         
+    prompt = riasec_prompt(transcript_text)
+    
+    try:
+        data = llm_gateway.generate_json(prompt, caller='objective_2.riasec')
+        if not isinstance(data, dict):
+             return {}
+        
+        return normalize_llm_analysis(data)
+    except Exception as e:
+        print(f"[OBJECTIVE-2] AI Analysis Failed: {e}")
+        return {}
+
+def enrich_riasec_with_gemini(analysis):
+    """Add transferable skills and cross-disciplinary careers to a locally scored analysis.
+
+    Only the profile is sent (percentages and contributing subjects), not the
+    transcript. Returns the analysis unchanged when the LLM is unavailable or fails.
+    """
+    if not llm_gateway.is_available():
+        return analysis
+
+    profile = {
+        'primary_archetype': analysis.get('primary_archetype'),
+        'archetype_percentages': analysis.get('archetype_percentages'),
+        'contributing_subjects': analysis.get('contributing_subjects'),
+    }
     prompt = f"""
-    You are an expert Psychologist specializing in RIASEC (Holland Codes). 
-    Perform a purely objective, UNBIASED analysis of this student's transcript.
+    You are a career counselor using RIASEC (Holland Codes). A student's RIASEC profile,
+    computed from their transcript, is:
 
-    Transcript:
-    ---
-    {transcript_text}
-    ---
-    
-    CRITICAL INSTRUCTIONS FOR BIAS ELIMINATION:
-    1. **Content-Only Analysis**: Evaluate ONLY the subject matter (e.g., "Math" -> Investigative) and the grade (performance).
-    2. **Zero Assumptions**: Do NOT infer gender, age, socioeconomic status, or cultural background. Do NOT use stereotypes (e.g., do not assume "Nursing" implies female or "Engineering" implies male).
-    3. **Universal Standardization**: Treat all subjects with equal weight regarding their potential career implications, derived solely from the syllabus implications of the title.
-    
-    Task:
-    1. Analyze the subjects and weigh them by grades (Higher grades = stronger affinity).
-    2. Calculate the percentage (0-100) for each RIASEC category.
-    3. Determine the Primary Archetype.
-    4. Identify top 5 "Contributing Subjects".
-    5. Extract "Transferable Skills".
-    6. Suggest 3-5 "Cross-Disciplinary Careers".
-    
-    Return ONLY a raw JSON object:
+    {json.dumps(profile)}
+
+    Based only on this profile and the listed subjects (no assumptions about gender, age,
+    socioeconomic status or culture), return ONLY a raw JSON object:
     {{
-      "primary_archetype": "Social",
-      "archetype_percentages": {{
-        "Realistic": 10.5,
-        "Investigative": 20.0,
-        "Artistic": 5.0,
-        "Social": 40.0,
-        "Enterprising": 15.0,
-        "Conventional": 9.5
-      }},
-      "contributing_subjects": {{
-        "Realistic": ["Hardware Lab"],
-        "Investigative": ["Calculus"],
-        "Artistic": ["Multimedia"],
-        "Social": ["Ethics"],
-        "Enterprising": ["Management"],
-        "Conventional": ["Database"]
-      }},
       "transferable_skills": ["Critical Analysis", "Problem Solving"],
       "cross_disciplinary_careers": ["Product Manager", "UI Researcher"]
     }}
+    List 4-8 transferable skills and 3-5 cross-disciplinary careers.
     """
-    
-    try:
-        response = generate_with_retry(gemini_model, prompt)
-        if not response:
-             return {}
 
-        text = response.text.replace('```json', '').replace('```', '').strip()
-        data = json.loads(text)
-        
-        # Normalize to ensure keys exist
-        defaults = {"Realistic":0,"Investigative":0,"Artistic":0,"Social":0,"Enterprising":0,"Conventional":0}
-        data['archetype_percentages'] = {**defaults, **data.get('archetype_percentages', {})}
-        
-        # Ensure contributing_subjects exists
-        data['contributing_subjects'] = data.get('contributing_subjects', {})
-        
-        # Ensure new fields exist
-        data['transferable_skills'] = data.get('transferable_skills', [])
-        data['cross_disciplinary_careers'] = data.get('cross_disciplinary_careers', [])
-        
-        # Add "debiased" aliases for frontend compatibility if needed
-        data['debias_percentages'] = data['archetype_percentages']
-        data['primary_archetype_debiased'] = data['primary_archetype']
-        
-        return data
+    try:
+        data = llm_gateway.generate_json(prompt, caller='objective_2.riasec_enrich')
+        if not isinstance(data, dict):
+            return analysis
+        return {
+            **analysis,
+            'transferable_skills': data.get('transferable_skills', []),
+            'cross_disciplinary_careers': data.get('cross_disciplinary_careers', []),
+            'enriched': True,
+        }
     except Exception as e:
-        print(f"[OBJECTIVE-2] AI Analysis Failed: {e}")
-        return {}
+        print(f"[OBJECTIVE-2] AI Enrichment Failed: {e}")
+        return analysis
 
 @bp.route('/clear-results', methods=['POST'])
 def clear_archetype_results():
@@ -250,7 +250,7 @@ def clear_archetype_results():
         try:
             supabase = get_supabase_client()
             # Find user id
-            user_resp = supabase.table('users').select('user_id, tor_notes').eq('email', email).limit(1).execute()
+            user_resp = supabase.table('users').select('user_id, tor_notes, primary_archetype').eq('email', email).limit(1).execute()
             if not user_resp.data:
                 return jsonify({'message': 'User not found'}), 404
             
@@ -276,12 +276,14 @@ def clear_archetype_results():
                 if 'analysis_results' in notes_obj:
                     if 'archetype_analysis' in notes_obj['analysis_results']:
                         del notes_obj['analysis_results']['archetype_analysis']
+                    notes_obj['analysis_results'].pop('archetype_transcript_hash', None)
                     # If analysis_results is empty, maybe keep it or remove it? keeping it is safer.
                 update_data['tor_notes'] = json.dumps(notes_obj)
             except Exception as json_err:
                 print(f"[OBJECTIVE-2] Error clearing JSON notes: {json_err}")
 
             supabase.table('users').update(update_data).eq('user_id', user_id).execute()
+            get_archetype_population().record_change(user_row.get('primary_archetype'), None)
             return jsonify({'message': 'Archetype results cleared (Objective 2)'}), 200
         except Exception as db_error:
             print(f"[OBJECTIVE-2] Clear DB error: {db_error}")
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import io
 import re
 import json
@@ -13,12 +13,13 @@ import pypdfium2 as pdfium
 from PIL import Image, ImageOps, ImageEnhance
 import numpy as np
 
-# API Libraries
-import google.generativeai as genai
-from google.api_core import retry
-
 # Flask and Project-Specific Imports
 from flask_cors import CORS
+from app.services.llm_gateway import get_llm_gateway
+from app.services.llm_usage import usage_scope
+from app.routes.auth import request_identity
+from app.services.program_registry import get_program_registry
+from app.services.prompt_compaction import compact_fragments, group_fragments_into_rows, record_compaction
 
 # --- BLUEPRINT SETUP ---
 bp = Blueprint('ocr_tor', __name__, url_prefix='/api/ocr-tor')
@@ -32,26 +33,8 @@ except Exception as e:
     EASYOCR_READER = None
     print(f"[OCR_TOR] WARNING: Failed to initialize EasyOCR reader: {e}")
 
-# --- INITIALIZE GEMINI API ---
-try:
-    GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-    if not GEMINI_API_KEY:
-        gemini_model = None
-        print("[OCR_TOR] WARNING: GEMINI_API_KEY not found. Gemini refinement is disabled.")
-    else:
-        # User requested to focus on the best model for the system.
-        # We found 'models/gemini-2.5-flash' in the list, which is the latest efficient model.
-        # We also allow an override via environment variable.
-        selected_model = os.getenv('GEMINI_MODEL_NAME', 'models/gemini-2.5-flash')
-        
-        genai.configure(api_key=GEMINI_API_KEY)
-        gemini_model = genai.GenerativeModel(selected_model)
-        
-        print(f"[OCR_TOR] Gemini model initialized: {selected_model}")
-
-except Exception as e:
-    gemini_model = None
-    print(f"[OCR_TOR] WARNING: Failed to initialize Gemini model: {e}")
+# --- LLM GATEWAY (Gemini client, retries, cache and metrics live there) ---
+llm_gateway = get_llm_gateway()
 
 
 def preprocess_image(pil_image):
@@ -73,34 +56,6 @@ def preprocess_image(pil_image):
         print(f"[OCR_TOR] Image preprocessing failed: {e}")
         return pil_image
 
-def generate_with_retry(model, prompt, retries=3, initial_delay=60, **kwargs):
-    """
-    Wraps model.generate_content with retry logic for 429 Rate Limit errors.
-    """
-    import time
-    if not model: return None
-    
-    current_delay = initial_delay
-    
-    for attempt in range(retries):
-        try:
-            # Add strict timeout to prevent hanging
-            request_options = kwargs.pop('request_options', {"timeout": 600})
-            return model.generate_content(prompt, request_options=request_options, **kwargs)
-        except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "quota" in error_str.lower():
-                print(f"[OCR_TOR] Rate Limit Hit (429). Waiting {current_delay}s before retry {attempt+1}/{retries}...")
-                time.sleep(current_delay)
-                current_delay *= 2 # Exponential backoff
-            else:
-                print(f"[OCR_TOR] Gemini Error (Non-Retryable): {e}")
-                raise e
-    
-    print("[OCR_TOR] Max retries exceeded for Gemini API.")
-    return None
-
-
 def convert_percentage_to_grade(value: float, program: str = 'CS') -> float:
     """
     Converts a percentage grade (0-100) to a 1.0-5.0 scale.
@@ -124,20 +79,13 @@ def convert_percentage_to_grade(value: float, program: str = 'CS') -> float:
         
     return 5.00
 
-def refine_page_with_gemini(page_text_fragments, page_num):
-    """
-    Refines a SINGLE page of OCR data.
-    """
-    if not gemini_model: 
-        return []
-
-    # Format fragments
-    # fragments is list of (bbox, text, prob)
-    # text_block = "\n".join([f'text: "{t}", y: {int(b[0][1])}' for (b, t, p) in page_text_fragments[:300]])
-    # SIMPLIFIED: Just send the text lines in order (EasyOCR usually sorts top-bottom)
-    text_block = "\n".join([t for (b, t, p) in page_text_fragments])
+# Compact OCR text to candidate grade lines before prompting (set to false to send every fragment)
+PROMPT_COMPACTION_ENABLED = os.getenv('OCR_PROMPT_COMPACTION', 'true').lower() == 'true'
+# Retry with the rejected rows when the LLM returns fewer grades than this share of detected course rows
+COMPACTION_MIN_YIELD = float(os.getenv('OCR_COMPACTION_MIN_YIELD', 0.6))
 
-    prompt = f"""
+def build_page_prompt(text_block, page_num):
+    return f"""
     You are an expert Transcript Digitizer.
     EXTRACT the table of academic grades from this OCR text (Page {page_num}).
 
@@ -167,36 +115,148 @@ def refine_page_with_gemini(page_text_fragments, page_num):
     ]
     """
 
-    try:
-        # Use retry logic
-        response = generate_with_retry(
-            gemini_model, 
-            prompt, 
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
-        if not response: return []
+def _request_page_grades(text_block, page_num):
+    data = llm_gateway.generate_json(
+        build_page_prompt(text_block, page_num),
+        caller='ocr_tor.refine_page',
+        generation_config={"response_mime_type": "application/json"},
+        label=f'page {page_num}',
+    )
+    
+    if isinstance(data, list):
+        return data
+    elif isinstance(data, dict):
+        return data.get('grades', []) or data.get('data', []) or []
+    
+    return []
 
-        # Parse
-        text = response.text.strip()
-        data = json.loads(text)
-        
-        if isinstance(data, list):
-            return data
-        elif isinstance(data, dict):
-            return data.get('grades', []) or data.get('data', []) or []
-        
+def refine_page_with_gemini(page_text_fragments, page_num):
+    """
+    Refines a SINGLE page of OCR data.
+    """
+    if not llm_gateway.is_available():
         return []
 
+    try:
+        # fragments is list of (bbox, text, prob)
+        if not PROMPT_COMPACTION_ENABLED:
+            # Send the text lines in order (EasyOCR usually sorts top-bottom)
+            return _request_page_grades("\n".join([t for (b, t, p) in page_text_fragments]), page_num)
+
+        compacted = compact_fragments(page_text_fragments)
+        stats = compacted['stats']
+        print(f"[OCR_TOR] Page {page_num} prompt compaction: {stats['kept_lines']} kept / "
+              f"{stats['rejected_lines']} rejected / {stats['duplicate_lines']} duplicate lines, "
+              f"~{stats['original_tokens']} -> ~{stats['compacted_tokens']} tokens "
+              f"({stats['token_reduction']:.0%} reduction)")
+
+        grades = _request_page_grades("\n".join(compacted['kept']), page_num) if compacted['kept'] else []
+
+        # Too few grades for the course rows we saw: the filter may have dropped real rows
+        expected = compacted['course_rows']
+        too_few = len(grades) < max(1, int(expected * COMPACTION_MIN_YIELD))
+        retried = bool(compacted['rejected']) and too_few
+        if retried:
+            print(f"[OCR_TOR] Page {page_num}: {len(grades)} grades for {expected} course rows; "
+                  f"retrying with {len(compacted['rejected'])} rejected lines included.")
+            full_block = "\n".join(group_fragments_into_rows(page_text_fragments))
+            retry_grades = _request_page_grades(full_block, page_num)
+            if len(retry_grades) > len(grades):
+                grades = retry_grades
+        record_compaction(stats, fallback_retry=retried)
+        return grades
+
     except Exception as e:
         print(f"[OCR_TOR] Page {page_num} refinement failed: {e}")
         return []
 
-def extract_grades_from_tor(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+def stream_page_grades(page_text_fragments, page_num):
+    """
+    Streaming counterpart of refine_page_with_gemini: yields each grade object
+    as soon as the model has finished emitting it.
+    """
+    if not llm_gateway.is_available():
+        return
+
+    generation_config = {"response_mime_type": "application/json"}
+    if PROMPT_COMPACTION_ENABLED:
+        compacted = compact_fragments(page_text_fragments)
+        lines = compacted['kept']
+    else:
+        compacted = None
+        lines = [t for (b, t, p) in page_text_fragments]
+
+    seen = set()
+    try:
+        if lines:
+            for item in llm_gateway.stream_json_array(
+                build_page_prompt("\n".join(lines), page_num),
+                caller='ocr_tor.refine_page_stream',
+                generation_config=generation_config,
+                label=f'page {page_num}',
+            ):
+                if isinstance(item, dict):
+                    seen.add(_grade_identity(item))
+                    yield item
+
+        if compacted is not None:
+            expected = compacted['course_rows']
+            retried = bool(compacted['rejected']) and len(seen) < max(1, int(expected * COMPACTION_MIN_YIELD))
+            record_compaction(compacted['stats'], fallback_retry=retried)
+            if retried:
+                print(f"[OCR_TOR] Page {page_num}: {len(seen)} streamed grades for {expected} course rows; "
+                      f"retrying with rejected lines included.")
+                full_block = "\n".join(group_fragments_into_rows(page_text_fragments))
+                for item in _request_page_grades(full_block, page_num):
+                    if isinstance(item, dict) and _grade_identity(item) not in seen:
+                        seen.add(_grade_identity(item))
+                        yield item
+    except Exception as e:
+        print(f"[OCR_TOR] Page {page_num} streaming refinement failed: {e}")
+
+def _grade_identity(item):
+    code = item.get('courseCode') or item.get('course_code') or item.get('code') or ''
+    subject = item.get('subject') or item.get('title') or item.get('descriptive_title') or ''
+    return (str(code).strip().lower(), str(subject).strip().lower(), str(item.get('grade')))
+
+def normalize_grade_item(g):
+    """Normalize one LLM grade object in place; None when it has no usable grade."""
+    try:
+        # Normalize keys
+        g['courseCode'] = g.get('courseCode') or g.get('course_code') or g.get('code') or ''
+        g['subject'] = g.get('subject') or g.get('title') or g.get('descriptive_title') or ''
+        
+        # Grade validation
+        raw_g = g.get('grade')
+        if raw_g is None: return None
+        g['grade'] = float(raw_g)
+        
+        # Units
+        g['units'] = float(g.get('units') or 3.0)
+        
+        # Semester fallback
+        if 'semester' not in g: g['semester'] = 'Detected Subjects'
+
+        return g
+    except Exception:
+        return None
+
+def detect_program(full_text: str) -> str:
+    """Determine Program (IT vs CS, or any program in the manifest) from the OCR text."""
+    return get_program_registry().detect_from_text(full_text) or 'CS'
+
+def iter_tor_extraction(file_bytes: bytes, filename: str, stream: bool = False):
+    """
+    Run TOR extraction page by page, yielding progress events:
+      {'event': 'page', ...}, {'event': 'grade', 'grade': {...}}, and finally
+      {'event': 'done', 'result': {...}} with the same payload extract_grades_from_tor returns.
+    With stream=True grades are yielded while the LLM is still generating the page.
+    """
     full_text = ""
     
     if not EASYOCR_READER:
-        return {'grades': [], 'grade_values': [], 'error': 'OCR Engine not initialized'}
+        yield {'event': 'done', 'result': {'grades': [], 'grade_values': [], 'error': 'OCR Engine not initialized'}}
+        return
     
     try:
         # Load PDF
@@ -210,6 +270,7 @@ def extract_grades_from_tor(file_bytes: bytes, filename: str) -> Dict[str, Any]:
         for i, page in enumerate(pdf):
             page_num = i + 1
             print(f"[OCR_TOR] Processing Page {page_num} of {total_pages}...")
+            yield {'event': 'page', 'page': page_num, 'total_pages': total_pages}
             
             # 1. OCR
             pil_image = page.render(scale=3).to_pil() 
@@ -223,31 +284,27 @@ def extract_grades_from_tor(file_bytes: bytes, filename: str) -> Dict[str, Any]:
                 continue
 
             # 2. Gemini Refinement (Per Page)
-            page_grades = refine_page_with_gemini(raw_results, page_num)
+            if stream:
+                page_grades = stream_page_grades(raw_results, page_num)
+            else:
+                page_grades = refine_page_with_gemini(raw_results, page_num)
             
             # 3. Clean & Append
+            page_count = 0
             for g in page_grades:
-                try:
-                    # Normalize keys
-                    g['courseCode'] = g.get('courseCode') or g.get('course_code') or g.get('code') or ''
-                    g['subject'] = g.get('subject') or g.get('title') or g.get('descriptive_title') or ''
-                    
-                    # Grade validation
-                    raw_g = g.get('grade')
-                    if raw_g is None: continue
-                    g['grade'] = float(raw_g)
-                    
-                    # Units
-                    g['units'] = float(g.get('units') or 3.0)
-                    
-                    # Semester fallback
-                    if 'semester' not in g: g['semester'] = 'Detected Subjects'
-
-                    final_grades.append(g)
-                except Exception:
+                g = normalize_grade_item(g) if isinstance(g, dict) else None
+                if g is None:
                     continue
+                final_grades.append(g)
+                page_count += 1
+                if stream:
+                    # Provisional conversion; the 'done' event carries the final values
+                    preview = dict(g)
+                    if preview['grade'] > 5.0:
+                        preview['grade'] = convert_percentage_to_grade(preview['grade'], detect_program(full_text))
+                    yield {'event': 'grade', 'page': page_num, 'grade': preview}
             
-            print(f"[OCR_TOR] Page {page_num} extracted {len(page_grades)} grades.")
+            print(f"[OCR_TOR] Page {page_num} extracted {page_count} grades.")
             
             # PACING: Wait 2 seconds between pages to prevent 429
             if i < total_pages - 1:
@@ -255,13 +312,11 @@ def extract_grades_from_tor(file_bytes: bytes, filename: str) -> Dict[str, Any]:
 
     except Exception as e:
         print(f"[OCR_TOR] PDF Processing Error: {e}")
-        return {'error': str(e)}
+        yield {'event': 'done', 'result': {'error': str(e)}}
+        return
 
     # --- PHASE 3: POST-PROCESSING & CONVERSION ---
-    # Determine Program (IT vs CS)
-    program = 'CS'
-    if 'information technology' in full_text.lower() or 'bsit' in full_text.lower():
-        program = 'IT'
+    program = detect_program(full_text)
     print(f"[OCR_TOR] Detected Program: {program}")
 
     # Standardize Grades (Percentage -> 1.0-5.0)
@@ -280,11 +335,19 @@ def extract_grades_from_tor(file_bytes: bytes, filename: str) -> Dict[str, Any]:
 
     print(f"[OCR_TOR] Total extracted grades: {len(final_grades)}")
 
-    return {
+    yield {'event': 'done', 'result': {
         'grades': final_grades, 
         'grade_values': final_values, 
-        'full_text': full_text
-    }
+        'full_text': full_text,
+        'program': program
+    }}
+
+def extract_grades_from_tor(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    for event in iter_tor_extraction(file_bytes, filename, stream=False):
+        if event['event'] == 'done':
+            result = event['result']
+    return result
 
 @bp.route('/process', methods=['POST'])
 def process_tor_endpoint():
@@ -299,12 +362,43 @@ def process_tor_endpoint():
     try:
         print(f"[OCR_TOR] Received file: {file.filename}")
         file_bytes = file.read()
-        result = extract_grades_from_tor(file_bytes, file.filename)
+        with usage_scope(user=request_identity()):
+            result = extract_grades_from_tor(file_bytes, file.filename)
         return jsonify({'success': True, **result}), 200
     except Exception as e:
         print(f"[OCR_TOR] Unexpected error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/process-stream', methods=['POST'])
+def process_tor_stream_endpoint():
+    """Same as /process, but streams grades as Server-Sent Events while pages are refined."""
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    if not file.filename.lower().endswith('.pdf'):
+        return jsonify({'error': 'Invalid file type, please upload a PDF'}), 400
+
+    print(f"[OCR_TOR] Received file (stream): {file.filename}")
+    file_bytes = file.read()
+    filename = file.filename
+    # Resolved here: the request context is gone once the response starts streaming
+    user = request_identity()
+
+    def event_stream():
+        try:
+            with usage_scope(user=user):
+                for event in iter_tor_extraction(file_bytes, filename, stream=True):
+                    name = event.pop('event')
+                    yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            print(f"[OCR_TOR] Unexpected streaming error: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return Response(stream_with_context(event_stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # --- CRUD Endpoints (Preserved) ---
 def get_supabase_client():
     # Placeholder: Ensure you have your actual supabase initialization here
@@ -1,8 +1,9 @@
 from flask import Blueprint, jsonify, request
 import os
 from datetime import datetime, timezone
-from app.routes.auth import token_required
+from app.routes.auth import request_identity, token_required
 from app.services.supabase_client import get_supabase_client
+from app.services.llm_usage import usage_scope
 
 bp = Blueprint("users", __name__, url_prefix="/api/users")
 
@@ -399,7 +400,8 @@ def extract_grades():
 
         # Call OCR processor
         from app.routes.ocr_tor import extract_grades_from_tor
-        ocr_result = extract_grades_from_tor(file_bytes, filename) or {}
+        with usage_scope(user=request_identity()):
+            ocr_result = extract_grades_from_tor(file_bytes, filename) or {}
         grades = ocr_result.get('grades') or []
         grade_values = ocr_result.get('grade_values') or []
         full_text = ocr_result.get('full_text') or ""
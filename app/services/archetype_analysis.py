@@ -0,0 +1,189 @@
+"""
+Helpers for the RIASEC archetype analysis (Objective 2).
+
+An analysis only depends on the subjects and grades the student submitted, so
+each stored analysis carries a content hash of the normalized transcript:
+
+    tor_notes.analysis_results = {'archetype_analysis': {...},
+                                  'archetype_transcript_hash': '<version>:<sha256>', ...}
+
+Normalization makes the hash insensitive to what does not change the
+analysis: subject case and spacing, grade formatting ("1.50" vs 1.5) and the
+order of the rows. ANALYSIS_VERSION (and, for local scoring, the lexicon
+version) is part of the hash; bump it when the prompt or scoring changes so
+stored analyses are recomputed.
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+ANALYSIS_VERSION = 'riasec-v1'
+
+_SPACES = re.compile(r'\s+')
+
+
+def _norm_subject(value: Any) -> str:
+    return _SPACES.sub(' ', str(value if value is not None else 'Unknown')).strip().lower()
+
+
+def _norm_grade(value: Any) -> str:
+    try:
+        return repr(round(float(value), 4))
+    except (TypeError, ValueError):
+        return _SPACES.sub(' ', str(value if value is not None else 'N/A')).strip().upper()
+
+
+def normalize_transcript(grades_data: Any) -> List[Tuple[str, str]]:
+    """Sorted (subject, grade) pairs; a plain grade list keeps its order as positional subjects."""
+    if isinstance(grades_data, list) and grades_data and isinstance(grades_data[0], dict):
+        return sorted((_norm_subject(item.get('subject', 'Unknown')), _norm_grade(item.get('grade', 'N/A')))
+                      for item in grades_data if isinstance(item, dict))
+    if isinstance(grades_data, list):
+        return [(f'#{i}', _norm_grade(g)) for i, g in enumerate(grades_data)]
+    return [('#raw', _SPACES.sub(' ', str(grades_data)).strip())]
+
+
+def transcript_hash(grades_data: Any, method: Optional[str] = None) -> str:
+    """'<ANALYSIS_VERSION>[/<method>]:<sha256>'; method tells scorers apart (e.g. the lexicon version)."""
+    payload = json.dumps(normalize_transcript(grades_data), separators=(',', ':'))
+    version = f'{ANALYSIS_VERSION}/{method}' if method else ANALYSIS_VERSION
+    return f'{version}:{hashlib.sha256(payload.encode("utf-8")).hexdigest()}'
+
+
+def format_transcript(grades_data: Any) -> str:
+    """Transcript text given to the LLM ("- Subject: grade" per row)."""
+    if grades_data and isinstance(grades_data, list) and isinstance(grades_data[0], dict):
+        return "\n".join(f"- {item.get('subject', 'Unknown')}: {item.get('grade', 'N/A')}"
+                         for item in grades_data if isinstance(item, dict))
+    return f"{grades_data}"
+
+
+def load_notes(raw_notes: Any) -> Dict[str, Any]:
+    """tor_notes as a dict (the column holds a JSON string, a JSON object, or nothing)."""
+    try:
+        notes = json.loads(raw_notes) if isinstance(raw_notes, str) else (raw_notes or {})
+    except ValueError:
+        return {}
+    return notes if isinstance(notes, dict) else {}
+
+
+def stored_analysis(notes: Dict[str, Any], digest: str) -> Optional[Dict[str, Any]]:
+    """The saved archetype analysis when it was computed from the transcript with this hash."""
+    results = notes.get('analysis_results') or {}
+    analysis = results.get('archetype_analysis')
+    if analysis and isinstance(analysis, dict) and results.get('archetype_transcript_hash') == digest:
+        return analysis
+    return None
+
+
+def riasec_prompt(transcript_text: str) -> str:
+    """Prompt for the full LLM analysis of one transcript (see format_transcript)."""
+    return f"""
+    You are an expert Psychologist specializing in RIASEC (Holland Codes). 
+    Perform a purely objective, UNBIASED analysis of this student's transcript.
+
+    Transcript:
+    ---
+    {transcript_text}
+    ---
+    
+    CRITICAL INSTRUCTIONS FOR BIAS ELIMINATION:
+    1. **Content-Only Analysis**: Evaluate ONLY the subject matter (e.g., "Math" -> Investigative) and the grade (performance).
+    2. **Zero Assumptions**: Do NOT infer gender, age, socioeconomic status, or cultural background. Do NOT use stereotypes (e.g., do not assume "Nursing" implies female or "Engineering" implies male).
+    3. **Universal Standardization**: Treat all subjects with equal weight regarding their potential career implications, derived solely from the syllabus implications of the title.
+    
+    Task:
+    1. Analyze the subjects and weigh them by grades (Higher grades = stronger affinity).
+    2. Calculate the percentage (0-100) for each RIASEC category.
+    3. Determine the Primary Archetype.
+    4. Identify top 5 "Contributing Subjects".
+    5. Extract "Transferable Skills".
+    6. Suggest 3-5 "Cross-Disciplinary Careers".
+    
+    Return ONLY a raw JSON object:
+    {{
+      "primary_archetype": "Social",
+      "archetype_percentages": {{
+        "Realistic": 10.5,
+        "Investigative": 20.0,
+        "Artistic": 5.0,
+        "Social": 40.0,
+        "Enterprising": 15.0,
+        "Conventional": 9.5
+      }},
+      "contributing_subjects": {{
+        "Realistic": ["Hardware Lab"],
+        "Investigative": ["Calculus"],
+        "Artistic": ["Multimedia"],
+        "Social": ["Ethics"],
+        "Enterprising": ["Management"],
+        "Conventional": ["Database"]
+      }},
+      "transferable_skills": ["Critical Analysis", "Problem Solving"],
+      "cross_disciplinary_careers": ["Product Manager", "UI Researcher"]
+    }}
+    """
+
+
+def normalize_llm_analysis(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill the keys the frontend expects in an LLM analysis (KeyError without primary_archetype)."""
+    defaults = {"Realistic": 0, "Investigative": 0, "Artistic": 0, "Social": 0, "Enterprising": 0, "Conventional": 0}
+    data['archetype_percentages'] = {**defaults, **data.get('archetype_percentages', {})}
+
+    # Ensure contributing_subjects exists
+    data['contributing_subjects'] = data.get('contributing_subjects', {})
+
+    # Ensure new fields exist
+    data['transferable_skills'] = data.get('transferable_skills', [])
+    data['cross_disciplinary_careers'] = data.get('cross_disciplinary_careers', [])
+
+    # "debiased" aliases for frontend compatibility
+    data['debias_percentages'] = data['archetype_percentages']
+    data['primary_archetype_debiased'] = data['primary_archetype']
+
+    return data
+
+
+def riasec_batch_prompt(students: List[Tuple[str, str]]) -> str:
+    """Prompt for several transcripts at once: students = [(id, transcript text), ...].
+
+    Same instructions as riasec_prompt; the answer is one analysis per id.
+    """
+    blocks = "\n".join(f"Student {sid}:\n---\n{text}\n---" for sid, text in students)
+    return f"""
+    You are an expert Psychologist specializing in RIASEC (Holland Codes).
+    Perform a purely objective, UNBIASED analysis of EACH student's transcript below,
+    independently of the other students.
+
+    {blocks}
+
+    CRITICAL INSTRUCTIONS FOR BIAS ELIMINATION:
+    1. **Content-Only Analysis**: Evaluate ONLY the subject matter (e.g., "Math" -> Investigative) and the grade (performance).
+    2. **Zero Assumptions**: Do NOT infer gender, age, socioeconomic status, or cultural background. Do NOT use stereotypes.
+    3. **Universal Standardization**: Treat all subjects with equal weight regarding their potential career implications, derived solely from the syllabus implications of the title.
+
+    Task, for each student:
+    1. Analyze the subjects and weigh them by grades (Higher grades = stronger affinity).
+    2. Calculate the percentage (0-100) for each RIASEC category.
+    3. Determine the Primary Archetype.
+    4. Identify top 5 "Contributing Subjects".
+    5. Extract "Transferable Skills".
+    6. Suggest 3-5 "Cross-Disciplinary Careers".
+
+    Return ONLY a raw JSON object with one entry per student, using the student ids above:
+    {{
+      "students": [
+        {{
+          "id": "s0",
+          "primary_archetype": "Social",
+          "archetype_percentages": {{"Realistic": 10.5, "Investigative": 20.0, "Artistic": 5.0,
+                                     "Social": 40.0, "Enterprising": 15.0, "Conventional": 9.5}},
+          "contributing_subjects": {{"Investigative": ["Calculus"], "Social": ["Ethics"]}},
+          "transferable_skills": ["Critical Analysis", "Problem Solving"],
+          "cross_disciplinary_careers": ["Product Manager", "UI Researcher"]
+        }}
+      ]
+    }}
+    """
@@ -0,0 +1,250 @@
+"""
+Batch RIASEC archetype analysis for whole cohorts (Objective 2).
+
+Analyzing a graduating class through /api/objective-2/process costs a user
+lookup, an analysis, an update and a population read per student. Here:
+
+- users (grades, tor_notes, primary_archetype) are read with one `in` query per
+  LOOKUP_CHUNK emails (career_batch.fetch_users_by_email);
+- students whose stored analysis was made from the same transcript are reused
+  as is (archetype_analysis.transcript_hash), as in the single endpoint;
+- the rest are scored locally (RiasecScorer, ~0.15 ms a student). With the
+  'llm' scorer, or for transcripts without lexicon subjects, several
+  transcripts are packed into each LLM request under a prompt token budget
+  (ARCHETYPE_BATCH_PROMPT_TOKENS, default 6000; at most
+  ARCHETYPE_BATCH_MAX_PER_REQUEST students, default 8). Students missing from a
+  packed answer are retried with the single-student prompt;
+- primary_archetype, the six archetype_*_percentage columns and tor_notes are
+  written with one bulk RPC (bulk_update_archetypes, see
+  migrations/2025-10-24-create-rpc-bulk-update-archetypes.sql), falling back to
+  per-row updates until it is installed;
+- the population histogram is read once, after the writes.
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services.archetype_analysis import (format_transcript, load_notes, normalize_llm_analysis,
+                                             riasec_batch_prompt, riasec_prompt, stored_analysis,
+                                             transcript_hash)
+from app.services.archetype_population import get_archetype_population
+from app.services.career_batch import fetch_users_by_email
+from app.services.prompt_compaction import estimate_tokens
+from app.services.riasec_scorer import get_riasec_scorer
+
+CATEGORIES = ('Realistic', 'Investigative', 'Artistic', 'Social', 'Enterprising', 'Conventional')
+PROMPT_TOKEN_BUDGET = int(os.getenv('ARCHETYPE_BATCH_PROMPT_TOKENS', 6000))
+MAX_PER_REQUEST = int(os.getenv('ARCHETYPE_BATCH_MAX_PER_REQUEST', 8))
+USER_COLUMNS = 'user_id, email, grades, tor_notes, primary_archetype'
+
+
+def _student_block(sid: str, text: str) -> str:
+    return f"Student {sid}:\n---\n{text}\n---\n"
+
+
+def pack_transcripts(students: Sequence[Tuple[str, str]], budget_tokens: int = PROMPT_TOKEN_BUDGET,
+                     max_per_request: int = MAX_PER_REQUEST) -> List[List[Tuple[str, str]]]:
+    """Greedily group (id, transcript text) pairs, in order, into prompts of at most budget_tokens.
+
+    A transcript that does not fit the budget on its own still gets a request of its own.
+    """
+    overhead = estimate_tokens(riasec_batch_prompt([]))
+    packs: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    used = overhead
+    for sid, text in students:
+        cost = estimate_tokens(_student_block(sid, text))
+        if current and (used + cost > budget_tokens or len(current) >= max_per_request):
+            packs.append(current)
+            current, used = [], overhead
+        current.append((sid, text))
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def analyze_with_llm(llm, students: Sequence[Tuple[str, str]], budget_tokens: int = PROMPT_TOKEN_BUDGET,
+                     max_per_request: int = MAX_PER_REQUEST) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """({id: analysis}, LLM requests made) for (id, transcript text) pairs; failed ids are left out."""
+    analyses: Dict[str, Dict[str, Any]] = {}
+    requests_made = 0
+    if not students or llm is None or not llm.is_available():
+        return analyses, requests_made
+
+    for pack in pack_transcripts(students, budget_tokens, max_per_request):
+        wanted = {sid for sid, _ in pack}
+        requests_made += 1
+        try:
+            data = llm.generate_json(riasec_batch_prompt(pack), caller='objective_2.riasec_batch',
+                                     label=f'{len(pack)} students')
+        except Exception as e:
+            print(f"[OBJECTIVE-2] Batch AI Analysis Failed ({len(pack)} students): {e}")
+            data = None
+        for entry in (data.get('students') if isinstance(data, dict) else None) or []:
+            if not isinstance(entry, dict) or str(entry.get('id')) not in wanted:
+                continue
+            sid = str(entry.pop('id'))
+            try:
+                analyses[sid] = normalize_llm_analysis(entry)
+            except (KeyError, TypeError, AttributeError):
+                continue
+
+    # Students the packed answers left out are asked for one by one, with the single-student prompt
+    for sid, text in students:
+        if sid in analyses:
+            continue
+        requests_made += 1
+        try:
+            data = llm.generate_json(riasec_prompt(text), caller='objective_2.riasec')
+            if isinstance(data, dict):
+                analyses[sid] = normalize_llm_analysis(data)
+        except Exception as e:
+            print(f"[OBJECTIVE-2] AI Analysis Failed for student {sid}: {e}")
+    return analyses, requests_made
+
+
+def archetype_columns(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """users columns for an analysis (primary_archetype and archetype_*_percentage)."""
+    percentages = analysis.get('archetype_percentages') or {}
+    columns = {'primary_archetype': analysis.get('primary_archetype', 'Unknown')}
+    for category in CATEGORIES:
+        columns[f'archetype_{category.lower()}_percentage'] = percentages.get(category, 0)
+    return columns
+
+
+def bulk_write_archetypes(supabase, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Write archetype columns and tor_notes for many users.
+
+    rows: [{'user_id', 'primary_archetype', 'archetype_*_percentage', 'tor_notes'}]. Uses the bulk RPC
+    in one round trip; falls back to per-row updates when the function has not been installed yet.
+    """
+    if not rows:
+        return {'written': 0, 'mode': 'none'}
+    analyzed_at = datetime.now(timezone.utc).isoformat()
+    payload = [{**row, 'archetype_analyzed_at': row.get('archetype_analyzed_at') or analyzed_at} for row in rows]
+    try:
+        resp = supabase.rpc('bulk_update_archetypes', {'payload': payload}).execute()
+        written = resp.data if isinstance(resp.data, int) else len(payload)
+        return {'written': written, 'mode': 'rpc'}
+    except Exception as e:
+        print(f"[OBJECTIVE-2] Bulk RPC unavailable, falling back to per-row updates: {e}")
+
+    written = 0
+    for row in payload:
+        try:
+            update = {key: value for key, value in row.items() if key != 'user_id'}
+            supabase.table('users').update(update).eq('user_id', row['user_id']).execute()
+            written += 1
+        except Exception as e:
+            print(f"[OBJECTIVE-2] Update failed for user {row['user_id']}: {e}")
+    return {'written': written, 'mode': 'per_row'}
+
+
+def run_batch_archetypes(supabase, items: List[Dict[str, Any]], scorer: str = 'lexicon', llm=None,
+                         save: bool = True, refresh: bool = False) -> Dict[str, Any]:
+    """Analyze a cohort (items from career_batch.parse_batch_request) and optionally persist it."""
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    emails = [item['email'] for item in items if item['email']]
+    users = fetch_users_by_email(supabase, emails, USER_COLUMNS) if emails and supabase is not None else {}
+    transcripts = []
+    for item in items:
+        grades = item['grades']
+        if grades is None:
+            grades = (users.get(item['email']) or {}).get('grades') or []
+        transcripts.append(grades)
+    timings['lookup_seconds'] = time.perf_counter() - started
+
+    # 1. Local scores for the whole cohort; they also decide which hash a stored analysis must match
+    t0 = time.perf_counter()
+    if scorer != 'llm':
+        riasec_scorer = get_riasec_scorer()
+        lexicon = [riasec_scorer.score(grades) for grades in transcripts]
+    else:
+        lexicon = [None] * len(items)
+    timings['score_seconds'] = time.perf_counter() - t0
+
+    results: List[Dict[str, Any]] = []
+    analyses: List[Optional[Dict[str, Any]]] = []
+    digests: List[str] = []
+    to_llm: List[Tuple[str, str]] = []
+    for i, item in enumerate(items):
+        result = {'email': item['email'], 'cached': False}
+        user = users.get(item['email'])
+        analysis = lexicon[i]
+        digests.append(transcript_hash(transcripts[i], method=analysis['method'] if analysis else None))
+        stored = stored_analysis(load_notes(user.get('tor_notes')), digests[i]) if user and not refresh else None
+        if stored is not None:
+            analysis = stored
+            result['cached'] = True
+        elif not transcripts[i]:
+            user_missing = item['email'] and user is None and item['grades'] is None
+            result['error'] = 'User not found' if user_missing else 'No grades available'
+        elif analysis is None:
+            to_llm.append((f's{i}', format_transcript(transcripts[i])))
+        results.append(result)
+        analyses.append(analysis)
+
+    # 2. Everything the lexicon could not score goes to the LLM, several students per request
+    t0 = time.perf_counter()
+    llm_analyses, llm_requests = analyze_with_llm(llm, to_llm)
+    for sid, _ in to_llm:
+        i = int(sid[1:])
+        if sid in llm_analyses:
+            analyses[i] = llm_analyses[sid]
+        else:
+            results[i]['error'] = 'Analysis unavailable'
+    timings['llm_seconds'] = time.perf_counter() - t0
+
+    for result, analysis in zip(results, analyses):
+        if analysis:
+            result['primary_archetype'] = analysis.get('primary_archetype')
+            result['archetype_percentages'] = analysis.get('archetype_percentages')
+            result['method'] = analysis.get('method') or 'llm'
+
+    # 3. One bulk write for every new analysis (the last item wins for a repeated email)
+    write = {'written': 0, 'mode': 'skipped'}
+    if save and supabase is not None:
+        t0 = time.perf_counter()
+        rows: Dict[Any, Dict[str, Any]] = {}
+        for i, item in enumerate(items):
+            user = users.get(item['email'])
+            if not user or not analyses[i] or results[i]['cached']:
+                continue
+            notes = load_notes(user.get('tor_notes'))
+            ar = notes.get('analysis_results') or {}
+            ar['archetype_analysis'] = analyses[i]
+            ar['archetype_transcript_hash'] = digests[i]
+            notes['analysis_results'] = ar
+            rows[user['user_id']] = {'user_id': user['user_id'], **archetype_columns(analyses[i]),
+                                     'tor_notes': json.dumps(notes)}
+        write = bulk_write_archetypes(supabase, list(rows.values()))
+        timings['write_seconds'] = time.perf_counter() - t0
+
+    # 4. Population histogram once for the whole batch, reloaded when this batch changed it
+    population_counts: Dict[str, int] = {}
+    if supabase is not None:
+        t0 = time.perf_counter()
+        try:
+            population_counts = get_archetype_population().counts(supabase, refresh=bool(write['written']))
+        except Exception as e:
+            print(f"[OBJECTIVE-2] Stats Error: {e}")
+        timings['population_seconds'] = time.perf_counter() - t0
+
+    timings['total_seconds'] = time.perf_counter() - started
+    return {
+        'results': results,
+        'requested': len(items),
+        'analyzed': sum(1 for r in results if r.get('primary_archetype') and not r['cached']),
+        'cached': sum(1 for r in results if r['cached']),
+        'llm_requests': llm_requests,
+        'saved': write['written'],
+        'write_mode': write['mode'],
+        'population_counts': population_counts,
+        'timings': {name: round(value, 4) for name, value in timings.items()},
+    }
@@ -0,0 +1,133 @@
+"""
+Population histogram of primary archetypes for Objective 2.
+
+The counts come from the get_archetype_population_counts RPC, which reads a
+small counter table maintained by a trigger on users.primary_archetype
+(migrations/2025-10-23-create-archetype-population-counts.sql), so the cost
+does not grow with the number of users. Until that migration is applied the
+counts fall back to scanning users.primary_archetype, as the endpoint used to.
+
+Either way the result is cached per process for ARCHETYPE_POPULATION_TTL_SECONDS
+(default 60). Archetype changes made by this process are applied to the cached
+histogram right away, so a student sees their own result counted.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+SCAN_PAGE_SIZE = 1000
+
+
+def archetype_label(value: Any) -> Optional[str]:
+    """'investigative' -> 'Investigative' (same rule as the SQL archetype_label)."""
+    return value.capitalize() if isinstance(value, str) and value else None
+
+
+class ArchetypePopulation:
+    def __init__(self, ttl_seconds: float = 60.0):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._counts: Optional[Dict[str, int]] = None
+        self._loaded_at = 0.0
+        self._source: Optional[str] = None
+        self._rpc_warned = False
+        self._stats = {'hits': 0, 'refreshes': 0, 'rpc_loads': 0, 'scan_loads': 0, 'rpc_errors': 0}
+
+    def _fresh(self) -> bool:
+        return self._counts is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    def counts(self, supabase, refresh: bool = False) -> Dict[str, int]:
+        """{archetype: users}; served from the cache while it is younger than the TTL."""
+        with self._lock:
+            if not refresh and self._fresh():
+                self._stats['hits'] += 1
+                return dict(self._counts)
+        # One refresh at a time; concurrent callers use its result
+        with self._refresh_lock:
+            with self._lock:
+                if not refresh and self._fresh():
+                    self._stats['hits'] += 1
+                    return dict(self._counts)
+            counts, source = self._load(supabase)
+            with self._lock:
+                self._counts, self._source, self._loaded_at = counts, source, time.monotonic()
+                self._stats['refreshes'] += 1
+                return dict(counts)
+
+    def _load(self, supabase):
+        try:
+            rows = supabase.rpc('get_archetype_population_counts', {}).execute().data or []
+            with self._lock:
+                self._stats['rpc_loads'] += 1
+            return {r['archetype']: int(r['user_count']) for r in rows if r.get('archetype')}, 'rpc'
+        except Exception as e:
+            # Not migrated yet (or a transient error): scan this time, try the RPC again next refresh
+            with self._lock:
+                self._stats['rpc_errors'] += 1
+                warn = not self._rpc_warned
+                self._rpc_warned = True
+            if warn:
+                print(f"[OBJECTIVE-2] Population RPC unavailable, scanning users instead: {e}")
+        counts: Dict[str, int] = {}
+        offset = 0
+        while True:
+            rows = (supabase.table('users').select('primary_archetype')
+                    .not_.is_('primary_archetype', 'null')
+                    .order('user_id').range(offset, offset + SCAN_PAGE_SIZE - 1).execute().data or [])
+            for r in rows:
+                label = archetype_label(r.get('primary_archetype'))
+                if label:
+                    counts[label] = counts.get(label, 0) + 1
+            if len(rows) < SCAN_PAGE_SIZE:
+                break
+            offset += SCAN_PAGE_SIZE
+        with self._lock:
+            self._stats['scan_loads'] += 1
+        return counts, 'scan'
+
+    def record_change(self, previous: Any, current: Any) -> None:
+        """Apply one user's archetype change (None = no archetype) to the cached histogram."""
+        previous, current = archetype_label(previous), archetype_label(current)
+        if previous == current:
+            return
+        with self._lock:
+            if self._counts is None:
+                return
+            if previous and self._counts.get(previous):
+                self._counts[previous] -= 1
+                if not self._counts[previous]:
+                    del self._counts[previous]
+            if current:
+                self._counts[current] = self._counts.get(current, 0) + 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._counts = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'source': self._source,
+                'ttl_seconds': self.ttl_seconds,
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._counts is not None else None,
+                'archetypes': len(self._counts or {}),
+            }
+
+
+_population: Optional[ArchetypePopulation] = None
+_population_lock = threading.Lock()
+
+
+def get_archetype_population() -> ArchetypePopulation:
+    """Process-wide histogram cache; ARCHETYPE_POPULATION_TTL_SECONDS."""
+    global _population
+    with _population_lock:
+        if _population is None:
+            _population = ArchetypePopulation(
+                ttl_seconds=float(os.getenv('ARCHETYPE_POPULATION_TTL_SECONDS', 60)),
+            )
+        return _population
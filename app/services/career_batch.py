@@ -0,0 +1,215 @@
+"""
+Batch career forecasting for whole cohorts (a section or year level).
+
+The per-student /process endpoints pay a Supabase lookup, a predict call and
+an update per HTTP request. Here grades (sent directly or read from
+users.grades by email) are mapped to canonical subject columns
+(feature_builder) in one float32 matrix, scored with a
+single vectorized predict, reduced to the top 6 careers with a partial sort,
+and written back with one bulk RPC (bulk_update_career_forecasts, see
+migrations/2025-10-20-create-rpc-bulk-update-career-forecasts.sql).
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.feature_builder import fit_width, get_feature_builder, get_feature_cache
+from app.services.forecast_memo import forecast_key
+
+TOP_K = 6
+MAX_BATCH_ROWS = int(os.getenv('CAREER_BATCH_MAX_ROWS', 2000))
+PREDICT_CHUNK_ROWS = int(os.getenv('CAREER_BATCH_PREDICT_CHUNK', 512))
+LOOKUP_CHUNK = 200
+
+
+def predict_in_chunks(predict: Callable, X: np.ndarray, chunk_rows: int = PREDICT_CHUNK_ROWS) -> np.ndarray:
+    if len(X) <= chunk_rows:
+        return np.asarray(predict(X))
+    return np.vstack([np.asarray(predict(X[i:i + chunk_rows])) for i in range(0, len(X), chunk_rows)])
+
+
+def top_k_careers(Y: np.ndarray, labels: Sequence[str], k: int = TOP_K) -> List[Optional[Tuple[List[str], List[float]]]]:
+    """Min-max normalize each row and keep the k best careers, best first.
+
+    Uses argpartition (O(labels)) instead of sorting all labels per student.
+    Rows with constant scores yield None, like the single-student path.
+    """
+    Y = np.asarray(Y, dtype=np.float64)
+    n, n_labels = Y.shape
+    k = min(k, n_labels)
+    s_min = Y.min(axis=1, keepdims=True)
+    span = Y.max(axis=1, keepdims=True) - s_min
+    constant = span[:, 0] == 0
+    probs = (Y - s_min) / np.where(span == 0, 1.0, span)
+
+    if k < n_labels:
+        top = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(n_labels), (n, 1))
+    top_probs = np.take_along_axis(probs, top, axis=1)
+    # Order the k winners by score, ties by label position (as the stable sort in /process)
+    order = np.lexsort((top, -top_probs), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_probs = np.take_along_axis(top_probs, order, axis=1)
+
+    results: List[Optional[Tuple[List[str], List[float]]]] = []
+    for i in range(n):
+        if constant[i]:
+            results.append(None)
+            continue
+        results.append(([labels[j] for j in top[i]], [round(float(p), 4) for p in top_probs[i]]))
+    return results
+
+
+def fetch_users_by_email(supabase, emails: Sequence[str],
+                         columns: str = 'user_id, email, grades') -> Dict[str, Dict[str, Any]]:
+    """email -> user row (columns must include email) with one `in` query per LOOKUP_CHUNK emails."""
+    users: Dict[str, Dict[str, Any]] = {}
+    unique = sorted({e for e in emails if e})
+    for i in range(0, len(unique), LOOKUP_CHUNK):
+        chunk = unique[i:i + LOOKUP_CHUNK]
+        resp = supabase.table('users').select(columns).in_('email', chunk).execute()
+        for row in resp.data or []:
+            users[(row.get('email') or '').strip().lower()] = row
+    return users
+
+
+def bulk_write_forecasts(supabase, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Write career_top_jobs/_scores for many users.
+
+    rows: [{'user_id', 'career_top_jobs', 'career_top_jobs_scores',
+    'career_model_version', 'career_forecast_key', 'career_program'}]. Uses the bulk RPC in one round trip; falls back
+    to per-row updates when the function has not been installed yet.
+    """
+    if not rows:
+        return {'written': 0, 'mode': 'none'}
+    analyzed_at = datetime.now(timezone.utc).isoformat()
+    payload = [{
+        'user_id': row['user_id'],
+        'career_top_jobs': row['career_top_jobs'],
+        'career_top_jobs_scores': row['career_top_jobs_scores'],
+        'career_model_version': row.get('career_model_version'),
+        'career_forecast_key': row.get('career_forecast_key'),
+        'career_program': row.get('career_program'),
+        'career_forecast_analyzed_at': row.get('career_forecast_analyzed_at') or analyzed_at,
+    } for row in rows]
+    try:
+        resp = supabase.rpc('bulk_update_career_forecasts', {'payload': payload}).execute()
+        written = resp.data if isinstance(resp.data, int) else len(payload)
+        return {'written': written, 'mode': 'rpc'}
+    except Exception as e:
+        print(f"[CAREER_BATCH] Bulk RPC unavailable, falling back to per-row updates: {e}")
+
+    written = 0
+    for row in payload:
+        try:
+            update = {key: value for key, value in row.items()
+                      if key != 'user_id' and not (key in ('career_forecast_key', 'career_program') and value is None)}
+            supabase.table('users').update(update).eq('user_id', row['user_id']).execute()
+            written += 1
+        except Exception as e:
+            print(f"[CAREER_BATCH] Update failed for user {row['user_id']}: {e}")
+    return {'written': written, 'mode': 'per_row'}
+
+
+def parse_batch_request(data: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Normalize {'items': [{'email', 'grades'}]} and/or {'emails': [...]} into batch items.
+
+    Items without grades are filled from users.grades later.
+    """
+    items: List[Dict[str, Any]] = []
+    for raw in data.get('items') or []:
+        if not isinstance(raw, dict):
+            continue
+        email = (raw.get('email') or '').strip().lower()
+        grades = raw.get('grades')
+        items.append({'email': email, 'grades': grades if isinstance(grades, (list, dict)) else None})
+    for email in data.get('emails') or []:
+        email = (email or '').strip().lower() if isinstance(email, str) else ''
+        if email:
+            items.append({'email': email, 'grades': None})
+    if not items:
+        return [], 'Provide items [{email, grades}] or emails [...]'
+    if len(items) > MAX_BATCH_ROWS:
+        return [], f'Batch too large ({len(items)} > {MAX_BATCH_ROWS})'
+    return items, None
+
+
+def run_batch_forecast(supabase, items: List[Dict[str, Any]], predict: Callable, labels: Sequence[str],
+                       n_features: int, save: bool = True, model_version: Optional[str] = None,
+                       program: str = 'IT') -> Dict[str, Any]:
+    """Resolve grades, predict once for the whole batch, and optionally persist the top 6."""
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    emails = [item['email'] for item in items if item['email']]
+    users = fetch_users_by_email(supabase, emails) if emails and supabase is not None else {}
+    timings['lookup_seconds'] = time.perf_counter() - started
+
+    raw_grades = []
+    for item in items:
+        grades = item['grades']
+        if grades is None:
+            grades = (users.get(item['email']) or {}).get('grades') or []
+        raw_grades.append(grades)
+    features, mask, _ = get_feature_cache().get_or_build_many(
+        get_feature_builder(program), [item['email'] for item in items], raw_grades)
+    counts = mask.sum(axis=1)
+
+    results: List[Dict[str, Any]] = []
+    scored: List[int] = []
+    for i, item in enumerate(items):
+        result = {'email': item['email'], 'grades_count': int(counts[i])}
+        if not counts[i]:
+            user_missing = item['email'] and item['email'] not in users and item['grades'] is None
+            result['error'] = 'User not found' if user_missing else 'No grades available'
+        else:
+            scored.append(i)
+        results.append(result)
+
+    t0 = time.perf_counter()
+    if scored:
+        X = fit_width(features[scored], n_features)
+        Y = predict_in_chunks(predict, X)
+        if Y.ndim == 1:
+            raise ValueError('Model output shape invalid (expected multi-target)')
+        for index, row, top in zip(scored, X, top_k_careers(Y, labels)):
+            results[index]['forecast_key'] = forecast_key(model_version, row, n_features)
+            if top is None:
+                results[index]['error'] = 'Model produced constant scores'
+            else:
+                results[index]['career_top_jobs'], results[index]['career_top_jobs_scores'] = top
+    timings['predict_seconds'] = time.perf_counter() - t0
+
+    write = {'written': 0, 'mode': 'skipped'}
+    if save and supabase is not None:
+        t0 = time.perf_counter()
+        rows = []
+        for result in results:
+            user = users.get(result['email'])
+            if user and result.get('career_top_jobs'):
+                rows.append({
+                    'user_id': user['user_id'],
+                    'career_top_jobs': result['career_top_jobs'],
+                    'career_top_jobs_scores': result['career_top_jobs_scores'],
+                    'career_model_version': model_version,
+                    'career_forecast_key': result.get('forecast_key'),
+                    'career_program': program,
+                })
+        write = bulk_write_forecasts(supabase, rows)
+        timings['write_seconds'] = time.perf_counter() - t0
+
+    timings['total_seconds'] = time.perf_counter() - started
+    return {
+        'results': results,
+        'requested': len(items),
+        'forecasted': sum(1 for r in results if r.get('career_top_jobs')),
+        'saved': write['written'],
+        'write_mode': write['mode'],
+        'career_model_version': model_version,
+        'timings': {name: round(value, 4) for name, value in timings.items()},
+    }
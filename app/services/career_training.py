@@ -0,0 +1,119 @@
+"""
+Training code for the career forecasting forests.
+
+Kept free of Flask/Supabase imports so it can run inside the training worker
+process (see training_jobs). Datasets are either labeled samples posted to
+/api/objective-1-cs/train or the synthetic signals used to bootstrap models.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def samples_to_arrays(samples: Sequence[Dict[str, Any]], labels: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Build float32 X, Y from [{'grades': [...], 'labels': {job: score}}] (same rules as /train).
+
+    Grades are clamped to 0..4, scores to 0..1, and rows are zero-padded to the
+    longest grade vector. Returns empty arrays when no sample has grades.
+    """
+    from app.services.training_ingest import SampleArrayBuilder
+
+    builder = SampleArrayBuilder(labels, initial_capacity=max(1, len(samples)))
+    for s in samples:
+        if isinstance(s, dict):
+            lbs = s.get('labels')
+            builder.add(s.get('grades'), lbs if isinstance(lbs, dict) else None)
+    X, Y, _ = builder.finish()
+    return X, Y
+
+
+# Synthetic bootstrap signals: job j averages a window of `window` courses starting at
+# (j * stride) % (feature_len - wrap), weighted linearly from `low` to `high`
+SYNTHETIC_PROFILES = {
+    'it': {'min_samples': 500, 'samples_per_feature': 20, 'stride': 3, 'wrap': 5, 'window': 10,
+           'low': 1.0, 'high': 2.0, 'squash': False},
+    'cs': {'min_samples': 800, 'samples_per_feature': 30, 'stride': 3, 'wrap': 8, 'window': 12,
+           'low': 0.6, 'high': 1.8, 'squash': True},
+}
+
+
+def synthetic_weight_matrix(feature_len: int, n_labels: int, stride: int, wrap: int, window: int,
+                            low: float, high: float) -> np.ndarray:
+    """(feature_len, n_labels) matrix W with X @ W equal to each job's weighted window mean."""
+    W = np.zeros((feature_len, n_labels), dtype=float)
+    for j in range(n_labels):
+        start = (j * stride) % max(1, feature_len - wrap)
+        end = min(feature_len, start + window)
+        W[start:end, j] = np.linspace(low, high, end - start) / (end - start)
+    return W
+
+
+def synthetic_dataset(profile: str, feature_len: int, n_labels: int, seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """Synthetic X, Y for a profile in SYNTHETIC_PROFILES; all targets come from one matrix product.
+
+    Draws the same random stream as the former per-job loop (features, then
+    one noise column per job), so a seed reproduces the same dataset.
+    """
+    spec = SYNTHETIC_PROFILES[profile]
+    n_samples = max(spec['min_samples'], feature_len * spec['samples_per_feature'])
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(0.0, 4.0, size=(n_samples, feature_len)).astype(float)
+    W = synthetic_weight_matrix(feature_len, n_labels, spec['stride'], spec['wrap'], spec['window'],
+                                spec['low'], spec['high'])
+    signal = X @ W
+    if spec['squash']:
+        signal = np.tanh(signal / 3.0)
+    # (n_labels, n_samples) in C order is the per-job draw sequence
+    Y = signal + rng.normal(0, 0.05, size=(n_labels, n_samples)).T
+    return X, Y
+
+
+def synthetic_it_dataset(feature_len: int, n_labels: int, seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """Signals used by /api/objective-1/bootstrap-model: each job weights a sliding window of courses."""
+    return synthetic_dataset('it', feature_len, n_labels, seed)
+
+
+def synthetic_cs_dataset(feature_len: int, n_labels: int, seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """Signals used to bootstrap CS models for a given grade-vector length."""
+    return synthetic_dataset('cs', feature_len, n_labels, seed)
+
+
+def fit_forest(X: np.ndarray, Y: np.ndarray, n_estimators: int, max_depth: Optional[int], random_state: int = 42,
+               n_jobs: int = 1, oob_score: bool = True, steps: int = 10,
+               progress: Optional[Callable[[float], None]] = None):
+    """Fit a RandomForestRegressor in ``steps`` warm-start increments so progress can be reported.
+
+    The OOB score (R^2 on out-of-bag rows) is computed once, on the final
+    increment. Returns (model, metrics).
+    """
+    from sklearn.ensemble import RandomForestRegressor
+
+    # OOB needs bootstrap rows left out; skip it for tiny datasets where it is meaningless
+    oob_score = bool(oob_score and len(X) >= 20)
+    model = RandomForestRegressor(random_state=random_state, n_estimators=0, max_depth=max_depth,
+                                  n_jobs=n_jobs, warm_start=True)
+    steps = max(1, min(steps, n_estimators))
+    started = time.perf_counter()
+    for step in range(1, steps + 1):
+        model.n_estimators = max(1, round(n_estimators * step / steps))
+        if step == steps:
+            model.oob_score = oob_score
+        model.fit(X, Y)
+        if progress is not None:
+            progress(step / steps)
+    fit_seconds = time.perf_counter() - started
+    model.warm_start = False
+
+    metrics = {
+        'fit_seconds': round(fit_seconds, 3),
+        'n_samples': int(X.shape[0]),
+        'n_features': int(X.shape[1]),
+        'n_outputs': int(Y.shape[1]) if Y.ndim > 1 else 1,
+        'n_estimators': int(n_estimators),
+        'max_depth': max_depth,
+        'n_jobs': n_jobs,
+        'oob_score': round(float(model.oob_score_), 4) if oob_score else None,
+    }
+    return model, metrics
@@ -0,0 +1,318 @@
+"""
+Canonical feature vectors for the career models.
+
+Column j of a program's feature vector is always the same subject: the
+program's entries of SUBJECT_MASTER_DICT in declaration order (70 for IT,
+75 for CS, the widths the models are trained with; SUBJECT_CODES lacks three
+IT subjects, so it does not define columns). Extracted grades are placed by
+subject instead of by position, so a transcript that is missing a subject or
+lists subjects in another order still lines up with the model.
+
+Accepted grade inputs (per student):
+  - grade objects from TOR extraction / users.grades:
+        [{"courseCode": "ICC 0101.1", "subject": "...", "grade": 3.5}, ...]
+    matched by master key ("it_fy1_icc0101_1"), then by normalized course
+    code, then by normalized subject title;
+  - a {master key: grade} mapping;
+  - a plain numeric array, taken as already being in canonical order.
+
+The models take grades on a 0..4 scale (higher is better). Plain arrays and
+mappings are read on that scale, like /process always did, and values outside
+0..4 are ignored. Grade objects come from TOR extraction, which standardizes
+grades to the 1.00 (best) .. 5.00 (failed) scale, so they are converted once
+here (tor_to_model_scale: 1.00 -> 4.0, 5.00 -> 0.0) instead of dropping every
+grade above 4. Subjects without a usable grade are left at FILL_VALUE and
+flagged False in the mask. When grade objects
+carry no recognizable subject at all, their values fall back to positional
+order (the previous behaviour) and the result is marked 'positional'.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.routes.subject_master_list import SUBJECT_MASTER_DICT
+
+FILL_VALUE = 0.0
+PROGRAMS = ('IT', 'CS')
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def _norm_code(value: Any) -> str:
+    return _NON_ALNUM.sub('', str(value or '').lower())
+
+
+def _norm_title(value: Any) -> str:
+    return ' '.join(_NON_ALNUM.sub(' ', str(value or '').lower()).split())
+
+
+def _usable_grade(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    try:
+        x = float(value)
+    except (TypeError, ValueError):
+        return None
+    return x if 0 <= x <= 4 else None
+
+
+def tor_to_model_scale(value: Any) -> Optional[float]:
+    """TOR grade (1.00 best .. 5.00 failed) -> model scale (4.0 best .. 0.0); None if not on that scale."""
+    if isinstance(value, bool):
+        return None
+    try:
+        x = float(value)
+    except (TypeError, ValueError):
+        return None
+    return 5.0 - x if 1 <= x <= 5 else None
+
+
+class CanonicalFeatureBuilder:
+    """Maps one program's grade inputs to fixed column indices via precomputed lookup tables."""
+
+    def __init__(self, program: str):
+        self.program = program.upper()
+        prefix = self.program.lower() + '_'
+        self.columns: List[str] = [key for key in SUBJECT_MASTER_DICT if key.startswith(prefix)]
+        self.n_columns = len(self.columns)
+
+        self._by_key: Dict[str, int] = {key: j for j, key in enumerate(self.columns)}
+        self._by_code: Dict[str, int] = {}
+        self._by_title: Dict[str, int] = {}
+        for j, key in enumerate(self.columns):
+            # 'it_fy1_icc0101_1' -> course code 'icc01011' (as in 'ICC0101.1' on a TOR)
+            self._by_code.setdefault(_norm_code(key.split('_', 2)[2]), j)
+            self._by_title.setdefault(_norm_title(SUBJECT_MASTER_DICT[key].get('title')), j)
+
+    def column_of(self, item: Dict[str, Any]) -> Optional[int]:
+        """Column for one grade object, or None when its subject is not in this program."""
+        code = item.get('courseCode') or item.get('course_code') or item.get('code')
+        if code:
+            j = self._by_key.get(str(code).strip().lower())
+            if j is None:
+                j = self._by_code.get(_norm_code(code))
+            if j is not None:
+                return j
+        title = item.get('subject') or item.get('title') or item.get('descriptive_title')
+        if title:
+            return self._by_title.get(_norm_title(title))
+        return None
+
+    def _placements(self, grades: Any) -> Tuple[Dict[int, float], Dict[str, Any]]:
+        """column -> grade for one student (later entries win, e.g. a retaken subject)."""
+        placed: Dict[int, float] = {}
+        info = {'mode': 'subjects', 'matched': 0, 'unmatched': 0, 'invalid': 0}
+        if isinstance(grades, dict):
+            for key, value in grades.items():
+                j = self._by_key.get(str(key).strip().lower())
+                x = _usable_grade(value)
+                if j is None:
+                    info['unmatched'] += 1
+                elif x is None:
+                    info['invalid'] += 1
+                else:
+                    placed[j] = x
+            info['matched'] = len(placed)
+            return placed, info
+
+        items = list(grades or [])
+        if not any(isinstance(item, dict) for item in items):
+            info['mode'] = 'positional'
+            for j, value in enumerate(items[:self.n_columns]):
+                x = _usable_grade(value)
+                if x is None:
+                    info['invalid'] += 1
+                else:
+                    placed[j] = x
+            info['matched'] = len(placed)
+            return placed, info
+
+        unmatched_values: List[float] = []
+        for item in items:
+            if not isinstance(item, dict):
+                info['invalid'] += 1
+                continue
+            x = tor_to_model_scale(item.get('grade'))
+            if x is None:
+                info['invalid'] += 1
+                continue
+            j = self.column_of(item)
+            if j is None:
+                info['unmatched'] += 1
+                unmatched_values.append(x)
+            else:
+                placed[j] = x
+        if not placed and unmatched_values:
+            # Nothing recognizable (e.g. a TOR from another curriculum): keep the old positional layout
+            info['mode'] = 'positional'
+            placed = {j: x for j, x in enumerate(unmatched_values[:self.n_columns])}
+        info['matched'] = len(placed)
+        return placed, info
+
+    def build(self, grades: Any) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """One student -> (values float32 [n_columns], mask bool [n_columns], info)."""
+        X, M, infos = self.build_matrix([grades])
+        return X[0], M[0], infos[0]
+
+    def build_matrix(self, many: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """Many students -> dense X float32 [n, n_columns] and mask bool [n, n_columns].
+
+        Placements are gathered as flat (row, column, value) arrays and written
+        with a single scatter instead of filling rows one subject at a time.
+        """
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        infos: List[Dict[str, Any]] = []
+        for i, grades in enumerate(many):
+            placed, info = self._placements(grades)
+            rows.extend([i] * len(placed))
+            cols.extend(placed.keys())
+            vals.extend(placed.values())
+            infos.append(info)
+        X = np.full((len(many), self.n_columns), FILL_VALUE, dtype=np.float32)
+        M = np.zeros((len(many), self.n_columns), dtype=bool)
+        if rows:
+            r = np.asarray(rows, dtype=np.intp)
+            c = np.asarray(cols, dtype=np.intp)
+            X[r, c] = np.asarray(vals, dtype=np.float32)
+            M[r, c] = True
+        return X, M, infos
+
+
+def detect_grades_program(grades: Any) -> Optional[str]:
+    """'IT' or 'CS' by which program's subjects the grades match best; None when undecidable.
+
+    Plain numeric arrays carry no subjects, and equal matches (only shared
+    general-education courses) do not decide either.
+    """
+    matched = {}
+    for program in PROGRAMS:
+        placed, info = get_feature_builder(program)._placements(grades)
+        matched[program] = len(placed) if info['mode'] == 'subjects' else 0
+    if matched['IT'] == matched['CS']:
+        return None
+    return 'IT' if matched['IT'] > matched['CS'] else 'CS'
+
+
+def fit_width(X: np.ndarray, n_features: int) -> np.ndarray:
+    """Zero-pad or truncate columns to the model's n_features_in_ (models trained on other widths)."""
+    width = X.shape[1]
+    if width == n_features:
+        return X
+    if width > n_features:
+        return X[:, :n_features]
+    return np.pad(X, ((0, 0), (0, n_features - width)), constant_values=FILL_VALUE)
+
+
+_builders: Dict[str, CanonicalFeatureBuilder] = {}
+_builders_lock = threading.Lock()
+
+
+def get_feature_builder(program: str) -> CanonicalFeatureBuilder:
+    """Builder for a program; ValueError when SUBJECT_MASTER_DICT has no '<program>_' subjects."""
+    program = (program or 'IT').upper()
+    with _builders_lock:
+        if program not in _builders:
+            builder = CanonicalFeatureBuilder(program)
+            if not builder.n_columns:
+                raise ValueError(f"No subjects for program {program!r} in SUBJECT_MASTER_DICT")
+            _builders[program] = builder
+        return _builders[program]
+
+
+def _input_digest(grades: Any) -> str:
+    blob = json.dumps(grades, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+class FeatureVectorCache:
+    """Per-user LRU of canonical vectors: (program, user) -> (input digest, values, mask, info).
+
+    The digest of the raw grade input is checked on every hit, so new or
+    edited grades rebuild the vector without explicit invalidation.
+    """
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[str, str], tuple]' = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+
+    def get_or_build(self, builder: CanonicalFeatureBuilder, user_key: Optional[str],
+                     grades: Any) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        X, M, infos = self.get_or_build_many(builder, [user_key], [grades])
+        return X[0], M[0], infos[0]
+
+    def get_or_build_many(self, builder: CanonicalFeatureBuilder, user_keys: Sequence[Optional[str]],
+                          many: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray, List[Dict[str, Any]]]:
+        """Cached rows are copied in; all misses are built together with one build_matrix."""
+        n = len(many)
+        X = np.empty((n, builder.n_columns), dtype=np.float32)
+        M = np.empty((n, builder.n_columns), dtype=bool)
+        infos: List[Optional[Dict[str, Any]]] = [None] * n
+        missing: List[int] = []
+        digests: Dict[int, str] = {}
+        with self._lock:
+            for i, (user_key, grades) in enumerate(zip(user_keys, many)):
+                if not user_key or self.max_entries <= 0:
+                    missing.append(i)
+                    continue
+                key = (builder.program, user_key)
+                digests[i] = _input_digest(grades)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == digests[i]:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    X[i], M[i], infos[i] = entry[1], entry[2], entry[3]
+                    continue
+                self._stats['stale' if entry is not None else 'misses'] += 1
+                missing.append(i)
+
+        if missing:
+            Xb, Mb, built = builder.build_matrix([many[i] for i in missing])
+            X[missing], M[missing] = Xb, Mb
+            with self._lock:
+                for row, i in enumerate(missing):
+                    infos[i] = built[row]
+                    if i not in digests:
+                        continue
+                    key = (builder.program, user_keys[i])
+                    self._entries[key] = (digests[i], Xb[row].copy(), Mb[row].copy(), built[row])
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return X, M, infos
+
+    def invalidate(self, user_key: Optional[str] = None) -> None:
+        with self._lock:
+            if user_key is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[1] == user_key]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'max_entries': self.max_entries}
+
+
+_cache: Optional[FeatureVectorCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_feature_cache() -> FeatureVectorCache:
+    """Process-wide per-user vector cache; CAREER_FEATURE_CACHE_ENTRIES (0 disables)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FeatureVectorCache(max_entries=int(os.getenv('CAREER_FEATURE_CACHE_ENTRIES', 20000)))
+        return _cache
@@ -0,0 +1,143 @@
+"""
+Memoized career forecasts.
+
+Students revisit the results page and post the exact same grade vector to
+/api/objective-1/process each time. A forecast only depends on the model and
+the feature vector the model sees, so results are memoized under
+
+    <model version>:<sha256 of the normalized float32 feature vector>
+
+The same key is stored in users.career_forecast_key next to the forecast, so
+the endpoint can tell that the row already holds this exact result and skip
+rewriting it (see migrations/2025-10-22-add-career-forecast-key.sql).
+
+Only versioned bundles (written by model_registry.save_bundle) are memoized:
+an unversioned model file has no stable identity to key on.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+UNVERSIONED = 'unversioned'
+
+
+def normalize_feature_vector(grades: Sequence[float], n_features: int) -> np.ndarray:
+    """Zero-pad or truncate to n_features as float32, exactly what the model is fed."""
+    vec = np.zeros(n_features, dtype=np.float32)
+    values = np.asarray(grades, dtype=np.float32).ravel()[:n_features]
+    vec[:values.size] = values
+    return vec
+
+
+def forecast_key(model_version: Optional[str], grades: Sequence[float], n_features: int) -> Optional[str]:
+    """Memo key for (model version, normalized grades); None when the model is unversioned."""
+    if not model_version or model_version == UNVERSIONED:
+        return None
+    digest = hashlib.sha256(normalize_feature_vector(grades, n_features).tobytes()).hexdigest()
+    return f'{model_version}:{digest}'
+
+
+class ForecastMemo:
+    """In-memory LRU of key -> (top labels, top scores[, explanation]) with a TTL."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # key -> [created_at, labels, scores, explanation or None]; ordered oldest-used first
+        self._entries: 'OrderedDict[str, list]' = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0, 'evictions': 0,
+                       'db_writes': 0, 'db_writes_skipped': 0, 'explanation_hits': 0}
+
+    def get(self, key: Optional[str]) -> Optional[Tuple[List[str], List[float]]]:
+        if key is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            created_at, labels, scores, _ = entry
+            if now - created_at > self.ttl_seconds:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return list(labels), list(scores)
+
+    def put(self, key: Optional[str], labels: Sequence[str], scores: Sequence[float]) -> None:
+        if key is None or self.max_entries <= 0:
+            return
+        with self._lock:
+            previous = self._entries.get(key)
+            # Same key, same forecast: keep an explanation computed earlier
+            explanation = previous[3] if previous is not None else None
+            self._entries[key] = [time.time(), tuple(labels), tuple(scores), explanation]
+            self._entries.move_to_end(key)
+            self._stats['writes'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def get_explanation(self, key: Optional[str]) -> Optional[Dict[str, Any]]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[3] is None or time.time() - entry[0] > self.ttl_seconds:
+                return None
+            self._stats['explanation_hits'] += 1
+            return entry[3]
+
+    def put_explanation(self, key: Optional[str], explanation: Dict[str, Any]) -> None:
+        """Attach an explanation to a memoized forecast (ignored when the forecast is not cached)."""
+        if key is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[3] = explanation
+
+    def record_db_write(self, skipped: bool) -> None:
+        with self._lock:
+            self._stats['db_writes_skipped' if skipped else 'db_writes'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else None,
+            }
+
+
+_memo: Optional[ForecastMemo] = None
+_memo_lock = threading.Lock()
+
+
+def get_forecast_memo() -> ForecastMemo:
+    """Process-wide memo; CAREER_FORECAST_MEMO_ENTRIES (0 disables), CAREER_FORECAST_MEMO_TTL_SECONDS."""
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = ForecastMemo(
+                max_entries=int(os.getenv('CAREER_FORECAST_MEMO_ENTRIES', 10000)),
+                ttl_seconds=float(os.getenv('CAREER_FORECAST_MEMO_TTL_SECONDS', 24 * 3600)),
+            )
+        return _memo
@@ -0,0 +1,259 @@
+"""
+Batch recompute of stale career forecasts.
+
+A forecast is stale when users.career_model_version differs from the version
+of the live model (a new bundle from bootstrap-model, /train or a rollback).
+The recompute pages through users with grades in user_id order. The server
+returns only rows of this program (users.career_program) whose
+career_model_version is not the live one, plus rows not yet tagged with a
+program. Untagged rows are classified from their grades. Rows of another
+program are tagged with it so later runs skip them on the server. Each page
+is scored with one vectorized predict and written with the
+bulk_update_career_forecasts RPC.
+
+The live model is the one the program is served from, resolved through the
+program registry (program_models.json plus CS's variant store), so the
+recompute scores with the same bundle as /api/career.
+
+Resumable: after every written page the last user_id is saved to a checkpoint
+(.cache/forecast_recompute/<program>.json). A run that was stopped or crashed
+continues from there as long as the model version is unchanged; a new model
+version starts over.
+
+Throttled: runs are queued on the training worker (niced, pinned to its CPU
+quota) and keep a duty cycle, sleeping in proportion to the time each page
+took, plus a fixed pause between pages. Nightly cron entry point:
+
+    python -m app.services.forecast_recompute --program IT --max-minutes 60
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'forecast_recompute')
+
+PAGE_SIZE = int(os.getenv('FORECAST_RECOMPUTE_PAGE_SIZE', 500))
+PAUSE_SECONDS = float(os.getenv('FORECAST_RECOMPUTE_PAUSE_SECONDS', 0.5))
+# Share of wall time spent working; 0.5 sleeps as long as each page took
+DUTY_CYCLE = float(os.getenv('FORECAST_RECOMPUTE_DUTY_CYCLE', 0.5))
+
+
+def checkpoint_path(program: str, directory: Optional[str] = None) -> str:
+    return os.path.abspath(os.path.join(directory or DEFAULT_CHECKPOINT_DIR, f'{program.upper()}.json'))
+
+
+def read_checkpoint(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    checkpoint['updated_at'] = datetime.now(timezone.utc).isoformat()
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(checkpoint, fh)
+    os.replace(tmp_path, path)
+
+
+def serving_model_path(program: str) -> str:
+    """Absolute path of the bundle serving ``program`` (program registry); ValueError when there is none."""
+    from app.services.program_registry import get_program_registry
+
+    registry = get_program_registry()
+    program = program.upper()
+    if not registry.spec(program):
+        raise ValueError(f"Unknown program {program!r}")
+    path, error = registry.serving_path(program)
+    if path is None:
+        raise ValueError(error)
+    return os.path.abspath(path)
+
+
+def _stale_query(supabase, program: str, version: str, after_user_id: int, columns: str,
+                 count: Optional[str] = None):
+    return (supabase.table('users').select(columns, count=count)
+            .gt('user_id', after_user_id)
+            .not_.is_('grades', 'null')
+            .or_(f'career_program.is.null,and(career_program.eq.{program},'
+                 f'or(career_model_version.is.null,career_model_version.neq.{version}))'))
+
+
+def _count_stale(supabase, program: str, version: str, after_user_id: int) -> Optional[int]:
+    try:
+        resp = _stale_query(supabase, program, version, after_user_id, 'user_id', count='exact').limit(1).execute()
+        return resp.count
+    except Exception:
+        return None
+
+
+def _tag_programs(supabase, owners: Dict[str, list]) -> None:
+    """Store the detected program of rows that belong to another one, so its runs are the only ones to see them."""
+    for owner, user_ids in owners.items():
+        try:
+            supabase.table('users').update({'career_program': owner}).in_('user_id', user_ids).execute()
+        except Exception as e:
+            print(f"[RECOMPUTE] Could not tag {len(user_ids)} users as {owner}: {e}")
+
+
+def recompute_stale_forecasts(supabase, program: str = 'IT', model_path: Optional[str] = None,
+                              checkpoint_file: Optional[str] = None, page_size: int = PAGE_SIZE,
+                              pause_seconds: float = PAUSE_SECONDS, duty_cycle: float = DUTY_CYCLE,
+                              max_seconds: Optional[float] = None, include_unknown: Optional[bool] = None,
+                              progress: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+    """Recompute and bulk-write stale forecasts for one program; returns the final checkpoint.
+
+    include_unknown: also recompute users whose grades do not tell IT from CS
+    (plain numeric arrays); defaults to True for IT, the default forecaster.
+    Stops with state 'paused' once max_seconds have elapsed.
+    """
+    from app.services.career_batch import bulk_write_forecasts, predict_in_chunks, top_k_careers
+    from app.services.feature_builder import detect_grades_program, fit_width, get_feature_builder
+    from app.services.forecast_memo import forecast_key
+    from app.services.model_registry import bundle_version, get_model_registry
+
+    program = program.upper()
+    model_path = model_path or serving_model_path(program)
+    checkpoint_file = checkpoint_file or checkpoint_path(program)
+    if include_unknown is None:
+        include_unknown = program == 'IT'
+    duty_cycle = min(1.0, max(0.05, duty_cycle))
+
+    bundle, predict = get_model_registry().predictor(model_path)
+    if bundle is None:
+        raise FileNotFoundError(f'Model file not found at {model_path}')
+    labels = bundle.get('labels')
+    n_features = int(getattr(bundle.get('model'), 'n_features_in_', 0))
+    if not labels or not n_features:
+        raise ValueError('Model bundle missing required keys {model, labels}')
+    version = bundle_version(bundle)
+    builder = get_feature_builder(program)
+
+    checkpoint = read_checkpoint(checkpoint_file)
+    if checkpoint.get('model_version') != version or checkpoint.get('state') == 'completed':
+        checkpoint = {'program': program, 'model_version': version, 'last_user_id': 0,
+                      'started_at': datetime.now(timezone.utc).isoformat(),
+                      'scanned': 0, 'recomputed': 0, 'written': 0, 'skipped_other_program': 0,
+                      'skipped_no_grades': 0, 'pages': 0, 'work_seconds': 0.0}
+    checkpoint['state'] = 'running'
+    checkpoint['stale_remaining_at_start'] = _count_stale(supabase, program, version, checkpoint['last_user_id'])
+    _write_checkpoint(checkpoint_file, checkpoint)
+    total = checkpoint['stale_remaining_at_start']
+    done_this_run = 0
+    started = time.monotonic()
+    print(f"[RECOMPUTE] {program} -> {version}: resuming after user {checkpoint['last_user_id']} "
+          f"({total if total is not None else '?'} stale)")
+
+    while True:
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            checkpoint['state'] = 'paused'
+            break
+        t0 = time.perf_counter()
+        resp = (_stale_query(supabase, program, version, checkpoint['last_user_id'], 'user_id, grades')
+                .order('user_id').limit(page_size).execute())
+        rows = resp.data or []
+        if not rows:
+            checkpoint['state'] = 'completed'
+            break
+
+        keep = []
+        owners: Dict[str, list] = {}
+        for row in rows:
+            grades = row.get('grades') or []
+            owner = detect_grades_program(grades)
+            if (owner is not None and owner != program) or (owner is None and not include_unknown):
+                checkpoint['skipped_other_program'] += 1
+                if owner is not None:
+                    owners.setdefault(owner, []).append(row['user_id'])
+            else:
+                keep.append(row)
+        _tag_programs(supabase, owners)
+        X, M, _ = builder.build_matrix([row.get('grades') or [] for row in keep])
+        has_grades = M.any(axis=1)
+        checkpoint['skipped_no_grades'] += int((~has_grades).sum())
+
+        writes = []
+        if has_grades.any():
+            X = fit_width(X[has_grades], n_features)
+            scored = [row for row, ok in zip(keep, has_grades) if ok]
+            Y = predict_in_chunks(predict, X)
+            for row, vec, top in zip(scored, X, top_k_careers(Y, labels)):
+                if top is None:
+                    continue
+                writes.append({'user_id': row['user_id'], 'career_top_jobs': top[0],
+                               'career_top_jobs_scores': top[1], 'career_model_version': version,
+                               'career_forecast_key': forecast_key(version, vec, n_features),
+                               'career_program': program})
+        write = bulk_write_forecasts(supabase, writes)
+
+        busy = time.perf_counter() - t0
+        checkpoint['last_user_id'] = rows[-1]['user_id']
+        checkpoint['scanned'] += len(rows)
+        checkpoint['recomputed'] += len(writes)
+        checkpoint['written'] += write['written']
+        checkpoint['pages'] += 1
+        checkpoint['work_seconds'] = round(checkpoint['work_seconds'] + busy, 3)
+        _write_checkpoint(checkpoint_file, checkpoint)
+        done_this_run += len(rows)
+        if progress is not None and total:
+            progress(min(1.0, done_this_run / total))
+        if len(rows) < page_size:
+            checkpoint['state'] = 'completed'
+            break
+        time.sleep(pause_seconds + busy * (1.0 - duty_cycle) / duty_cycle)
+
+    checkpoint['finished_at'] = datetime.now(timezone.utc).isoformat()
+    _write_checkpoint(checkpoint_file, checkpoint)
+    print(f"[RECOMPUTE] {program} {checkpoint['state']}: {checkpoint['recomputed']} recomputed, "
+          f"{checkpoint['written']} written, {checkpoint['scanned']} scanned in {checkpoint['pages']} pages")
+    return checkpoint
+
+
+def recompute_job_spec(program: str, **options) -> Dict[str, Any]:
+    """Spec for TrainingJobQueue.submit; the checkpoint path doubles as the dedupe target.
+
+    The serving model is resolved now, so the worker scores with the bundle the app serves; ValueError
+    for an unknown program or one without a model yet.
+    """
+    program = program.upper()
+    return {'task': 'recompute_forecasts', 'program': program,
+            'model_path': serving_model_path(program),
+            'target_path': checkpoint_path(program), 'options': options}
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Recompute stale career forecasts (nightly job).')
+    from app.services.program_registry import get_program_registry
+
+    parser.add_argument('--program', default='IT', type=str.upper, choices=get_program_registry().programs())
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--max-minutes', type=float, help='pause (resumable) after this long')
+    parser.add_argument('--pause-seconds', type=float, default=PAUSE_SECONDS)
+    parser.add_argument('--duty-cycle', type=float, default=DUTY_CYCLE)
+    parser.add_argument('--nice', type=int, default=int(os.getenv('TRAINING_NICE', 10)))
+    args = parser.parse_args(argv)
+
+    from app.services.supabase_client import get_supabase_client
+    # Registers the CS resolver (the /train bundle, else its canonical-width variant), as in the app
+    import app.routes.objective_1_cs  # noqa: F401
+
+    if args.nice and hasattr(os, 'nice'):
+        os.nice(args.nice)
+    checkpoint = recompute_stale_forecasts(
+        get_supabase_client(), program=args.program, page_size=args.page_size,
+        pause_seconds=args.pause_seconds, duty_cycle=args.duty_cycle,
+        max_seconds=args.max_minutes * 60 if args.max_minutes else None)
+    print(json.dumps(checkpoint, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,300 @@
+"""
+Flattened, vectorized inference for the career RandomForest models.
+
+sklearn's RandomForestRegressor.predict pays input validation plus a joblib
+dispatch per call (worse with n_jobs=-1 stored on the model), which dominates
+single-row latency. export_flat_forest() copies every tree of a fitted forest
+into one set of contiguous node arrays; FlatForest.predict() then walks all
+trees for a whole batch at once with plain NumPy indexing, one step per level.
+
+The traversal mirrors sklearn exactly: X is cast to float32 before comparison
+(as sklearn's tree code does), `x <= threshold` goes left, NaN follows
+missing_go_to_left, and tree outputs are summed in estimator order before
+dividing by the number of trees.
+
+CLI:
+    python -m app.services.forest_engine export models/dt_career.joblib [out.npz]
+    python -m app.services.forest_engine verify models/dt_career.joblib
+"""
+
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots')
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots, n_features, max_depth):
+        self.feature = feature            # int32 [nodes]; 0 for leaves
+        self.threshold = threshold        # float64 [nodes]
+        self.left = left                  # int32 [nodes]; leaves point to themselves
+        self.right = right                # int32 [nodes]; leaves point to themselves
+        self.missing_left = missing_left  # bool [nodes]
+        self.value = value                # float64 [nodes, n_outputs]
+        self.roots = roots                # int32 [n_trees]
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+
+    @property
+    def n_trees(self) -> int:
+        return int(self.roots.shape[0])
+
+    @property
+    def n_outputs(self) -> int:
+        return int(self.value.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(getattr(self, name).nbytes for name in _ARRAYS))
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node index reached in every tree: int array [n_samples, n_trees]."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'X has {X.shape[1]} features, but the forest expects {self.n_features}')
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+        has_nan = bool(np.isnan(X).any())
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = x <= self.threshold[nodes]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_left[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict(self, X) -> np.ndarray:
+        """Same output as RandomForestRegressor.predict: [n_samples, n_outputs]."""
+        leaves = self.apply(X)
+        out = np.zeros((leaves.shape[0], self.n_outputs), dtype=np.float64)
+        for t in range(self.n_trees):
+            out += self.value[leaves[:, t]]
+        out /= self.n_trees
+        return out
+
+    def explain(self, X, outputs=None):
+        """Per-feature contributions for ``outputs`` (default: all), in the same walk as apply().
+
+        Each split on the path moves the node value from parent to child; that
+        delta is credited to the split's feature (Saabas path attribution). For
+        every row, bias + contributions.sum(features) equals predict() up to
+        float rounding.
+
+        Returns (prediction [n, k], bias [k], contributions [n, n_features, k]).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'X has {X.shape[1]} features, but the forest expects {self.n_features}')
+        if outputs is None:
+            def values_at(nodes):
+                return self.value[nodes]
+        else:
+            # Gather only the needed rows and outputs; never copy the whole value table
+            cols = np.asarray(outputs, dtype=np.intp)
+
+            def values_at(nodes):
+                return self.value[nodes[..., None], cols]
+        n = X.shape[0]
+        k = self.n_outputs if outputs is None else len(cols)
+        rows = np.arange(n)[:, None]
+        # Flat (row, feature) slot per tree, so all trees are credited with one add.at per level
+        row_base = np.arange(n)[:, None] * self.n_features
+        nodes = np.broadcast_to(self.roots, (n, self.n_trees)).copy()
+        contributions = np.zeros((n * self.n_features, k), dtype=np.float64)
+        has_nan = bool(np.isnan(X).any())
+        for _ in range(self.max_depth):
+            feature = self.feature[nodes]
+            x = X[rows, feature]
+            go_left = x <= self.threshold[nodes]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_left[nodes]
+            child = np.where(go_left, self.left[nodes], self.right[nodes])
+            moved = child != nodes
+            if not moved.any():
+                break
+            slots = (row_base + feature)[moved]
+            np.add.at(contributions, slots, values_at(child[moved]) - values_at(nodes[moved]))
+            nodes = child
+        contributions /= self.n_trees
+        contributions = contributions.reshape(n, self.n_features, k)
+        bias = values_at(self.roots).mean(axis=0)
+        return bias + contributions.sum(axis=1), bias, contributions
+
+    @property
+    def n_features_in_(self) -> int:
+        # sklearn-style attribute so a FlatForest can be served as a bundle's 'model'
+        return self.n_features
+
+    def prune(self, n_trees: Optional[int] = None, max_depth: Optional[int] = None) -> 'FlatForest':
+        """Keep the first ``n_trees`` trees and cut every tree at ``max_depth``.
+
+        A node at the cut becomes a leaf predicting its stored value, which for
+        regression trees is the (weighted) mean of its training samples, so the
+        result is a coarser version of the same forest rather than a new one.
+        Unreachable nodes are dropped.
+        """
+        n_trees = self.n_trees if n_trees is None else max(1, min(n_trees, self.n_trees))
+        depth_cap = self.max_depth if max_depth is None else max(0, min(max_depth, self.max_depth))
+        keep: list = []
+        new_left: list = []
+        new_right: list = []
+        roots = []
+        for root in self.roots[:n_trees].tolist():
+            base = len(keep)
+            roots.append(base)
+            # BFS so each tree's nodes stay contiguous; children are appended after parents
+            queue = deque([(int(root), 0)])
+            local = {}
+            order = []
+            while queue:
+                node, depth = queue.popleft()
+                local[node] = base + len(order)
+                order.append((node, depth))
+                left, right = int(self.left[node]), int(self.right[node])
+                if left != node and depth < depth_cap:
+                    queue.append((left, depth + 1))
+                    queue.append((right, depth + 1))
+            for node, depth in order:
+                keep.append(node)
+                left, right = int(self.left[node]), int(self.right[node])
+                if left != node and depth < depth_cap:
+                    new_left.append(local[left])
+                    new_right.append(local[right])
+                else:
+                    new_left.append(local[node])
+                    new_right.append(local[node])
+        keep_idx = np.asarray(keep, dtype=np.int64)
+        is_leaf = np.asarray(new_left) == np.arange(len(keep))
+        return FlatForest(
+            feature=np.where(is_leaf, 0, self.feature[keep_idx]).astype(np.int32),
+            threshold=np.ascontiguousarray(self.threshold[keep_idx]),
+            left=np.asarray(new_left, dtype=np.int32),
+            right=np.asarray(new_right, dtype=np.int32),
+            missing_left=np.ascontiguousarray(self.missing_left[keep_idx]),
+            value=np.ascontiguousarray(self.value[keep_idx]),
+            roots=np.asarray(roots, dtype=np.int32),
+            n_features=self.n_features,
+            max_depth=depth_cap,
+        )
+
+    def save(self, path: str) -> None:
+        np.savez(path, n_features=self.n_features, max_depth=self.max_depth,
+                 **{name: getattr(self, name) for name in _ARRAYS})
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = None) -> 'FlatForest':
+        data = np.load(path, mmap_mode=mmap_mode)
+        return cls(**{name: data[name] for name in _ARRAYS},
+                   n_features=int(data['n_features']), max_depth=int(data['max_depth']))
+
+
+def export_flat_forest(model) -> FlatForest:
+    """Flatten a fitted RandomForestRegressor (or single DecisionTreeRegressor)."""
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        if getattr(model, 'tree_', None) is None:
+            raise TypeError(f'{type(model).__name__} is not a tree ensemble')
+        estimators = [model]
+    if not all(getattr(est, 'tree_', None) is not None for est in estimators):
+        raise TypeError(f'{type(model).__name__} is not a tree ensemble')
+
+    features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for est in estimators:
+        tree = est.tree_
+        state = tree.__getstate__()
+        nodes = state['nodes']
+        count = int(tree.node_count)
+        idx = np.arange(count, dtype=np.int64)
+        is_leaf = nodes['left_child'] < 0
+
+        features.append(np.where(is_leaf, 0, nodes['feature']).astype(np.int32))
+        thresholds.append(nodes['threshold'].astype(np.float64))
+        lefts.append((np.where(is_leaf, idx, nodes['left_child']) + offset).astype(np.int32))
+        rights.append((np.where(is_leaf, idx, nodes['right_child']) + offset).astype(np.int32))
+        if 'missing_go_to_left' in nodes.dtype.names:
+            missing.append(nodes['missing_go_to_left'].astype(bool))
+        else:
+            missing.append(np.zeros(count, dtype=bool))
+        # regressors store (node, n_outputs, 1)
+        values.append(np.asarray(state['values'], dtype=np.float64).reshape(count, -1))
+        roots.append(offset)
+        max_depth = max(max_depth, int(tree.max_depth))
+        offset += count
+
+    return FlatForest(
+        feature=np.ascontiguousarray(np.concatenate(features)),
+        threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+        left=np.ascontiguousarray(np.concatenate(lefts)),
+        right=np.ascontiguousarray(np.concatenate(rights)),
+        missing_left=np.ascontiguousarray(np.concatenate(missing)),
+        value=np.ascontiguousarray(np.concatenate(values)),
+        roots=np.asarray(roots, dtype=np.int32),
+        n_features=int(getattr(model, 'n_features_in_', estimators[0].n_features_in_)),
+        max_depth=max_depth,
+    )
+
+
+def verify_against(model, flat: FlatForest, X=None, n_samples: int = 256, seed: int = 0) -> Dict[str, Any]:
+    """Compare FlatForest.predict with model.predict on X (default: random grades in 0..4)."""
+    if X is None:
+        rng = np.random.default_rng(seed)
+        X = rng.uniform(0.0, 4.0, size=(n_samples, flat.n_features))
+    expected = np.asarray(model.predict(X), dtype=np.float64).reshape(len(X), -1)
+    actual = flat.predict(X)
+    diff = float(np.max(np.abs(expected - actual))) if expected.size else 0.0
+    return {
+        'rows': int(len(X)),
+        'max_abs_diff': diff,
+        'exact': bool(np.array_equal(expected, actual)),
+        'ok': bool(np.allclose(expected, actual, rtol=0, atol=1e-12)),
+    }
+
+
+def _time_single_row(fn, X, repeats: int = 200) -> float:
+    row = X[:1]
+    fn(row)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn(row)
+    return (time.perf_counter() - started) / repeats
+
+
+def main(argv) -> int:
+    from joblib import load
+
+    if len(argv) < 2 or argv[0] not in ('export', 'verify'):
+        print(__doc__)
+        return 2
+    command, bundle_path = argv[0], argv[1]
+    bundle = load(bundle_path)
+    model = bundle['model']
+    flat = export_flat_forest(model)
+    report = verify_against(model, flat)
+    rng = np.random.default_rng(1)
+    X = rng.uniform(0.0, 4.0, size=(64, flat.n_features))
+    report['sklearn_single_row_ms'] = round(_time_single_row(model.predict, X) * 1000, 4)
+    report['flat_single_row_ms'] = round(_time_single_row(flat.predict, X) * 1000, 4)
+    report.update({'trees': flat.n_trees, 'nodes': int(flat.feature.shape[0]), 'bytes': flat.nbytes})
+    print(report)
+    if not report['ok']:
+        print('[FOREST_ENGINE] Flattened forest does NOT match model.predict; not exporting.')
+        return 1
+    if command == 'export':
+        out_path = argv[2] if len(argv) > 2 else bundle_path.rsplit('.', 1)[0] + '.flat.npz'
+        flat.save(out_path)
+        print(f'[FOREST_ENGINE] Wrote {out_path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+"""
+Incremental JSON array parser for streamed LLM output.
+
+Feed text chunks as they arrive; every element of the first top-level JSON
+array is returned as soon as its closing bracket/brace has been seen:
+
+    parser = IncrementalJSONArrayParser()
+    for chunk in stream:
+        for item in parser.feed(chunk):
+            handle(item)
+
+Anything before the first '[' (```json fences, a wrapping {"grades": ...}
+object) is skipped, so the parser also works on fenced or wrapped responses.
+"""
+
+import json
+from typing import Any, List
+
+
+class IncrementalJSONArrayParser:
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0            # next character of _buffer to scan
+        self._started = False    # inside the top-level array
+        self._finished = False   # top-level array closed
+        self._depth = 0          # nesting depth inside the current element
+        self._in_string = False
+        self._escape = False
+        self._element_start = None
+        self.items_emitted = 0
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Any]:
+        if self._finished or not chunk:
+            return []
+        self._buffer += chunk
+        items: List[Any] = []
+        buf = self._buffer
+        i = self._pos
+        n = len(buf)
+
+        while i < n:
+            ch = buf[i]
+            if not self._started:
+                if ch == '[':
+                    self._started = True
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 0 and self._element_start is not None:
+                        # Top-level scalar string element
+                        items.append(self._emit(buf[self._element_start:i + 1]))
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 0:
+                    self._element_start = i
+            elif ch in '{[':
+                if self._depth == 0:
+                    self._element_start = i
+                self._depth += 1
+            elif ch in '}]':
+                if self._depth == 0:
+                    # ']' closing the top-level array
+                    self._flush_scalar(buf, i, items)
+                    self._finished = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(self._emit(buf[self._element_start:i + 1]))
+            elif ch == ',' and self._depth == 0:
+                self._flush_scalar(buf, i, items)
+            elif self._depth == 0 and self._element_start is None and not ch.isspace():
+                # Start of a top-level number / literal
+                self._element_start = i
+            i += 1
+
+        # Drop consumed text so long streams do not grow the buffer unbounded
+        keep_from = self._element_start if self._element_start is not None else i
+        self._buffer = buf[keep_from:]
+        if self._element_start is not None:
+            self._element_start = 0
+        self._pos = i - keep_from
+        return items
+
+    def _flush_scalar(self, buf: str, end: int, items: List[Any]) -> None:
+        if self._element_start is None:
+            return
+        raw = buf[self._element_start:end].strip()
+        self._element_start = None
+        if raw:
+            items.append(json.loads(raw))
+            self.items_emitted += 1
+
+    def _emit(self, raw: str) -> Any:
+        self._element_start = None
+        self.items_emitted += 1
+        return json.loads(raw)
@@ -0,0 +1,253 @@
+"""
+Shared response cache for LLM calls.
+
+Prompts sent to Gemini are built from fixed templates, so the same OCR page or
+the same transcript always produces the same prompt. Responses are cached under
+a key derived from the model name, the generation config and a hash of the
+normalized prompt. Lookups go memory -> disk; both tiers honour a TTL and evict
+least-recently-used entries once their size budget is exceeded.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'llm')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse indentation/whitespace differences that do not change meaning."""
+    lines = (' '.join(line.split()) for line in (prompt or '').strip().splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def make_cache_key(model_name: str, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+    """Stable key for (model, generation config, normalized prompt)."""
+    config_blob = json.dumps(generation_config or {}, sort_keys=True, default=str)
+    digest = hashlib.sha256()
+    for part in (model_name or '', config_blob, normalize_prompt(prompt)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier (memory + disk) cache of raw response text."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_memory_entries: int = 512,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = os.path.abspath(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        # key -> (created_at, text); ordered oldest-used first
+        self._memory: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._memory_bytes = 0
+        # key -> size on disk; ordered oldest-used first. Built lazily from the directory and
+        # extended on lookup with entries other processes wrote since.
+        self._disk_index: Optional['OrderedDict[str, int]'] = None
+        self._disk_bytes = 0
+        self._stats = {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+            'expired': 0, 'writes': 0, 'memory_evictions': 0, 'disk_evictions': 0,
+        }
+
+    # --- public API ---
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, text = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return text
+                self._drop_memory(key)
+                self._stats['expired'] += 1
+
+            disk_entry = self._read_disk(key, now)
+            if disk_entry is not None:
+                created_at, text = disk_entry
+                self._put_memory(key, created_at, text)
+                self._stats['disk_hits'] += 1
+                return text
+
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key: str, text: str) -> None:
+        if text is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, now, text)
+            self._write_disk(key, now, text)
+            self._stats['writes'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            index = self._load_disk_index()
+            for key in list(index.keys()):
+                self._remove_disk_file(key)
+            index.clear()
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats['memory_hits'] + self._stats['disk_hits'] + self._stats['misses']
+            hits = self._stats['memory_hits'] + self._stats['disk_hits']
+            return {
+                **self._stats,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk_index) if self._disk_index is not None else None,
+                'disk_bytes': self._disk_bytes if self._disk_index is not None else None,
+            }
+
+    # --- memory tier ---
+
+    def _put_memory(self, key: str, created_at: float, text: str) -> None:
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (created_at, text)
+        self._memory_bytes += len(text)
+        while self._memory and (
+            len(self._memory) > self.max_memory_entries or self._memory_bytes > self.max_memory_bytes
+        ):
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self._stats['memory_evictions'] += 1
+
+    def _drop_memory(self, key: str) -> None:
+        _, text = self._memory.pop(key)
+        self._memory_bytes -= len(text)
+
+    # --- disk tier ---
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f'{key}.json')
+
+    def _load_disk_index(self) -> 'OrderedDict[str, int]':
+        if self._disk_index is not None:
+            return self._disk_index
+        entries = []
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            for root, _, files in os.walk(self.disk_dir):
+                for name in files:
+                    if not name.endswith('.json'):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        entries.sort()
+        self._disk_index = OrderedDict((key, size) for _, key, size in entries)
+        self._disk_bytes = sum(self._disk_index.values())
+        return self._disk_index
+
+    def _read_disk(self, key: str, now: float) -> Optional[tuple]:
+        if not self.disk_dir:
+            return None
+        index = self._load_disk_index()
+        path = self._disk_path(key)
+        if key not in index:
+            # Other workers write to the same directory after this index was built
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return None
+            index[key] = size
+            self._disk_bytes += size
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                payload = json.load(fh)
+            created_at = float(payload['created_at'])
+            text = payload['text']
+        except Exception:
+            self._remove_disk_file(key)
+            return None
+        if now - created_at > self.ttl_seconds:
+            self._remove_disk_file(key)
+            self._stats['expired'] += 1
+            return None
+        try:
+            os.utime(path, None)  # mark as recently used for eviction on restart
+        except OSError:
+            pass
+        index.move_to_end(key)
+        return created_at, text
+
+    def _write_disk(self, key: str, created_at: float, text: str) -> None:
+        if not self.disk_dir:
+            return
+        index = self._load_disk_index()
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                json.dump({'created_at': created_at, 'text': text}, fh)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"[LLM_CACHE] Disk write failed for {key[:12]}: {e}")
+            return
+        if key in index:
+            self._disk_bytes -= index.pop(key)
+        index[key] = size
+        self._disk_bytes += size
+        while index and self._disk_bytes > self.max_disk_bytes:
+            oldest = next(iter(index))
+            self._remove_disk_file(oldest)
+            self._stats['disk_evictions'] += 1
+
+    def _remove_disk_file(self, key: str) -> None:
+        index = self._disk_index
+        if index is not None and key in index:
+            self._disk_bytes -= index.pop(key)
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Process-wide cache configured from the environment.
+
+    LLM_CACHE_TTL_SECONDS, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_DIR,
+    LLM_CACHE_DISK_MAX_MB; set LLM_CACHE_DISK=false to keep the cache in memory only.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            disk_enabled = os.getenv('LLM_CACHE_DISK', 'true').lower() == 'true'
+            _cache = LLMResponseCache(
+                ttl_seconds=float(os.getenv('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600)),
+                max_memory_entries=int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', 512)),
+                disk_dir=(os.getenv('LLM_CACHE_DIR') or DEFAULT_CACHE_DIR) if disk_enabled else None,
+                max_disk_bytes=int(float(os.getenv('LLM_CACHE_DISK_MAX_MB', 256)) * 1024 * 1024),
+            )
+        return _cache
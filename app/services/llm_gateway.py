@@ -0,0 +1,512 @@
+"""
+Unified LLM gateway shared by OCR refinement and archetype analysis.
+
+The gateway owns the Gemini client and is the single place that enforces:
+- a process-wide concurrency cap on in-flight model calls
+- an overall deadline per call (queueing + retries + backoff)
+- retry with exponential backoff on 429 / quota errors
+- response caching (see app.services.llm_cache)
+- structured JSON parsing of model output, including incremental parsing of
+  streamed JSON arrays (stream_json_array)
+- per-caller latency, token and error metrics, plus per-call usage accounting
+  (see app.services.llm_usage)
+
+Backends are pluggable so the routes can run against a local stand-in offline:
+    gateway = get_llm_gateway()
+    gateway.set_backend(CallableBackend(lambda prompt, config: '[]'))
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from app.services.json_stream import IncrementalJSONArrayParser
+from app.services.llm_cache import LLMResponseCache, get_llm_cache, make_cache_key
+from app.services.llm_usage import UsageLedger, current_scope, get_usage_ledger, usage_scope
+
+DEFAULT_MODEL_NAME = 'models/gemini-2.5-flash'
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    error_str = str(error)
+    return '429' in error_str or 'quota' in error_str.lower()
+
+
+def parse_json_text(text: str) -> Any:
+    """Parse model output as JSON, tolerating ```json fences."""
+    cleaned = (text or '').replace('```json', '').replace('```', '').strip()
+    return json.loads(cleaned)
+
+
+# --- Backends ---
+
+class GeminiBackend:
+    """google-generativeai backend; the SDK is imported on first use."""
+
+    name = 'gemini'
+
+    def __init__(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
+        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        self.model_name = model_name or os.getenv('GEMINI_MODEL_NAME', DEFAULT_MODEL_NAME)
+        self._model = None
+        self._init_lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_model(self):
+        with self._init_lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._model = genai.GenerativeModel(self.model_name)
+                print(f"[LLM_GATEWAY] Gemini model initialized: {self.model_name}")
+            return self._model
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None) -> LLMResponse:
+        model = self._get_model()
+        kwargs: Dict[str, Any] = {'request_options': {'timeout': timeout or 600}}
+        if generation_config:
+            kwargs['generation_config'] = generation_config
+        response = model.generate_content(prompt, **kwargs)
+        return self._to_response(response, response.text)
+
+    def generate_stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                        timeout: Optional[float] = None) -> Iterator[LLMResponse]:
+        model = self._get_model()
+        kwargs: Dict[str, Any] = {'request_options': {'timeout': timeout or 600}, 'stream': True}
+        if generation_config:
+            kwargs['generation_config'] = generation_config
+        for chunk in model.generate_content(prompt, **kwargs):
+            try:
+                text = chunk.text
+            except ValueError:
+                text = ''  # e.g. a final chunk carrying only the finish reason
+            yield self._to_response(chunk, text)
+
+    @staticmethod
+    def _to_response(response, text: str) -> LLMResponse:
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMResponse(
+            text=text,
+            prompt_tokens=int(getattr(usage, 'prompt_token_count', 0) or 0),
+            response_tokens=int(getattr(usage, 'candidates_token_count', 0) or 0),
+        )
+
+
+class CallableBackend:
+    """Local stand-in backend: ``responder(prompt, generation_config) -> str``."""
+
+    def __init__(self, responder: Callable[[str, Optional[Dict[str, Any]]], str],
+                 model_name: str = 'local', name: str = 'local'):
+        self.responder = responder
+        self.model_name = model_name
+        self.name = name
+
+    def is_available(self) -> bool:
+        return True
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None) -> LLMResponse:
+        text = self.responder(prompt, generation_config)
+        # Rough whitespace token estimate so metrics stay meaningful offline
+        return LLMResponse(text=text, prompt_tokens=len(prompt.split()), response_tokens=len(text.split()))
+
+
+# name -> zero-arg factory; see register_backend()
+BACKEND_FACTORIES: Dict[str, Callable[[], Any]] = {
+    'gemini': GeminiBackend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], Any]) -> None:
+    """Make a backend selectable through the LLM_BACKEND environment variable."""
+    BACKEND_FACTORIES[name] = factory
+
+
+# --- Gateway ---
+
+class _CallerMetrics:
+    __slots__ = ('calls', 'errors', 'rate_limited', 'deadline_exceeded', 'cache_hits',
+                 'prompt_tokens', 'response_tokens', 'latency_total', 'latency_max')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.deadline_exceeded = 0
+        self.cache_hits = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['latency_avg'] = round(self.latency_total / self.calls, 4) if self.calls else 0.0
+        data['latency_total'] = round(self.latency_total, 4)
+        data['latency_max'] = round(self.latency_max, 4)
+        return data
+
+
+class _CallTrace:
+    """Per-call bookkeeping for metrics and usage accounting."""
+    __slots__ = ('caller', 'label', 'started', 'retries', 'wait_seconds')
+
+    def __init__(self, caller: str, label: Optional[str] = None):
+        self.caller = caller
+        self.label = label
+        self.started = time.monotonic()
+        self.retries = 0
+        self.wait_seconds = 0.0
+
+
+class LLMGateway:
+    def __init__(self, backend, max_concurrency: int = 4, deadline_seconds: float = 600.0,
+                 retries: int = 3, initial_delay: float = 60.0,
+                 cache: Optional[LLMResponseCache] = None, usage: Optional[UsageLedger] = None):
+        self.backend = backend
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.deadline_seconds = deadline_seconds
+        self.retries = retries
+        self.initial_delay = initial_delay
+        self.cache = cache
+        self.usage = usage
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._metrics_lock = threading.Lock()
+        self._metrics: Dict[str, _CallerMetrics] = {}
+
+    # --- configuration ---
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.backend, 'model_name', '') or ''
+
+    def is_available(self) -> bool:
+        return self.backend is not None and self.backend.is_available()
+
+    def set_backend(self, backend) -> None:
+        self.backend = backend
+
+    # --- calls ---
+
+    def generate(self, prompt: str, caller: str, generation_config: Optional[Dict[str, Any]] = None,
+                 deadline_seconds: Optional[float] = None, use_cache: bool = True,
+                 label: Optional[str] = None) -> Optional[str]:
+        """Return raw response text, or None when retries/deadline are exhausted.
+
+        Non-retryable backend errors are re-raised after being counted. ``label``
+        (e.g. "page 3") is stored with the call in the usage ledger.
+        """
+        text, _ = self._generate(prompt, _CallTrace(caller, label), generation_config, deadline_seconds,
+                                 use_cache, validate=None)
+        return text
+
+    def generate_json(self, prompt: str, caller: str, generation_config: Optional[Dict[str, Any]] = None,
+                      deadline_seconds: Optional[float] = None, use_cache: bool = True,
+                      label: Optional[str] = None) -> Any:
+        """Like generate() but returns parsed JSON. Only parseable responses are cached."""
+        _, data = self._generate(prompt, _CallTrace(caller, label), generation_config, deadline_seconds,
+                                 use_cache, validate=parse_json_text)
+        return data
+
+    def _generate(self, prompt, trace, generation_config, deadline_seconds, use_cache, validate):
+        if not self.is_available():
+            return None, None
+
+        caller = trace.caller
+        deadline = trace.started + (deadline_seconds or self.deadline_seconds)
+        cache_key = None
+        if use_cache and self.cache is not None:
+            cache_key = make_cache_key(self.model_name, prompt, generation_config)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                parsed = None
+                try:
+                    parsed = validate(cached) if validate else None
+                    self._record(trace, cache_hit=True)
+                    return cached, parsed
+                except ValueError:
+                    pass  # corrupt entry; fall through to a live call
+
+        response = None
+        try:
+            response = self._call_with_retry(prompt, trace, generation_config, deadline)
+        except Exception:
+            self._record(trace, error=True)
+            raise
+        if response is None:
+            self._record(trace, error=True)
+            return None, None
+
+        text = response.text.strip() if response.text else ''
+        parsed = None
+        if validate:
+            try:
+                parsed = validate(text)
+            except ValueError as e:
+                print(f"[LLM_GATEWAY] {caller}: response was not valid JSON: {e}")
+                self._record(trace, response=response, error=True)
+                return text, None
+        if cache_key is not None:
+            self.cache.set(cache_key, text)
+        self._record(trace, response=response)
+        return text, parsed
+
+    def stream_json_array(self, prompt: str, caller: str, generation_config: Optional[Dict[str, Any]] = None,
+                          deadline_seconds: Optional[float] = None, use_cache: bool = True,
+                          label: Optional[str] = None) -> Iterator[Any]:
+        """Yield each element of the response's JSON array as soon as it is complete.
+
+        Uses the backend's generate_stream() when it has one, otherwise a single
+        buffered call. A 429 is only retried while nothing has been yielded yet.
+
+        The upstream stream is read by a worker thread into a queue, so the
+        concurrency slot is held only while the model is responding, not while a
+        slow consumer (e.g. an SSE client) reads the elements. The queue holds at
+        most one response. Closing the generator early (client disconnect)
+        stops reading upstream; the slot is released and the partial usage recorded.
+        """
+        if not self.is_available():
+            return
+
+        trace = _CallTrace(caller, label)
+        deadline = trace.started + (deadline_seconds or self.deadline_seconds)
+        cache_key = None
+        if use_cache and self.cache is not None:
+            cache_key = make_cache_key(self.model_name, prompt, generation_config)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._record(trace, cache_hit=True)
+                yield from IncrementalJSONArrayParser().feed(cached)
+                return
+
+        items: 'queue.Queue' = queue.Queue()
+        cancelled = threading.Event()
+        worker = threading.Thread(
+            target=self._pump_stream, name='llm-stream', daemon=True,
+            args=(prompt, trace, generation_config, deadline, cache_key, items, cancelled, current_scope()),
+        )
+        worker.start()
+        try:
+            while True:
+                kind, value = items.get()
+                if kind == 'item':
+                    yield value
+                elif kind == 'error':
+                    raise value
+                else:
+                    return
+        finally:
+            cancelled.set()
+
+    def _pump_stream(self, prompt, trace, generation_config, deadline, cache_key, items, cancelled, scope):
+        """Worker side of stream_json_array: call upstream with retries, queue parsed elements."""
+        caller = trace.caller
+        with usage_scope(user=scope.get('user'), endpoint=scope.get('endpoint')):
+            try:
+                current_delay = self.initial_delay
+                for attempt in range(self.retries):
+                    if not self._acquire(trace, deadline):
+                        self._record(trace, error=True)
+                        return
+                    parser = IncrementalJSONArrayParser()
+                    chunks = []
+                    usage = LLMResponse(text='')
+                    try:
+                        remaining = max(1.0, deadline - time.monotonic())
+                        if hasattr(self.backend, 'generate_stream'):
+                            pieces = self.backend.generate_stream(prompt, generation_config=generation_config,
+                                                                  timeout=remaining)
+                        else:
+                            pieces = [self.backend.generate(prompt, generation_config=generation_config,
+                                                            timeout=remaining)]
+                        for piece in pieces:
+                            chunks.append(piece.text or '')
+                            usage.prompt_tokens = max(usage.prompt_tokens, piece.prompt_tokens)
+                            usage.response_tokens = max(usage.response_tokens, piece.response_tokens)
+                            for item in parser.feed(piece.text or ''):
+                                items.put(('item', item))
+                            if cancelled.is_set():
+                                break
+                    except Exception as e:
+                        if parser.items_emitted or not is_rate_limit_error(e):
+                            print(f"[LLM_GATEWAY] {caller}: streaming LLM error: {e}")
+                            self._record(trace, response=usage, error=True)
+                            items.put(('error', e))
+                            return
+                        self._bump(caller, 'rate_limited')
+                    else:
+                        if cancelled.is_set() and not parser.finished:
+                            close = getattr(pieces, 'close', None)
+                            if close is not None:
+                                close()
+                            print(f"[LLM_GATEWAY] {caller}: consumer went away; stream abandoned")
+                        usage.text = ''.join(chunks).strip()
+                        if cache_key is not None and parser.finished:
+                            try:
+                                parse_json_text(usage.text)
+                                self.cache.set(cache_key, usage.text)
+                            except ValueError:
+                                pass
+                        self._record(trace, response=usage, error=not parser.finished)
+                        return
+                    finally:
+                        self._semaphore.release()
+
+                    if cancelled.is_set() or not self._backoff(trace, attempt, current_delay, deadline):
+                        break
+                    current_delay *= 2  # Exponential backoff
+
+                self._record(trace, error=True)
+            finally:
+                items.put(('done', None))
+
+    def _acquire(self, trace: _CallTrace, deadline: float) -> bool:
+        queued_at = time.monotonic()
+        remaining = deadline - queued_at
+        acquired = remaining > 0 and self._semaphore.acquire(timeout=remaining)
+        trace.wait_seconds += time.monotonic() - queued_at
+        if not acquired:
+            self._bump(trace.caller, 'deadline_exceeded')
+            print(f"[LLM_GATEWAY] {trace.caller}: deadline exceeded before call could start.")
+            return False
+        return True
+
+    def _backoff(self, trace: _CallTrace, attempt: int, delay: float, deadline: float) -> bool:
+        """Sleep before the next retry; False when retries or the deadline are exhausted."""
+        caller = trace.caller
+        if attempt + 1 >= self.retries:
+            print(f"[LLM_GATEWAY] {caller}: max retries exceeded.")
+            return False
+        if delay >= deadline - time.monotonic():
+            self._bump(caller, 'deadline_exceeded')
+            print(f"[LLM_GATEWAY] {caller}: rate limited and backoff would pass the deadline.")
+            return False
+        print(f"[LLM_GATEWAY] {caller}: rate limit hit (429). Waiting {delay}s before retry {attempt + 1}/{self.retries}...")
+        time.sleep(delay)
+        trace.retries += 1
+        trace.wait_seconds += delay
+        return True
+
+    def _call_with_retry(self, prompt, trace, generation_config, deadline) -> Optional[LLMResponse]:
+        caller = trace.caller
+        current_delay = self.initial_delay
+        for attempt in range(self.retries):
+            if not self._acquire(trace, deadline):
+                return None
+            try:
+                remaining = max(1.0, deadline - time.monotonic())
+                return self.backend.generate(prompt, generation_config=generation_config, timeout=remaining)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    print(f"[LLM_GATEWAY] {caller}: LLM error (non-retryable): {e}")
+                    raise
+                self._bump(caller, 'rate_limited')
+            finally:
+                self._semaphore.release()
+
+            if not self._backoff(trace, attempt, current_delay, deadline):
+                return None
+            current_delay *= 2  # Exponential backoff
+        return None
+
+    # --- metrics ---
+
+    def _caller_metrics(self, caller: str) -> _CallerMetrics:
+        metrics = self._metrics.get(caller)
+        if metrics is None:
+            metrics = self._metrics[caller] = _CallerMetrics()
+        return metrics
+
+    def _bump(self, caller: str, field: str) -> None:
+        with self._metrics_lock:
+            metrics = self._caller_metrics(caller)
+            setattr(metrics, field, getattr(metrics, field) + 1)
+
+    def _record(self, trace: _CallTrace, response: Optional[LLMResponse] = None,
+                cache_hit: bool = False, error: bool = False) -> None:
+        elapsed = time.monotonic() - trace.started
+        with self._metrics_lock:
+            metrics = self._caller_metrics(trace.caller)
+            metrics.calls += 1
+            metrics.latency_total += elapsed
+            metrics.latency_max = max(metrics.latency_max, elapsed)
+            if cache_hit:
+                metrics.cache_hits += 1
+            if error:
+                metrics.errors += 1
+            if response is not None:
+                metrics.prompt_tokens += response.prompt_tokens
+                metrics.response_tokens += response.response_tokens
+        if self.usage is not None:
+            self.usage.record(
+                trace.caller,
+                prompt_tokens=response.prompt_tokens if response is not None else 0,
+                response_tokens=response.response_tokens if response is not None else 0,
+                retries=trace.retries,
+                wait_seconds=trace.wait_seconds,
+                latency_seconds=elapsed,
+                cache_hit=cache_hit,
+                error=error,
+                label=trace.label,
+            )
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            callers = {name: m.as_dict() for name, m in self._metrics.items()}
+        return {
+            'backend': getattr(self.backend, 'name', type(self.backend).__name__),
+            'model_name': self.model_name,
+            'max_concurrency': self.max_concurrency,
+            'callers': callers,
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Process-wide gateway configured from the environment.
+
+    LLM_BACKEND (default gemini), LLM_MAX_CONCURRENCY, LLM_DEADLINE_SECONDS,
+    LLM_RETRIES, LLM_RETRY_INITIAL_DELAY; LLM_CACHE=false disables caching.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            backend_name = os.getenv('LLM_BACKEND', 'gemini').lower()
+            if backend_name in ('record', 'replay'):
+                import app.services.llm_replay  # noqa: F401 - registers the record/replay backends
+            factory = BACKEND_FACTORIES.get(backend_name)
+            if factory is None:
+                print(f"[LLM_GATEWAY] WARNING: Unknown LLM_BACKEND '{backend_name}', using gemini.")
+                factory = GeminiBackend
+            backend = factory()
+            cache = get_llm_cache() if os.getenv('LLM_CACHE', 'true').lower() == 'true' else None
+            _gateway = LLMGateway(
+                backend,
+                max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', 4)),
+                deadline_seconds=float(os.getenv('LLM_DEADLINE_SECONDS', 600)),
+                retries=int(os.getenv('LLM_RETRIES', 3)),
+                initial_delay=float(os.getenv('LLM_RETRY_INITIAL_DELAY', 60)),
+                cache=cache,
+                usage=get_usage_ledger(),
+            )
+            if not backend.is_available():
+                print(f"[LLM_GATEWAY] WARNING: LLM backend '{backend_name}' is not configured; LLM features are disabled.")
+        return _gateway
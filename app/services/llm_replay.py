@@ -0,0 +1,200 @@
+"""
+Record/replay LLM backends for offline load testing.
+
+record: wraps the live Gemini backend and appends every prompt -> response pair
+        to a JSONL cassette (LLM_RECORD_PATH).
+replay: serves responses from that cassette with no network, adding configurable
+        latency and injected 429 errors so retry/backoff and the gateway's
+        concurrency cap behave as they would against the real API.
+
+Select with LLM_BACKEND=record / LLM_BACKEND=replay; see benchmark_llm_replay.py.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from app.services.llm_cache import make_cache_key
+from app.services.llm_gateway import GeminiBackend, LLMResponse, register_backend
+
+DEFAULT_CASSETTE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'llm_cassette.jsonl')
+
+
+def cassette_key(prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> str:
+    """Model-agnostic key so a cassette recorded on one model replays on any."""
+    return make_cache_key('', prompt, generation_config)
+
+
+class RecordingBackend:
+    """Pass calls through to ``inner`` and append each successful exchange to ``path``."""
+
+    name = 'record'
+
+    def __init__(self, inner=None, path: Optional[str] = None):
+        self.inner = inner or GeminiBackend()
+        self.path = os.path.abspath(path or os.getenv('LLM_RECORD_PATH') or DEFAULT_CASSETTE_PATH)
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.inner, 'model_name', '')
+
+    def is_available(self) -> bool:
+        return self.inner.is_available()
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None) -> LLMResponse:
+        started = time.monotonic()
+        response = self.inner.generate(prompt, generation_config=generation_config, timeout=timeout)
+        entry = {
+            'key': cassette_key(prompt, generation_config),
+            'model_name': self.model_name,
+            'generation_config': generation_config or {},
+            'prompt': prompt,
+            'text': response.text,
+            'prompt_tokens': response.prompt_tokens,
+            'response_tokens': response.response_tokens,
+            'latency': round(time.monotonic() - started, 4),
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as fh:
+                fh.write(json.dumps(entry) + '\n')
+        return response
+
+
+class ReplayBackend:
+    """Serve recorded responses offline.
+
+    latency: seconds per call, or 'recorded' to reuse each entry's captured latency.
+    latency_scale: multiplier applied to the latency (e.g. 0.1 for a 10x faster API).
+    jitter: uniform +/- seconds added to each call.
+    rate_limit_rate: probability (0..1) that a call raises a synthetic 429.
+    on_miss: 'error' raises for unknown prompts; 'empty' returns '[]' for JSON requests and '{}' otherwise.
+    """
+
+    name = 'replay'
+
+    def __init__(self, path: Optional[str] = None, latency: Any = 0.0, latency_scale: float = 1.0,
+                 jitter: float = 0.0, rate_limit_rate: float = 0.0, on_miss: str = 'error',
+                 seed: Optional[int] = None):
+        self.path = os.path.abspath(path or os.getenv('LLM_REPLAY_PATH') or DEFAULT_CASSETTE_PATH)
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.on_miss = on_miss
+        self.model_name = 'replay'
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'served': 0, 'misses': 0, 'injected_429': 0}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            print(f"[LLM_REPLAY] WARNING: cassette not found at {self.path}")
+            return
+        with open(self.path, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                # Later recordings win, matching what the live model last said
+                self._entries[entry['key']] = entry
+                self.model_name = entry.get('model_name') or self.model_name
+        print(f"[LLM_REPLAY] Loaded {len(self._entries)} recorded responses from {self.path}")
+
+    def is_available(self) -> bool:
+        return True
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _delay_for(self, entry: Optional[Dict[str, Any]]) -> float:
+        if self.latency == 'recorded':
+            base = float((entry or {}).get('latency') or 0.0)
+        else:
+            base = float(self.latency or 0.0)
+        delay = base * self.latency_scale
+        if self.jitter:
+            delay += (self._random() * 2 - 1) * self.jitter
+        return max(0.0, delay)
+
+    def _lookup(self, prompt: str, generation_config: Optional[Dict[str, Any]], timeout: Optional[float]):
+        """Resolve the recorded entry and its simulated latency."""
+        entry = self._entries.get(cassette_key(prompt, generation_config))
+        delay = self._delay_for(entry)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f'Replay latency {delay:.2f}s exceeded timeout {timeout:.2f}s')
+        return entry, delay
+
+    def _respond(self, entry: Optional[Dict[str, Any]], generation_config: Optional[Dict[str, Any]]) -> LLMResponse:
+        if self.rate_limit_rate and self._random() < self.rate_limit_rate:
+            self.stats['injected_429'] += 1
+            raise RuntimeError('429 Resource has been exhausted (e.g. check quota). [injected by replay backend]')
+
+        if entry is None:
+            self.stats['misses'] += 1
+            if self.on_miss == 'empty':
+                wants_json = (generation_config or {}).get('response_mime_type') == 'application/json'
+                return LLMResponse(text='[]' if wants_json else '{}')
+            raise KeyError('No recorded response for prompt (replay cassette miss)')
+
+        self.stats['served'] += 1
+        return LLMResponse(
+            text=entry['text'],
+            prompt_tokens=int(entry.get('prompt_tokens') or 0),
+            response_tokens=int(entry.get('response_tokens') or 0),
+        )
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None) -> LLMResponse:
+        entry, delay = self._lookup(prompt, generation_config, timeout)
+        time.sleep(delay)
+        return self._respond(entry, generation_config)
+
+    def generate_stream(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                        timeout: Optional[float] = None, chunks: int = 8) -> Iterator[LLMResponse]:
+        """Replay the response in ``chunks`` pieces; the first arrives after 20% of the latency."""
+        entry, delay = self._lookup(prompt, generation_config, timeout)
+        time.sleep(delay * 0.2)
+        response = self._respond(entry, generation_config)
+        text = response.text
+        step = max(1, -(-len(text) // chunks))
+        pieces = [text[i:i + step] for i in range(0, len(text), step)] or ['']
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(delay * 0.8 / max(1, len(pieces) - 1))
+            last = index == len(pieces) - 1
+            yield LLMResponse(
+                text=piece,
+                prompt_tokens=response.prompt_tokens,
+                response_tokens=response.response_tokens if last else 0,
+            )
+
+
+def _replay_from_env() -> ReplayBackend:
+    latency = os.getenv('LLM_REPLAY_LATENCY', '0')
+    seed = os.getenv('LLM_REPLAY_SEED')
+    return ReplayBackend(
+        latency=latency if latency == 'recorded' else float(latency),
+        latency_scale=float(os.getenv('LLM_REPLAY_LATENCY_SCALE', 1.0)),
+        jitter=float(os.getenv('LLM_REPLAY_JITTER', 0.0)),
+        rate_limit_rate=float(os.getenv('LLM_REPLAY_429_RATE', 0.0)),
+        on_miss=os.getenv('LLM_REPLAY_ON_MISS', 'error'),
+        seed=int(seed) if seed else None,
+    )
+
+
+register_backend('record', RecordingBackend)
+register_backend('replay', _replay_from_env)
@@ -0,0 +1,184 @@
+"""
+Token and cost accounting for LLM calls.
+
+Every call that goes through the LLM gateway is recorded here with its prompt
+and response tokens, retries and time spent waiting (concurrency queue and 429
+backoff). Totals are aggregated per endpoint, per user and per day, and the
+heaviest individual calls are kept so the pages/prompts that drive quota
+exhaustion can be found.
+
+Request context (endpoint, user) is attached with usage_scope(); the user is
+the authenticated identity (auth.request_identity(), 'anonymous' without a
+token), never an email taken from the request body:
+    with usage_scope(user=request_identity()):
+        calculate_riasec_with_gemini(transcript_text)
+The Flask endpoint is picked up automatically when a request is active.
+"""
+
+import contextvars
+import heapq
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# USD per 1M tokens; defaults follow published gemini-2.5-flash pricing
+PRICE_INPUT_PER_1M = float(os.getenv('LLM_PRICE_INPUT_PER_1M', 0.30))
+PRICE_OUTPUT_PER_1M = float(os.getenv('LLM_PRICE_OUTPUT_PER_1M', 2.50))
+TOP_CALLS_KEPT = int(os.getenv('LLM_USAGE_TOP_CALLS', 50))
+
+_scope: contextvars.ContextVar = contextvars.ContextVar('llm_usage_scope', default={})
+
+_COUNTERS = ('calls', 'errors', 'cache_hits', 'prompt_tokens', 'response_tokens',
+             'retries', 'wait_seconds', 'latency_seconds')
+
+
+@contextmanager
+def usage_scope(user: Optional[str] = None, endpoint: Optional[str] = None):
+    """Attribute LLM calls made inside the block to ``user`` / ``endpoint``."""
+    current = dict(_scope.get())
+    if user:
+        current['user'] = user
+    if endpoint:
+        current['endpoint'] = endpoint
+    token = _scope.set(current)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Dict[str, str]:
+    scope = dict(_scope.get())
+    if 'endpoint' not in scope:
+        try:
+            from flask import has_request_context, request
+            if has_request_context():
+                scope['endpoint'] = request.endpoint or request.path
+        except ImportError:
+            pass
+    return scope
+
+
+def estimate_cost(prompt_tokens: int, response_tokens: int) -> float:
+    return (prompt_tokens * PRICE_INPUT_PER_1M + response_tokens * PRICE_OUTPUT_PER_1M) / 1_000_000
+
+
+class UsageLedger:
+    def __init__(self, log_path: Optional[str] = None, top_calls: int = TOP_CALLS_KEPT):
+        self.log_path = log_path
+        self.top_calls = top_calls
+        self._lock = threading.Lock()
+        # (day, endpoint, user, caller) -> counters
+        self._totals: Dict[tuple, Dict[str, float]] = {}
+        # min-heap of (total_tokens, seq, call) for the heaviest calls
+        self._heaviest: List[tuple] = []
+        self._seq = 0
+
+    def record(self, caller: str, prompt_tokens: int = 0, response_tokens: int = 0, retries: int = 0,
+               wait_seconds: float = 0.0, latency_seconds: float = 0.0, cache_hit: bool = False,
+               error: bool = False, label: Optional[str] = None) -> Dict[str, Any]:
+        scope = current_scope()
+        now = datetime.now(timezone.utc)
+        call = {
+            'at': now.isoformat(),
+            'day': now.date().isoformat(),
+            'endpoint': scope.get('endpoint') or 'unknown',
+            'user': scope.get('user') or 'anonymous',
+            'caller': caller,
+            'label': label,
+            'prompt_tokens': int(prompt_tokens),
+            'response_tokens': int(response_tokens),
+            'retries': int(retries),
+            'wait_seconds': round(float(wait_seconds), 4),
+            'latency_seconds': round(float(latency_seconds), 4),
+            'cache_hit': bool(cache_hit),
+            'error': bool(error),
+            'cost_usd': round(estimate_cost(prompt_tokens, response_tokens), 6),
+        }
+        key = (call['day'], call['endpoint'], call['user'], caller)
+        with self._lock:
+            totals = self._totals.setdefault(key, {name: 0 for name in _COUNTERS})
+            totals['calls'] += 1
+            totals['errors'] += int(error)
+            totals['cache_hits'] += int(cache_hit)
+            totals['prompt_tokens'] += call['prompt_tokens']
+            totals['response_tokens'] += call['response_tokens']
+            totals['retries'] += call['retries']
+            totals['wait_seconds'] += call['wait_seconds']
+            totals['latency_seconds'] += call['latency_seconds']
+
+            self._seq += 1
+            entry = (call['prompt_tokens'] + call['response_tokens'], self._seq, call)
+            if len(self._heaviest) < self.top_calls:
+                heapq.heappush(self._heaviest, entry)
+            elif entry[0] > self._heaviest[0][0]:
+                heapq.heapreplace(self._heaviest, entry)
+
+            if self.log_path:
+                try:
+                    with open(self.log_path, 'a', encoding='utf-8') as fh:
+                        fh.write(json.dumps(call) + '\n')
+                except OSError as e:
+                    print(f"[LLM_USAGE] Could not append usage log: {e}")
+        return call
+
+    def summary(self, group_by: str = 'endpoint', day: Optional[str] = None,
+                user: Optional[str] = None) -> Dict[str, Any]:
+        """Aggregate totals grouped by 'endpoint', 'user', 'day' or 'caller'."""
+        index = {'day': 0, 'endpoint': 1, 'user': 2, 'caller': 3}
+        if group_by not in index:
+            raise ValueError(f"group_by must be one of {sorted(index)}")
+        groups: Dict[str, Dict[str, float]] = {}
+        overall = {name: 0 for name in _COUNTERS}
+        with self._lock:
+            for key, totals in self._totals.items():
+                if day and key[0] != day:
+                    continue
+                if user and key[2] != user:
+                    continue
+                bucket = groups.setdefault(key[index[group_by]], {name: 0 for name in _COUNTERS})
+                for name in _COUNTERS:
+                    bucket[name] += totals[name]
+                    overall[name] += totals[name]
+
+        def finish(bucket):
+            bucket['total_tokens'] = bucket['prompt_tokens'] + bucket['response_tokens']
+            bucket['cost_usd'] = round(estimate_cost(bucket['prompt_tokens'], bucket['response_tokens']), 6)
+            bucket['wait_seconds'] = round(bucket['wait_seconds'], 4)
+            bucket['latency_seconds'] = round(bucket['latency_seconds'], 4)
+            return bucket
+
+        ordered = sorted(groups.items(), key=lambda kv: kv[1]['prompt_tokens'] + kv[1]['response_tokens'], reverse=True)
+        return {
+            'group_by': group_by,
+            'filters': {'day': day, 'user': user},
+            'groups': {name: finish(bucket) for name, bucket in ordered},
+            'total': finish(overall),
+            'pricing_per_1m_tokens': {'input': PRICE_INPUT_PER_1M, 'output': PRICE_OUTPUT_PER_1M},
+        }
+
+    def heaviest_calls(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = sorted(self._heaviest, reverse=True)[:limit]
+        return [call for _, _, call in entries]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+            self._heaviest.clear()
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Process-wide ledger; set LLM_USAGE_LOG to also append every call to a JSONL file."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(log_path=os.getenv('LLM_USAGE_LOG') or None)
+        return _ledger
@@ -0,0 +1,172 @@
+"""
+Compact variants of the career forecasting model.
+
+The serving forests carry 120-180 deep trees and 40 outputs, but a forecast
+only keeps the top 6 jobs. Apart from 'pruned', each variant is distilled from
+the current model: it is fitted on the teacher's own predictions over a sample
+of grade vectors, so it learns the teacher's ranking rather than the
+(synthetic) training labels.
+
+Variant kinds:
+  pruned   the teacher's own first n trees cut at a max depth (FlatForest.prune);
+           no refit, cut nodes predict their training mean
+  forest   smaller RandomForestRegressor (fewer, shallower trees) refit on teacher outputs
+  hgb      HistGradientBoostingRegressor per output (MultiOutputRegressor)
+  lowrank  ridge regression whose coefficient matrix is truncated to rank r
+           (rank=None keeps the full linear map)
+
+benchmark_career_models.py builds the variants and compares load time,
+latency, memory and top-6 agreement; see that script for usage.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+TOP_K = 6
+
+DEFAULT_VARIANTS: List[Dict[str, Any]] = [
+    {'name': 'pruned_60x12', 'kind': 'pruned', 'n_trees': 60, 'max_depth': 12},
+    {'name': 'pruned_30x10', 'kind': 'pruned', 'n_trees': 30, 'max_depth': 10},
+    {'name': 'rf_40x12', 'kind': 'forest', 'n_estimators': 40, 'max_depth': 12, 'min_samples_leaf': 5},
+    {'name': 'hgb_60', 'kind': 'hgb', 'max_iter': 60, 'max_depth': 6},
+    {'name': 'lowrank_r8', 'kind': 'lowrank', 'rank': 8},
+    {'name': 'linear', 'kind': 'lowrank', 'rank': None},
+]
+
+
+class LowRankLinearRegressor:
+    """Y ~ (X - mean) @ U @ V + b with U: [features, r], V: [r, outputs].
+
+    Fitted as ridge regression, then the coefficient matrix is truncated to its
+    top ``rank`` singular directions. Prediction is two small matrix products.
+    """
+
+    def __init__(self, rank: Optional[int] = 8, alpha: float = 1.0):
+        self.rank = rank
+        self.alpha = alpha
+
+    def fit(self, X, Y):
+        X = np.asarray(X, dtype=np.float64)
+        Y = np.asarray(Y, dtype=np.float64)
+        self.x_mean_ = X.mean(axis=0)
+        self.intercept_ = Y.mean(axis=0)
+        Xc = X - self.x_mean_
+        gram = Xc.T @ Xc + self.alpha * np.eye(X.shape[1])
+        W = np.linalg.solve(gram, Xc.T @ (Y - self.intercept_))
+        if self.rank is not None and self.rank < min(W.shape):
+            U, S, Vt = np.linalg.svd(W, full_matrices=False)
+            self.left_ = (U[:, :self.rank] * S[:self.rank]).astype(np.float32)
+            self.right_ = Vt[:self.rank].astype(np.float32)
+        else:
+            self.left_ = W.astype(np.float32)
+            self.right_ = None
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        H = (X - self.x_mean_.astype(np.float32)) @ self.left_
+        if self.right_ is not None:
+            H = H @ self.right_
+        return H.astype(np.float64) + self.intercept_
+
+
+def distillation_inputs(n_features: int, n_samples: int = 10000, seed: int = 7,
+                        X: Optional[np.ndarray] = None) -> np.ndarray:
+    """Grade vectors to distil on: real vectors when given, topped up with uniform 0..4 grades."""
+    rng = np.random.default_rng(seed)
+    synthetic = rng.uniform(0.0, 4.0, size=(n_samples, n_features)).astype(np.float32)
+    if X is None or not len(X):
+        return synthetic
+    X = np.asarray(X, dtype=np.float32)[:, :n_features]
+    if X.shape[1] < n_features:
+        X = np.pad(X, ((0, 0), (0, n_features - X.shape[1])))
+    return np.vstack([X, synthetic[:max(0, n_samples - len(X))]])
+
+
+def build_variant(spec: Dict[str, Any], X: np.ndarray, Y_teacher: np.ndarray, n_jobs: int = 1, teacher=None):
+    """Build one variant (fitted on teacher outputs, or pruned from ``teacher``); returns (estimator, seconds)."""
+    kind = spec['kind']
+    started = time.perf_counter()
+    if kind == 'pruned':
+        from app.services.forest_engine import export_flat_forest
+        if teacher is None:
+            raise ValueError("'pruned' variants need the teacher forest")
+        est = export_flat_forest(teacher).prune(n_trees=spec.get('n_trees'), max_depth=spec.get('max_depth'))
+        return est, time.perf_counter() - started
+    if kind == 'forest':
+        from sklearn.ensemble import RandomForestRegressor
+        est = RandomForestRegressor(n_estimators=spec.get('n_estimators', 60), max_depth=spec.get('max_depth'),
+                                    min_samples_leaf=spec.get('min_samples_leaf', 1),
+                                    random_state=spec.get('random_state', 42), n_jobs=n_jobs)
+    elif kind == 'hgb':
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        from sklearn.multioutput import MultiOutputRegressor
+        est = MultiOutputRegressor(HistGradientBoostingRegressor(
+            max_iter=spec.get('max_iter', 60), max_depth=spec.get('max_depth', 6),
+            learning_rate=spec.get('learning_rate', 0.1), random_state=spec.get('random_state', 42)), n_jobs=n_jobs)
+    elif kind == 'lowrank':
+        est = LowRankLinearRegressor(rank=spec.get('rank'), alpha=spec.get('alpha', 1.0))
+    else:
+        raise ValueError(f"Unknown variant kind {kind!r}")
+    est.fit(X, Y_teacher)
+    if hasattr(est, 'n_jobs'):
+        # n_jobs is only for fitting; kept, it would start joblib workers on every single-row predict
+        est.n_jobs = 1
+    return est, time.perf_counter() - started
+
+
+def top_k_indices(Y: np.ndarray, k: int = TOP_K) -> np.ndarray:
+    """Top-k output indices per row, best first (min-max normalization does not change the order)."""
+    Y = np.asarray(Y)
+    top = np.argpartition(-Y, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(Y, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+
+def top_k_agreement(Y_ref: np.ndarray, Y_var: np.ndarray, k: int = TOP_K) -> Dict[str, float]:
+    """How well a variant reproduces the reference top-k.
+
+    overlap: mean |top-k(ref) & top-k(variant)| / k
+    top1:    share of rows with the same best job
+    exact:   share of rows with the identical ordered top-k
+    """
+    ref = top_k_indices(Y_ref, k)
+    var = top_k_indices(Y_var, k)
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref.tolist(), var.tolist())])
+    return {
+        'overlap': round(float(overlap), 4),
+        'top1': round(float(np.mean(ref[:, 0] == var[:, 0])), 4),
+        'exact': round(float(np.mean(np.all(ref == var, axis=1))), 4),
+    }
+
+
+def latency_profile(predict, X: np.ndarray, rows: int = 500) -> Dict[str, float]:
+    """Single-row predict latency over ``rows`` rows of X, in milliseconds."""
+    predict(X[:1])
+    samples = []
+    for i in range(min(rows, len(X))):
+        row = X[i:i + 1]
+        started = time.perf_counter()
+        predict(row)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(round(p / 100.0 * len(samples) + 0.5)) - 1)], 4)
+
+    return {'p50_ms': pct(50), 'p95_ms': pct(95), 'p99_ms': pct(99), 'mean_ms': round(float(np.mean(samples)), 4)}
+
+
+def variant_specs(names: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    if not names:
+        return list(DEFAULT_VARIANTS)
+    by_name = {spec['name']: spec for spec in DEFAULT_VARIANTS}
+    unknown = [n for n in names if n not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown variants {unknown}; choose from {sorted(by_name)}")
+    return [by_name[n] for n in names]
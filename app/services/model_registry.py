@@ -0,0 +1,434 @@
+"""
+Process-wide registry of career forecasting model bundles.
+
+Each joblib bundle ({'model': ..., 'labels': [...]}) is unpickled once per
+process and reused across requests; every worker holds its own copy (joblib's
+mmap_mode does not help here, as sklearn's Tree.__setstate__ copies the node
+and value arrays out of the mapping, so it is off by default). The file's
+mtime/size is checked on access so a retrained model is picked up without a
+restart.
+
+save_bundle() publishes versioned, immutable artifacts behind the live path
+(see its docstring); every loaded bundle carries its 'version' so stored
+forecasts can record which model produced them.
+
+predictor() additionally flattens tree ensembles into a FlatForest (see
+forest_engine) and checks it against model.predict before serving from it
+(FOREST_ENGINE=sklearn turns this off).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from joblib import dump, load
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: in-process locking only
+    fcntl = None
+
+from app.services.forest_engine import FlatForest, export_flat_forest, verify_against
+
+FOREST_ENGINE = os.getenv('FOREST_ENGINE', 'flat').strip().lower()
+MODEL_VERSIONS_KEEP = int(os.getenv('MODEL_VERSIONS_KEEP', 5))
+
+_publish_lock = threading.Lock()
+
+
+def _bundle_nbytes(bundle: Dict[str, Any]) -> int:
+    """Approximate size of the numpy payload in a bundle (tree node/value arrays)."""
+    model = bundle.get('model') if isinstance(bundle, dict) else None
+    if isinstance(model, FlatForest):
+        return model.nbytes
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        estimators = [model] if model is not None else []
+    total = 0
+    for est in estimators:
+        tree = getattr(est, 'tree_', None)
+        if tree is None:
+            continue
+        state = tree.__getstate__()
+        total += state['nodes'].nbytes + state['values'].nbytes
+    return total
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+        # ru_maxrss is KiB on Linux
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024
+    except Exception:
+        return None
+
+
+class _Entry:
+    __slots__ = ('bundle', 'signature', 'loaded_at', 'load_seconds', 'load_count', 'hits', 'nbytes',
+                 'predict', 'engine', 'flat_bytes', 'flatten_seconds')
+
+    def __init__(self):
+        self.bundle = None
+        self.signature = None
+        self.loaded_at = None
+        self.load_seconds = 0.0
+        self.load_count = 0
+        self.hits = 0
+        self.nbytes = 0
+        self.predict = None
+        self.engine = None
+        self.flat_bytes = 0
+        self.flatten_seconds = 0.0
+
+
+class ModelRegistry:
+    def __init__(self, mmap_mode: Optional[str] = None, max_bytes: Optional[int] = None):
+        """max_bytes caps the model + flattened arrays kept loaded; least recently used
+        bundles beyond it are dropped and lazily reloaded on their next use."""
+        self.mmap_mode = mmap_mode or None
+        self.max_bytes = max_bytes or None
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+        # path -> entry, least recently used first
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._load_counts: Dict[str, int] = {}
+        self._evictions = 0
+
+    @staticmethod
+    def _signature(path: str):
+        st = os.stat(path)
+        # Inode included: a rollback relinks an older artifact whose mtime may repeat
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _path_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            lock = self._path_locks.get(path)
+            if lock is None:
+                lock = self._path_locks[path] = threading.Lock()
+            return lock
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Return the bundle at ``path`` (None if the file does not exist).
+
+        Reloads when the file changed on disk since it was last loaded.
+        """
+        path = os.path.abspath(path)
+        try:
+            signature = self._signature(path)
+        except OSError:
+            return None
+
+        entry = self._entries.get(path)
+        if entry is not None and entry.signature == signature:
+            entry.hits += 1
+            self._touch(path)
+            return entry.bundle
+
+        # One loader per path; concurrent requests wait instead of loading in parallel
+        with self._path_lock(path):
+            entry = self._entries.get(path)
+            signature = self._signature(path)
+            if entry is not None and entry.signature == signature:
+                entry.hits += 1
+                return entry.bundle
+
+            started = time.perf_counter()
+            bundle = load(path, mmap_mode=self.mmap_mode)
+            elapsed = time.perf_counter() - started
+
+            new_entry = _Entry()
+            new_entry.bundle = bundle
+            new_entry.signature = signature
+            new_entry.loaded_at = time.time()
+            new_entry.load_seconds = elapsed
+            self._load_counts[path] = self._load_counts.get(path, 0) + 1
+            new_entry.load_count = self._load_counts[path]
+            new_entry.hits = 1
+            new_entry.nbytes = _bundle_nbytes(bundle)
+            with self._lock:
+                self._entries[path] = new_entry
+                self._entries.move_to_end(path)
+            print(f"[MODEL_REGISTRY] Loaded {os.path.basename(path)} in {elapsed:.3f}s "
+                  f"(mmap={self.mmap_mode}, load #{new_entry.load_count})")
+            self._enforce_cap(keep=path)
+            return bundle
+
+    def _touch(self, path: str) -> None:
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+
+    def _enforce_cap(self, keep: str) -> None:
+        """Drop least recently used bundles until the resident total fits max_bytes (never ``keep``)."""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            total = sum(e.nbytes + e.flat_bytes for e in self._entries.values())
+            for path in list(self._entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                entry = self._entries.pop(path)
+                total -= entry.nbytes + entry.flat_bytes
+                self._evictions += 1
+                print(f"[MODEL_REGISTRY] Evicted {os.path.basename(path)} "
+                      f"({(entry.nbytes + entry.flat_bytes) / 1e6:.1f} MB) to stay under the memory cap")
+
+    def predictor(self, path: str) -> Tuple[Optional[Dict[str, Any]], Optional[Callable]]:
+        """Return (bundle, predict_fn) for ``path``; (None, None) if the file does not exist.
+
+        predict_fn is the flattened forest when it reproduces model.predict,
+        otherwise the model's own predict.
+        """
+        bundle = self.get(path)
+        if bundle is None:
+            return None, None
+        entry = self._entries.get(os.path.abspath(path))
+        if entry is None or entry.bundle is not bundle:
+            # Reloaded concurrently; serve this bundle without caching a predictor for it
+            return bundle, self._build_predictor(bundle)[0]
+        if entry.predict is None:
+            with self._path_lock(os.path.abspath(path)):
+                if entry.predict is None:
+                    started = time.perf_counter()
+                    predict, engine, flat_bytes = self._build_predictor(bundle)
+                    entry.flatten_seconds = time.perf_counter() - started
+                    entry.engine = engine
+                    entry.flat_bytes = flat_bytes
+                    entry.predict = predict
+            self._enforce_cap(keep=os.path.abspath(path))
+        return bundle, entry.predict
+
+    def flat_forest(self, path: str) -> Tuple[Optional[Dict[str, Any]], Optional[FlatForest]]:
+        """(bundle, FlatForest) when ``path`` is served by the flat engine, else (bundle, None)."""
+        bundle, predict = self.predictor(path)
+        forest = getattr(predict, '__self__', None)
+        return bundle, forest if isinstance(forest, FlatForest) else None
+
+    @staticmethod
+    def _build_predictor(bundle: Dict[str, Any]):
+        model = bundle.get('model') if isinstance(bundle, dict) else None
+        if model is None:
+            return None, None, 0
+        if isinstance(model, FlatForest):
+            # Compacted variant stored already flattened (model_compaction 'pruned')
+            return model.predict, 'flat', model.nbytes
+        if FOREST_ENGINE != 'flat':
+            return model.predict, 'sklearn', 0
+        try:
+            flat = export_flat_forest(model)
+            check = verify_against(model, flat, n_samples=64)
+        except TypeError:
+            # Not a tree ensemble (e.g. a compacted linear/boosting variant)
+            return model.predict, 'sklearn', 0
+        except Exception as e:
+            print(f"[MODEL_REGISTRY] Flattening skipped ({type(model).__name__}): {e}")
+            return model.predict, 'sklearn', 0
+        if not check['ok']:
+            print(f"[MODEL_REGISTRY] Flattened forest mismatch (max diff {check['max_abs_diff']}); using sklearn")
+            return model.predict, 'sklearn', 0
+        return flat.predict, 'flat', flat.nbytes
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drop one cached bundle (or all) so the next get() reloads from disk."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def stats(self) -> Dict[str, Any]:
+        models = {}
+        for path, entry in list(self._entries.items()):
+            models[path] = {
+                'loaded_at': entry.loaded_at,
+                'load_seconds': round(entry.load_seconds, 4),
+                'load_count': entry.load_count,
+                'hits': entry.hits,
+                'file_bytes': entry.signature[1] if entry.signature else None,
+                'version': bundle_version(entry.bundle),
+                'model_array_bytes': entry.nbytes,
+                'engine': entry.engine,
+                'flat_array_bytes': entry.flat_bytes,
+                'flatten_seconds': round(entry.flatten_seconds, 4),
+            }
+        return {'mmap_mode': self.mmap_mode, 'models': models, 'process_peak_rss_bytes': _peak_rss_bytes(),
+                'max_bytes': self.max_bytes, 'evictions': self._evictions,
+                'resident_bytes': sum(m['model_array_bytes'] + m['flat_array_bytes'] for m in models.values())}
+
+
+def bundle_version(bundle: Optional[Dict[str, Any]]) -> str:
+    """Version id stamped into a bundle by save_bundle ('unversioned' for older files)."""
+    return (bundle or {}).get('version') or 'unversioned'
+
+
+def _manifest_path(path: str) -> str:
+    stem = os.path.splitext(path)[0]
+    return f'{stem}.manifest.json'
+
+
+def _versions_dir(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(path), 'versions', stem)
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Manifest for the live model at ``path``: {'current': version, 'versions': [...]} (newest last)."""
+    try:
+        with open(_manifest_path(os.path.abspath(path)), 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {'current': None, 'versions': []}
+
+
+def _write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, indent=2)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _manifest_lock(path: str):
+    """Serialize manifest updates across threads and (where fcntl exists) processes."""
+    with _publish_lock:
+        fh = open(f'{_manifest_path(path)}.lock', 'w')
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+            fh.close()
+
+
+def _swap_live_file(artifact: str, path: str) -> None:
+    """Point ``path`` at ``artifact`` with a single rename; readers see the old or the new file, never a torn one."""
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        try:
+            os.link(artifact, tmp_path)
+        except OSError:
+            shutil.copyfile(artifact, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_bundle(bundle: Dict[str, Any], path: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Publish a new version of the model at ``path`` and return its version id.
+
+    The bundle is stamped with a version and written once, immutably, to
+    versions/<stem>/<version>.joblib. The live file is then swapped to it
+    with a rename, so a worker reloading the model sees the old or the new
+    file, never a half-written one. <stem>.manifest.json records every
+    version (sha256, size, metadata) and the current one. The last
+    MODEL_VERSIONS_KEEP artifacts are kept for rollback.
+    """
+    path = os.path.abspath(path)
+    versions_dir = _versions_dir(path)
+    os.makedirs(versions_dir, exist_ok=True)
+
+    now = datetime.now(timezone.utc)
+    version = f"{now.strftime('%Y%m%dT%H%M%SZ')}-{uuid.uuid4().hex[:8]}"
+    stamped = dict(bundle, version=version, published_at=now.isoformat())
+    artifact = os.path.join(versions_dir, f'{version}.joblib')
+    tmp_path = f'{artifact}.{os.getpid()}.tmp'
+    try:
+        dump(stamped, tmp_path)
+        os.replace(tmp_path, artifact)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    record = {
+        'version': version,
+        'published_at': now.isoformat(),
+        'artifact': os.path.relpath(artifact, os.path.dirname(path)),
+        'sha256': _file_sha256(artifact),
+        'bytes': os.path.getsize(artifact),
+        'metadata': metadata or {},
+    }
+    with _manifest_lock(path):
+        _swap_live_file(artifact, path)
+        manifest = read_manifest(path)
+        manifest['versions'] = [v for v in manifest.get('versions', []) if v.get('version') != version] + [record]
+        manifest['current'] = version
+        _prune_versions(path, manifest)
+        _write_json_atomic(_manifest_path(path), manifest)
+    get_model_registry().invalidate(path)
+    print(f"[MODEL_REGISTRY] Published {os.path.basename(path)} version {version}")
+    return version
+
+
+def _prune_versions(path: str, manifest: Dict[str, Any]) -> None:
+    keep = max(1, MODEL_VERSIONS_KEEP)
+    versions = manifest.get('versions', [])
+    if len(versions) <= keep:
+        return
+    current = manifest.get('current')
+    kept = versions[-keep:]
+    for record in versions[:-keep]:
+        if record.get('version') == current:
+            kept.insert(0, record)
+            continue
+        try:
+            os.remove(os.path.join(os.path.dirname(path), record['artifact']))
+        except (KeyError, OSError):
+            pass
+    manifest['versions'] = kept
+
+
+def rollback_bundle(path: str, version: str) -> Dict[str, Any]:
+    """Make a previously published ``version`` live again (same atomic swap as save_bundle)."""
+    path = os.path.abspath(path)
+    with _manifest_lock(path):
+        manifest = read_manifest(path)
+        record = next((v for v in manifest.get('versions', []) if v.get('version') == version), None)
+        if record is None:
+            raise KeyError(f'Unknown version {version} for {os.path.basename(path)}')
+        artifact = os.path.join(os.path.dirname(path), record['artifact'])
+        if not os.path.exists(artifact):
+            raise FileNotFoundError(f'Artifact for {version} has been pruned')
+        _swap_live_file(artifact, path)
+        manifest['current'] = version
+        _write_json_atomic(_manifest_path(path), manifest)
+    get_model_registry().invalidate(path)
+    print(f"[MODEL_REGISTRY] Rolled {os.path.basename(path)} back to {version}")
+    return record
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Process-wide registry; MODEL_MMAP_MODE is passed to joblib.load (default none),
+    MODEL_REGISTRY_MAX_MB caps resident model arrays (0 = no cap)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            mode = os.getenv('MODEL_MMAP_MODE', 'none').strip().lower()
+            max_mb = float(os.getenv('MODEL_REGISTRY_MAX_MB', 0))
+            _registry = ModelRegistry(mmap_mode=None if mode in ('', 'none', 'off', 'false') else mode,
+                                      max_bytes=int(max_mb * 1024 * 1024) if max_mb > 0 else None)
+        return _registry
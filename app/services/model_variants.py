@@ -0,0 +1,144 @@
+"""
+Per-feature-length model store with background warm-up.
+
+The CS forecaster needs a model whose n_features_in_ equals the length of the
+student's grade vector. Instead of retraining (and overwriting) a single
+bundle inside the request whenever the length changes, each length gets its
+own file (<dir>/<prefix>_<n>f.joblib). A missing variant is trained once on a
+background worker while callers get a "warming" status:
+
+    state = store.ensure(n)      # 'ready' | 'warming' | 'failed'
+    path = store.resolve(n)      # bundle path once ready
+
+Only one training runs per variant: in-process via a futures map, and across
+gunicorn workers via an flock on <path>.lock (where fcntl is available).
+Variants are only trained for allowed_lengths; ensure() raises ValueError for
+any other length, so request input cannot queue unbounded training runs or
+fill the disk with one file per length.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.services.model_registry import get_model_registry, save_bundle
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: in-process locking only
+    fcntl = None
+
+
+class FeatureLengthModelStore:
+    def __init__(self, directory: str, prefix: str, trainer: Callable[[int], Dict[str, Any]],
+                 fallback_path: Optional[str] = None, max_workers: int = 1,
+                 retry_after_failure: float = 60.0, allowed_lengths: Optional[Iterable[int]] = None):
+        """trainer(n) returns a bundle {'model', 'labels'} for n features, or None
+        when it has already published the bundle at path_for(n) itself.
+
+        fallback_path: a single shared bundle (e.g. one produced by /train) that
+        is used for a length when its n_features_in_ matches.
+        allowed_lengths: the only lengths a variant may be trained for (None = any).
+        """
+        self.directory = os.path.abspath(directory)
+        self.prefix = prefix
+        self.trainer = trainer
+        self.fallback_path = os.path.abspath(fallback_path) if fallback_path else None
+        self.retry_after_failure = retry_after_failure
+        self.allowed_lengths = frozenset(int(n) for n in allowed_lengths) if allowed_lengths is not None else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{prefix}-warmup')
+        self._lock = threading.Lock()
+        self._inflight: Dict[int, Future] = {}
+        self._status: Dict[int, Dict[str, Any]] = {}
+
+    def path_for(self, n_features: int) -> str:
+        return os.path.join(self.directory, f'{self.prefix}_{int(n_features)}f.joblib')
+
+    def _fallback_matches(self, n_features: int) -> bool:
+        if not self.fallback_path or not os.path.exists(self.fallback_path):
+            return False
+        try:
+            bundle = get_model_registry().get(self.fallback_path)
+            return getattr((bundle or {}).get('model'), 'n_features_in_', None) == n_features
+        except Exception:
+            return False
+
+    def resolve(self, n_features: int) -> Optional[str]:
+        """Path of a ready bundle for ``n_features`` (None while missing/warming)."""
+        if self._fallback_matches(n_features):
+            return self.fallback_path
+        path = self.path_for(n_features)
+        return path if os.path.exists(path) else None
+
+    def ensure(self, n_features: int) -> str:
+        """'ready' if a bundle exists; otherwise schedule training (once) and report 'warming'.
+
+        A failed warm-up is reported as 'failed' for retry_after_failure seconds
+        before training is attempted again. ValueError when no bundle exists for
+        ``n_features`` and it is not one of allowed_lengths.
+        """
+        n_features = int(n_features)
+        if self.resolve(n_features):
+            return 'ready'
+        if self.allowed_lengths is not None and n_features not in self.allowed_lengths:
+            raise ValueError(f'No {self.prefix} model for {n_features} features '
+                             f'(supported: {sorted(self.allowed_lengths)})')
+        with self._lock:
+            status = self._status.get(n_features) or {}
+            if status.get('state') == 'failed' and time.time() - status.get('finished_at', 0) < self.retry_after_failure:
+                return 'failed'
+            future = self._inflight.get(n_features)
+            if future is None or future.done():
+                self._status[n_features] = {'state': 'warming', 'queued_at': time.time()}
+                self._inflight[n_features] = self._executor.submit(self._train, n_features)
+                print(f"[MODEL_VARIANTS] Queued {self.prefix} warm-up for {n_features} features")
+        return 'warming'
+
+    def _train(self, n_features: int) -> None:
+        path = self.path_for(n_features)
+        os.makedirs(self.directory, exist_ok=True)
+        lock_fh = open(f'{path}.lock', 'w')
+        try:
+            if fcntl is not None:
+                # Another worker process may already be training this variant; wait for it
+                fcntl.flock(lock_fh, fcntl.LOCK_EX)
+            if os.path.exists(path):
+                self._status[n_features] = {'state': 'ready', 'finished_at': time.time(), 'trained_here': False}
+                return
+            started = time.perf_counter()
+            bundle = self.trainer(n_features)
+            if bundle is not None:
+                save_bundle(bundle, path)
+            elif not os.path.exists(path):
+                raise RuntimeError(f'Trainer did not produce {os.path.basename(path)}')
+            elapsed = time.perf_counter() - started
+            self._status[n_features] = {'state': 'ready', 'finished_at': time.time(),
+                                        'train_seconds': round(elapsed, 3), 'trained_here': True}
+            print(f"[MODEL_VARIANTS] Trained {os.path.basename(path)} in {elapsed:.1f}s")
+        except Exception as e:
+            self._status[n_features] = {'state': 'failed', 'error': str(e), 'finished_at': time.time()}
+            print(f"[MODEL_VARIANTS] Warm-up for {n_features} features failed: {e}")
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_fh, fcntl.LOCK_UN)
+            lock_fh.close()
+
+    def state(self, n_features: int) -> Dict[str, Any]:
+        n_features = int(n_features)
+        if self.resolve(n_features):
+            return {'state': 'ready', 'path': self.resolve(n_features)}
+        return dict(self._status.get(n_features) or {'state': 'missing'})
+
+    def stats(self) -> Dict[str, Any]:
+        on_disk = []
+        if os.path.isdir(self.directory):
+            on_disk = sorted(f for f in os.listdir(self.directory)
+                             if f.startswith(f'{self.prefix}_') and f.endswith('f.joblib'))
+        return {
+            'directory': self.directory,
+            'variants_on_disk': on_disk,
+            'allowed_lengths': sorted(self.allowed_lengths) if self.allowed_lengths is not None else None,
+            'status': {str(n): dict(s) for n, s in sorted(self._status.items())},
+        }
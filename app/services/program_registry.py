@@ -0,0 +1,162 @@
+"""
+Program-aware access to the career models.
+
+Which programs exist, which bundle serves each one and how a transcript is
+recognized as belonging to it come from a manifest (program_models.json next
+to this file, or PROGRAM_MODELS_MANIFEST), so adding a program means adding
+an entry and a model file rather than another blueprint:
+
+    {"default_program": "CS",
+     "programs": {"IT": {"title": ..., "model": "models/dt_career.joblib",
+                         "keywords": ["information technology", "bsit"],
+                         "bootstrap": {"dataset": "synthetic_it", "n_estimators": 120,
+                                       "max_depth": 18}}, ...}}
+
+Model paths are relative to the repository root. "model" is the file training
+publishes to; the bundle that serves a program can differ when a resolver is
+registered for it (CS: the /train file if present, else the canonical-width
+variant from objective_1_cs.CS_MODEL_STORE, see serving_path). Bundles are loaded through
+the shared ModelRegistry, lazily on a program's first forecast; with
+MODEL_REGISTRY_MAX_MB set, the least recently used ones are dropped again
+when the cap is exceeded. The manifest is re-read when its mtime changes.
+
+Detection mirrors what TOR extraction has always done: the first program
+(in manifest order) whose keyword appears in the OCR text, else the default
+program. Without text, the subjects in the grades decide (feature_builder).
+The optional "bootstrap" entry is how training_orchestrator fits a synthetic
+model for the program.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.services.model_registry import get_model_registry
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(__file__), 'program_models.json')
+
+
+class ProgramRegistry:
+    def __init__(self, manifest_path: str = DEFAULT_MANIFEST, model_registry=None):
+        self.manifest_path = os.path.abspath(manifest_path)
+        self._model_registry = model_registry
+        self._lock = threading.Lock()
+        self._manifest: Dict[str, Any] = {}
+        self._mtime_ns: Optional[int] = None
+        self._resolvers: Dict[str, Callable[[], Tuple[Optional[str], Optional[str]]]] = {}
+
+    @property
+    def models(self):
+        return self._model_registry or get_model_registry()
+
+    def manifest(self) -> Dict[str, Any]:
+        try:
+            mtime_ns = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        with self._lock:
+            if mtime_ns != self._mtime_ns or not self._manifest:
+                manifest: Dict[str, Any] = {'default_program': None, 'programs': {}}
+                if mtime_ns is not None:
+                    with open(self.manifest_path, 'r', encoding='utf-8') as fh:
+                        manifest.update(json.load(fh))
+                manifest['programs'] = {str(code).upper(): spec for code, spec in manifest['programs'].items()}
+                self._manifest = manifest
+                self._mtime_ns = mtime_ns
+            return self._manifest
+
+    def programs(self) -> List[str]:
+        return list(self.manifest()['programs'])
+
+    @property
+    def default_program(self) -> Optional[str]:
+        manifest = self.manifest()
+        default = (manifest.get('default_program') or '').upper()
+        if default in manifest['programs']:
+            return default
+        return next(iter(manifest['programs']), None)
+
+    def spec(self, program: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.manifest()['programs'].get((program or '').upper())
+
+    def model_path(self, program: str) -> Optional[str]:
+        spec = self.spec(program)
+        if not spec or not spec.get('model'):
+            return None
+        return os.path.normpath(os.path.join(ROOT_DIR, spec['model']))
+
+    def register_resolver(self, program: str, resolver: Callable[[], Tuple[Optional[str], Optional[str]]]) -> None:
+        """Let resolver() -> (path, error) pick the bundle that serves ``program`` instead of its manifest model."""
+        with self._lock:
+            self._resolvers[program.upper()] = resolver
+
+    def serving_path(self, program: str) -> Tuple[Optional[str], Optional[str]]:
+        """(path, error) of the bundle that serves the program's forecasts now; path is None with the reason."""
+        code = (program or '').upper()
+        with self._lock:
+            resolver = self._resolvers.get(code)
+        if resolver is not None:
+            return resolver()
+        path = self.model_path(code)
+        if path is None or not os.path.exists(path):
+            return None, f'No model available for program {code}'
+        return path, None
+
+    def predictor(self, program: str):
+        """(bundle, predict_fn) for the program's serving model; (None, None) when unknown or not trained yet."""
+        path, _ = self.serving_path(program)
+        if path is None:
+            return None, None
+        return self.models.predictor(path)
+
+    def detect_from_text(self, full_text: str) -> Optional[str]:
+        lowered = (full_text or '').lower()
+        for code, spec in self.manifest()['programs'].items():
+            if any(keyword.lower() in lowered for keyword in spec.get('keywords') or []):
+                return code
+        return self.default_program
+
+    def detect(self, program: Optional[str] = None, full_text: Optional[str] = None,
+               grades: Any = None) -> Tuple[Optional[str], str]:
+        """(program, source): explicit program, else OCR text keywords, else grade subjects, else default."""
+        if program and self.spec(program):
+            return program.upper(), 'request'
+        if full_text:
+            return self.detect_from_text(full_text), 'text'
+        if grades:
+            from app.services.feature_builder import detect_grades_program
+            detected = detect_grades_program(grades)
+            if detected and self.spec(detected):
+                return detected, 'grades'
+        return self.default_program, 'default'
+
+    def status(self) -> Dict[str, Any]:
+        """Manifest entries with file presence and, once loaded, the model version."""
+        loaded = self.models.stats()['models']
+        programs = {}
+        for code, spec in self.manifest()['programs'].items():
+            path = self.model_path(code)
+            entry = loaded.get(path) if path else None
+            programs[code] = {
+                'title': spec.get('title'),
+                'model': spec.get('model'),
+                'model_exists': bool(path and os.path.exists(path)),
+                'loaded': entry is not None,
+                'version': entry.get('version') if entry else None,
+            }
+        return {'default_program': self.default_program, 'programs': programs}
+
+
+_program_registry: Optional[ProgramRegistry] = None
+_program_registry_lock = threading.Lock()
+
+
+def get_program_registry() -> ProgramRegistry:
+    """Process-wide registry for PROGRAM_MODELS_MANIFEST (default: program_models.json)."""
+    global _program_registry
+    with _program_registry_lock:
+        if _program_registry is None:
+            _program_registry = ProgramRegistry(os.getenv('PROGRAM_MODELS_MANIFEST') or DEFAULT_MANIFEST)
+        return _program_registry
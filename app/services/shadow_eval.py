@@ -0,0 +1,254 @@
+"""
+Shadow evaluation of a candidate career model on live traffic.
+
+When a candidate is configured, /api/objective-1/process hands the student's
+feature vector to mirror() after the response has been computed. A single
+background thread then scores that vector with both the production model and
+the candidate, timing each predict under the same conditions, and records:
+
+  overlap    |top-6(production) & top-6(candidate)| / 6 (by job label)
+  top1       same best job
+  spearman   rank correlation of the two score vectors over shared labels
+  *_ms       single-row predict latency of each model
+
+Nothing the user sees depends on the candidate: mirroring never blocks (a
+bounded queue drops work when the thread falls behind, counted as
+'dropped'), and candidate errors are only counted.
+
+The candidate is stored in a small JSON file (.cache/shadow/candidate.json)
+so every web worker picks it up; set it with POST /api/admin/shadow. Each
+worker summarizes its own comparisons; SHADOW_EVAL_LOG additionally appends
+every comparison to a JSONL file.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+TOP_K = 6
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'shadow')
+
+
+def _top_labels(scores: np.ndarray, labels, k: int = TOP_K) -> List[str]:
+    order = np.argsort(-scores, kind='stable')[:k]
+    return [labels[i] for i in order]
+
+
+def _spearman(a: np.ndarray, b: np.ndarray) -> Optional[float]:
+    if len(a) < 2:
+        return None
+    from scipy.stats import rankdata
+    ra, rb = rankdata(a), rankdata(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return None
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def compare_scores(prod_scores, prod_labels, cand_scores, cand_labels, k: int = TOP_K) -> Dict[str, Any]:
+    """Agreement of two models' raw score vectors for one student (labels may be ordered differently)."""
+    prod_scores = np.asarray(prod_scores, dtype=np.float64).ravel()
+    cand_scores = np.asarray(cand_scores, dtype=np.float64).ravel()
+    prod_top = _top_labels(prod_scores, prod_labels, k)
+    cand_top = _top_labels(cand_scores, cand_labels, k)
+    cand_index = {name: i for i, name in enumerate(cand_labels)}
+    shared = [(i, cand_index[name]) for i, name in enumerate(prod_labels) if name in cand_index]
+    rho = None
+    if shared:
+        p_idx, c_idx = zip(*shared)
+        rho = _spearman(prod_scores[list(p_idx)], cand_scores[list(c_idx)])
+    return {
+        'overlap': len(set(prod_top) & set(cand_top)) / float(k),
+        'top1': bool(prod_top and cand_top and prod_top[0] == cand_top[0]),
+        'spearman': None if rho is None else round(rho, 4),
+        'production_top': prod_top,
+        'candidate_top': cand_top,
+    }
+
+
+def _percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    return round(float(np.percentile(values, p)), 4)
+
+
+class ShadowEvaluator:
+    def __init__(self, state_dir: Optional[str] = None, sample_rate: float = 1.0, max_pending: int = 256,
+                 keep_records: int = 5000, log_path: Optional[str] = None, model_registry=None):
+        self.state_dir = os.path.abspath(state_dir or DEFAULT_STATE_DIR)
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self._model_registry = model_registry
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow-eval')
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._records: 'deque[Dict[str, Any]]' = deque(maxlen=keep_records)
+        self._counters = {'mirrored': 0, 'dropped': 0, 'sampled_out': 0, 'errors': 0}
+        self._candidate: Optional[Dict[str, Any]] = None
+        self._candidate_mtime: Optional[int] = None
+
+    @property
+    def models(self):
+        if self._model_registry is None:
+            from app.services.model_registry import get_model_registry
+            return get_model_registry()
+        return self._model_registry
+
+    @property
+    def candidate_file(self) -> str:
+        return os.path.join(self.state_dir, 'candidate.json')
+
+    def candidate(self) -> Optional[Dict[str, Any]]:
+        """{'path', 'production_path', 'set_by', 'set_at'} or None when shadowing is off."""
+        try:
+            mtime = os.stat(self.candidate_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._candidate_mtime:
+            config = None
+            if mtime is not None:
+                try:
+                    with open(self.candidate_file, 'r', encoding='utf-8') as fh:
+                        config = json.load(fh) or None
+                except (OSError, ValueError):
+                    config = None
+            self._candidate, self._candidate_mtime = config, mtime
+        return self._candidate
+
+    def set_candidate(self, path: Optional[str], production_path: Optional[str] = None,
+                      set_by: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Start shadowing ``path`` against ``production_path`` (None stops shadowing)."""
+        os.makedirs(self.state_dir, exist_ok=True)
+        config = None
+        if path:
+            config = {'path': os.path.abspath(path), 'production_path': os.path.abspath(production_path),
+                      'set_by': set_by, 'set_at': datetime.now(timezone.utc).isoformat()}
+        tmp_path = f'{self.candidate_file}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump(config, fh)
+        os.replace(tmp_path, self.candidate_file)
+        with self._lock:
+            self._records.clear()
+        return config
+
+    def mirror(self, features, production_path: str) -> bool:
+        """Queue one comparison; returns False when shadowing is off, sampled out or the queue is full."""
+        config = self.candidate()
+        if not config or os.path.abspath(production_path) != config.get('production_path'):
+            return False
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            with self._lock:
+                self._counters['sampled_out'] += 1
+            return False
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counters['dropped'] += 1
+            return False
+        row = np.array(features, dtype=np.float32).reshape(-1)
+        try:
+            self._executor.submit(self._evaluate, row, config)
+        except RuntimeError:
+            self._slots.release()
+            return False
+        return True
+
+    def _score(self, path: str, row: np.ndarray):
+        from app.services.feature_builder import fit_width
+        from app.services.model_registry import bundle_version
+
+        bundle, predict = self.models.predictor(path)
+        if bundle is None:
+            raise FileNotFoundError(f'Model file not found at {path}')
+        n_features = int(getattr(bundle.get('model'), 'n_features_in_', row.size))
+        X = fit_width(row.reshape(1, -1), n_features)
+        started = time.perf_counter()
+        scores = np.asarray(predict(X))[0]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return scores, list(bundle.get('labels') or []), elapsed_ms, bundle_version(bundle)
+
+    def _evaluate(self, row: np.ndarray, config: Dict[str, Any]) -> None:
+        try:
+            prod_scores, prod_labels, prod_ms, prod_version = self._score(config['production_path'], row)
+            cand_scores, cand_labels, cand_ms, cand_version = self._score(config['path'], row)
+            record = compare_scores(prod_scores, prod_labels, cand_scores, cand_labels)
+            record.update({
+                'at': datetime.now(timezone.utc).isoformat(),
+                'candidate': os.path.basename(config['path']),
+                'candidate_version': cand_version,
+                'production_version': prod_version,
+                'production_ms': round(prod_ms, 4),
+                'candidate_ms': round(cand_ms, 4),
+            })
+            with self._lock:
+                self._records.append(record)
+                self._counters['mirrored'] += 1
+            if self.log_path:
+                try:
+                    with open(self.log_path, 'a', encoding='utf-8') as fh:
+                        fh.write(json.dumps(record) + '\n')
+                except OSError as e:
+                    print(f"[SHADOW] Could not append shadow log: {e}")
+        except Exception as e:
+            with self._lock:
+                self._counters['errors'] += 1
+            print(f"[SHADOW] Comparison failed: {e}")
+        finally:
+            self._slots.release()
+
+    def report(self, recent: int = 10) -> Dict[str, Any]:
+        """Summary of this worker's comparisons for the current candidate."""
+        with self._lock:
+            records = list(self._records)
+            counters = dict(self._counters)
+        overlaps = [r['overlap'] for r in records]
+        rhos = [r['spearman'] for r in records if r['spearman'] is not None]
+        prod_ms = [r['production_ms'] for r in records]
+        cand_ms = [r['candidate_ms'] for r in records]
+        histogram = {str(i): 0 for i in range(TOP_K + 1)}
+        for value in overlaps:
+            histogram[str(int(round(value * TOP_K)))] += 1
+        return {
+            'candidate': self.candidate(),
+            'sample_rate': self.sample_rate,
+            'counters': counters,
+            'comparisons': len(records),
+            'agreement': {
+                'top6_overlap_mean': round(float(np.mean(overlaps)), 4) if overlaps else None,
+                'top6_overlap_histogram': histogram,
+                'top1_rate': round(float(np.mean([r['top1'] for r in records])), 4) if records else None,
+                'spearman_mean': round(float(np.mean(rhos)), 4) if rhos else None,
+                'spearman_p10': _percentile(rhos, 10),
+            },
+            'latency_ms': {
+                'production': {'p50': _percentile(prod_ms, 50), 'p95': _percentile(prod_ms, 95),
+                               'p99': _percentile(prod_ms, 99)},
+                'candidate': {'p50': _percentile(cand_ms, 50), 'p95': _percentile(cand_ms, 95),
+                              'p99': _percentile(cand_ms, 99)},
+            },
+            'recent': records[-recent:] if recent else [],
+        }
+
+
+_evaluator: Optional[ShadowEvaluator] = None
+_evaluator_lock = threading.Lock()
+
+
+def get_shadow_evaluator() -> ShadowEvaluator:
+    """Process-wide evaluator; SHADOW_SAMPLE_RATE, SHADOW_MAX_PENDING, SHADOW_STATE_DIR, SHADOW_EVAL_LOG."""
+    global _evaluator
+    with _evaluator_lock:
+        if _evaluator is None:
+            _evaluator = ShadowEvaluator(
+                state_dir=os.getenv('SHADOW_STATE_DIR') or None,
+                sample_rate=float(os.getenv('SHADOW_SAMPLE_RATE', 1.0)),
+                max_pending=int(os.getenv('SHADOW_MAX_PENDING', 256)),
+                log_path=os.getenv('SHADOW_EVAL_LOG') or None,
+            )
+        return _evaluator
@@ -0,0 +1,239 @@
+"""
+Streaming ingestion of labeled training data for the career models.
+
+Rows are read one at a time from NDJSON or CSV (an upload stream or a local
+file) and packed into preallocated float32 arrays in chunks, so a training set
+of hundreds of thousands of transcripts never exists as Python lists of lists.
+
+NDJSON: one sample per line, same shape as /train's samples:
+    {"grades": [3.5, 2.75, ...], "labels": {"software_engineer": 0.92, ...}}
+CSV: a header row; columns named after a job label are targets (0..1). Grades
+come from a "grades" column (numbers separated by ';' or spaces) when present,
+otherwise from every other column in header order. id/email/student_number
+columns are ignored.
+
+Validation matches /train: grades are clamped to 0..4, scores to 0..1, missing
+labels are 0, rows without usable grades are skipped, and shorter rows are
+zero-padded to the feature length.
+"""
+
+import csv
+import io
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+import numpy as np
+
+CHUNK_ROWS = 4096
+INITIAL_CAPACITY = 16384
+_IGNORED_CSV_COLUMNS = {'id', 'email', 'student_id', 'student_number', 'user_id', 'name'}
+
+# Yielded by the readers for lines that cannot be parsed at all
+INVALID_ROW = object()
+
+
+class SampleArrayBuilder:
+    """Accumulate (grades, label scores) rows into growing float32 X/Y arrays.
+
+    feature_len fixes the width (longer rows are truncated); otherwise the
+    width follows the longest row seen. max_rows stops ingestion early.
+    """
+
+    def __init__(self, labels: Sequence[str], feature_len: Optional[int] = None,
+                 chunk_rows: int = CHUNK_ROWS, initial_capacity: int = INITIAL_CAPACITY,
+                 max_rows: Optional[int] = None):
+        self.labels = list(labels)
+        self._label_index = {name: i for i, name in enumerate(self.labels)}
+        self.fixed_width = feature_len is not None
+        self.width = int(feature_len or 0)
+        self.chunk_rows = max(1, chunk_rows)
+        self.max_rows = max_rows
+        capacity = initial_capacity if max_rows is None else min(initial_capacity, max_rows)
+        self._X = np.zeros((max(1, capacity), max(1, self.width)), dtype=np.float32)
+        self._Y = np.zeros((max(1, capacity), len(self.labels)), dtype=np.float32)
+        self._rows = 0
+        self._pending_grades: List[np.ndarray] = []
+        self._pending_targets: List[List[Tuple[int, float]]] = []
+        self.report = {'rows_read': 0, 'rows_kept': 0, 'skipped_no_grades': 0,
+                       'skipped_invalid': 0, 'truncated_rows': 0, 'unknown_labels': 0}
+
+    @property
+    def full(self) -> bool:
+        return self.max_rows is not None and self._rows + len(self._pending_grades) >= self.max_rows
+
+    def add(self, grades: Any, label_scores: Optional[Dict[str, Any]] = None) -> bool:
+        """Queue one sample; returns False once max_rows has been reached."""
+        if self.full:
+            return False
+        self.report['rows_read'] += 1
+        if grades is INVALID_ROW:
+            self.report['skipped_invalid'] += 1
+            return True
+        try:
+            vec = np.asarray(grades if grades is not None else [], dtype=np.float32).ravel()
+        except (TypeError, ValueError):
+            self.report['skipped_invalid'] += 1
+            return True
+        if vec.size == 0:
+            self.report['skipped_no_grades'] += 1
+            return True
+
+        targets = []
+        for name, value in (label_scores or {}).items():
+            j = self._label_index.get(name)
+            if j is None:
+                self.report['unknown_labels'] += 1
+                continue
+            try:
+                targets.append((j, float(value)))
+            except (TypeError, ValueError):
+                continue
+        self._pending_grades.append(vec)
+        self._pending_targets.append(targets)
+        if len(self._pending_grades) >= self.chunk_rows:
+            self._flush()
+        return True
+
+    def _ensure_capacity(self, rows: int, width: int) -> None:
+        capacity, current_width = self._X.shape
+        if width > current_width:
+            self._X = np.pad(self._X, ((0, 0), (0, width - current_width)))
+        if rows > capacity:
+            new_capacity = max(rows, capacity * 2)
+            if self.max_rows is not None:
+                new_capacity = min(new_capacity, max(rows, self.max_rows))
+            grow = new_capacity - capacity
+            self._X = np.pad(self._X, ((0, grow), (0, 0)))
+            self._Y = np.pad(self._Y, ((0, grow), (0, 0)))
+
+    def _flush(self) -> None:
+        if not self._pending_grades:
+            return
+        lengths = np.fromiter((v.size for v in self._pending_grades), dtype=np.int64,
+                              count=len(self._pending_grades))
+        if not self.fixed_width:
+            self.width = max(self.width, int(lengths.max()))
+        width = self.width
+        self.report['truncated_rows'] += int((lengths > width).sum())
+
+        chunk = np.zeros((len(self._pending_grades), width), dtype=np.float32)
+        for i, vec in enumerate(self._pending_grades):
+            m = min(vec.size, width)
+            chunk[i, :m] = vec[:m]
+        # Rows with NaN/inf grades are rejected as a block, not one float() at a time
+        finite = np.isfinite(chunk).all(axis=1)
+        np.clip(chunk, 0.0, 4.0, out=chunk)
+
+        targets = np.zeros((len(self._pending_targets), len(self.labels)), dtype=np.float32)
+        for i, pairs in enumerate(self._pending_targets):
+            for j, value in pairs:
+                targets[i, j] = value
+        np.nan_to_num(targets, copy=False, nan=0.0, posinf=1.0, neginf=0.0)
+        np.clip(targets, 0.0, 1.0, out=targets)
+
+        kept = int(finite.sum())
+        self.report['skipped_invalid'] += len(finite) - kept
+        if kept:
+            self._ensure_capacity(self._rows + kept, width)
+            self._X[self._rows:self._rows + kept, :width] = chunk[finite]
+            self._Y[self._rows:self._rows + kept] = targets[finite]
+            self._rows += kept
+        self.report['rows_kept'] = self._rows
+        self._pending_grades.clear()
+        self._pending_targets.clear()
+
+    def finish(self) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """Flush the last chunk and return X [rows, width], Y [rows, labels] (views, no copy)."""
+        self._flush()
+        report = dict(self.report, feature_len=int(self.width), rows=int(self._rows),
+                      array_bytes=int(self._X[:self._rows, :self.width].nbytes + self._Y[:self._rows].nbytes))
+        return self._X[:self._rows, :self.width], self._Y[:self._rows], report
+
+
+def iter_ndjson_samples(lines: Iterable[str]) -> Iterator[Tuple[Any, Optional[Dict[str, Any]]]]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield INVALID_ROW, None
+            continue
+        if not isinstance(obj, dict):
+            yield INVALID_ROW, None
+            continue
+        labels = obj.get('labels')
+        yield obj.get('grades'), labels if isinstance(labels, dict) else None
+
+
+def _split_grades(value: str) -> List[float]:
+    parts = value.replace(';', ' ').replace(',', ' ').split()
+    return [float(p) for p in parts]
+
+
+def iter_csv_samples(fh: TextIO, labels: Sequence[str]) -> Iterator[Tuple[Any, Optional[Dict[str, Any]]]]:
+    reader = csv.reader(fh)
+    header = next(reader, None)
+    if not header:
+        return
+    header = [h.strip() for h in header]
+    label_set = set(labels)
+    label_cols = [(i, h) for i, h in enumerate(header) if h in label_set]
+    grades_col = header.index('grades') if 'grades' in header else None
+    grade_cols = [i for i, h in enumerate(header)
+                  if h not in label_set and h.lower() not in _IGNORED_CSV_COLUMNS and i != grades_col]
+    for row in reader:
+        if not row:
+            continue
+        try:
+            if grades_col is not None:
+                grades = _split_grades(row[grades_col]) if grades_col < len(row) else []
+            else:
+                # Trailing empty cells are missing courses, not zeros
+                cells = [row[i].strip() for i in grade_cols if i < len(row)]
+                while cells and not cells[-1]:
+                    cells.pop()
+                grades = [float(c) if c else 0.0 for c in cells]
+        except ValueError:
+            yield INVALID_ROW, None
+            continue
+        scores = {name: row[i] for i, name in label_cols if i < len(row) and row[i].strip()}
+        yield grades, scores
+
+
+def detect_format(filename: Optional[str] = None, content_type: Optional[str] = None) -> str:
+    name = (filename or '').lower()
+    ctype = (content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in ctype:
+        return 'csv'
+    return 'ndjson'
+
+
+def ingest_stream(stream, labels: Sequence[str], fmt: str = 'ndjson', feature_len: Optional[int] = None,
+                  max_rows: Optional[int] = None, chunk_rows: int = CHUNK_ROWS):
+    """Read a binary or text stream into (X, Y, report)."""
+    text = stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    samples = iter_csv_samples(text, labels) if fmt == 'csv' else iter_ndjson_samples(text)
+    builder = SampleArrayBuilder(labels, feature_len=feature_len, chunk_rows=chunk_rows, max_rows=max_rows)
+    for grades, scores in samples:
+        if not builder.add(grades, scores):
+            break
+    X, Y, report = builder.finish()
+    report['format'] = fmt
+    return X, Y, report
+
+
+def ingest_file(path: str, labels: Sequence[str], fmt: Optional[str] = None, **kwargs):
+    with open(path, 'r', encoding='utf-8', newline='') as fh:
+        return ingest_stream(fh, labels, fmt=fmt or detect_format(path), **kwargs)
+
+
+def save_arrays(X: np.ndarray, Y: np.ndarray, directory: str, stem: str) -> Dict[str, str]:
+    """Persist arrays as .npy so the training worker can memory-map them instead of unpickling."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {'X_path': os.path.join(directory, f'{stem}.X.npy'), 'Y_path': os.path.join(directory, f'{stem}.Y.npy')}
+    np.save(paths['X_path'], X)
+    np.save(paths['Y_path'], Y)
+    return paths
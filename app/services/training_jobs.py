@@ -0,0 +1,290 @@
+"""
+Asynchronous training jobs for the career forecasting models.
+
+Training endpoints enqueue a job and return immediately; the forest is fitted
+in a separate worker process with a CPU quota so web workers keep their cores:
+  - TRAINING_WORKERS       concurrent training processes (default 1)
+  - TRAINING_CPU_CORES     cores the worker may use (default half the machine);
+                           pinned with sched_setaffinity and used as n_jobs
+  - TRAINING_NICE          niceness added in the worker (default 10)
+  - TRAINING_JOBS_DIR      where job status files live (default .cache/training_jobs)
+
+Job status is a JSON file per job so any web process can answer polls:
+    {'id', 'kind', 'state': queued|running|succeeded|failed, 'progress': 0..1,
+     'metrics': {'fit_seconds', 'oob_score', ...}, 'error', ...}
+On success the bundle is published as a new version with save_bundle (immutable
+artifact + atomic rename of the live file), so serving processes pick up the
+new model on their next registry lookup; the job records the version id.
+
+The same worker also runs stale-forecast recomputes (spec task
+'recompute_forecasts', see forecast_recompute) so they never compete with
+web workers for CPU.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+DEFAULT_JOBS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'training_jobs')
+
+_ACTIVE_STATES = ('queued', 'running')
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _job_path(state_dir: str, job_id: str) -> str:
+    return os.path.join(state_dir, f'{job_id}.json')
+
+
+def _write_job(state_dir: str, job: Dict[str, Any]) -> None:
+    path = _job_path(state_dir, job['id'])
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(job, fh)
+    os.replace(tmp_path, path)
+
+
+def _read_job(state_dir: str, job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_job_path(state_dir, job_id), 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _init_worker(cpu_cores: int, niceness: int) -> None:
+    """Confine the training process to its CPU quota before any BLAS/OpenMP pool starts."""
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(cpu_cores)
+    if hasattr(os, 'sched_setaffinity'):
+        try:
+            allowed = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, allowed[-cpu_cores:])
+        except OSError:
+            pass
+    if niceness and hasattr(os, 'nice'):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+
+
+def _load_dataset(spec: Dict[str, Any]):
+    from app.services import career_training
+
+    dataset = spec['dataset']
+    n_labels = len(spec['labels'])
+    if dataset['type'] == 'arrays':
+        return dataset['X'], dataset['Y']
+    if dataset['type'] == 'npy':
+        # Written by the streaming ingestion path; mapped rather than copied into the worker
+        import numpy as np
+        return np.load(dataset['X_path'], mmap_mode='r'), np.load(dataset['Y_path'], mmap_mode='r')
+    if dataset['type'] == 'synthetic_it':
+        return career_training.synthetic_it_dataset(dataset['feature_len'], n_labels, dataset.get('seed', 42))
+    if dataset['type'] == 'synthetic_cs':
+        return career_training.synthetic_cs_dataset(dataset['feature_len'], n_labels, dataset.get('seed', 42))
+    raise ValueError(f"Unknown dataset type {dataset['type']!r}")
+
+
+def _run_recompute(state_dir: str, job: Dict[str, Any], spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Stale-forecast recompute (forecast_recompute) on the same niced, CPU-capped worker."""
+    from app.services.forecast_recompute import recompute_stale_forecasts
+    from app.services.supabase_client import get_supabase_client
+
+    def progress(fraction: float) -> None:
+        job['progress'] = round(fraction, 3)
+        _write_job(state_dir, job)
+
+    try:
+        checkpoint = recompute_stale_forecasts(
+            get_supabase_client(), program=spec['program'], model_path=spec['model_path'],
+            checkpoint_file=spec['target_path'], progress=progress, **(spec.get('options') or {}))
+        job.update({'state': 'succeeded', 'progress': 1.0, 'finished_at': _now(), 'metrics': checkpoint,
+                    'model_version': checkpoint.get('model_version')})
+    except Exception as e:
+        job.update({'state': 'failed', 'finished_at': _now(), 'error': f'{type(e).__name__}: {e}'})
+    _write_job(state_dir, job)
+    return job
+
+
+def _run_job(state_dir: str, job_id: str, spec: Dict[str, Any], cpu_cores: int) -> Dict[str, Any]:
+    """Worker-process entry point: fit, publish atomically and record metrics."""
+    from app.services.career_training import fit_forest
+    from app.services.model_registry import save_bundle
+
+    job = _read_job(state_dir, job_id) or {'id': job_id}
+    job.update({'state': 'running', 'started_at': _now(), 'pid': os.getpid(), 'progress': 0.0})
+    _write_job(state_dir, job)
+    if spec.get('task') == 'recompute_forecasts':
+        return _run_recompute(state_dir, job, spec)
+
+    def progress(fraction: float) -> None:
+        # Dataset + fit are ~95% of the work; publishing is the rest
+        job['progress'] = round(0.05 + 0.9 * fraction, 3)
+        _write_job(state_dir, job)
+
+    try:
+        X, Y = _load_dataset(spec)
+        params = spec.get('model_params') or {}
+        model, metrics = fit_forest(
+            X, Y,
+            n_estimators=int(params.get('n_estimators', 120)),
+            max_depth=params.get('max_depth'),
+            random_state=int(params.get('random_state', 42)),
+            n_jobs=cpu_cores,
+            oob_score=bool(params.get('oob_score', True)),
+            progress=progress,
+        )
+        started = time.perf_counter()
+        version = save_bundle({'model': model, 'labels': list(spec['labels'])}, spec['target_path'],
+                              metadata={'job_id': job_id, 'kind': job.get('kind'), 'metrics': metrics,
+                                        **(job.get('meta') or {})})
+        metrics['publish_seconds'] = round(time.perf_counter() - started, 3)
+        job.update({'state': 'succeeded', 'progress': 1.0, 'finished_at': _now(), 'metrics': metrics,
+                    'model_version': version})
+    except Exception as e:
+        job.update({'state': 'failed', 'finished_at': _now(), 'error': f'{type(e).__name__}: {e}'})
+    finally:
+        dataset = spec.get('dataset') or {}
+        if dataset.get('cleanup'):
+            for key in ('X_path', 'Y_path'):
+                try:
+                    os.remove(dataset[key])
+                except (KeyError, OSError):
+                    pass
+    _write_job(state_dir, job)
+    return job
+
+
+class TrainingJobQueue:
+    def __init__(self, state_dir: Optional[str] = None, max_workers: int = 1,
+                 cpu_cores: Optional[int] = None, niceness: int = 10):
+        self.state_dir = os.path.abspath(state_dir or DEFAULT_JOBS_DIR)
+        os.makedirs(self.state_dir, exist_ok=True)
+        available = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+        self.cpu_cores = max(1, min(available, cpu_cores or max(1, available // 2)))
+        self.max_workers = max(1, max_workers)
+        self.niceness = niceness
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self._active_by_target: Dict[str, str] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: never fork a web worker that holds sockets, locks and mmapped models
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.cpu_cores, self.niceness),
+            )
+        return self._executor
+
+    def submit(self, kind: str, spec: Dict[str, Any], meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Queue a training job; a job already queued/running for the same target is returned instead."""
+        target = os.path.abspath(spec['target_path'])
+        spec = dict(spec, target_path=target)
+        with self._lock:
+            active_id = self._active_by_target.get(target)
+            if active_id:
+                active = self.get(active_id)
+                if active and active.get('state') in _ACTIVE_STATES:
+                    return dict(active, deduplicated=True)
+
+            job_id = uuid.uuid4().hex[:16]
+            job = {
+                'id': job_id,
+                'kind': kind,
+                'state': 'queued',
+                'progress': 0.0,
+                'target': os.path.basename(target),
+                'created_at': _now(),
+                'cpu_cores': self.cpu_cores,
+                'meta': meta or {},
+            }
+            _write_job(self.state_dir, job)
+            try:
+                future = self._pool().submit(_run_job, self.state_dir, job_id, spec, self.cpu_cores)
+            except Exception as e:
+                # Pool broken (e.g. worker killed by OOM): rebuild it on the next submit
+                self._executor = None
+                job.update({'state': 'failed', 'finished_at': _now(), 'error': f'Could not start worker: {e}'})
+                _write_job(self.state_dir, job)
+                return job
+            self._futures[job_id] = future
+            self._active_by_target[target] = job_id
+        # Outside the lock: the callback runs inline if the future is already done
+        future.add_done_callback(lambda f, job_id=job_id, target=target: self._on_done(job_id, target, f))
+        print(f"[TRAINING] Queued {kind} job {job_id} -> {os.path.basename(target)}")
+        return job
+
+    def _on_done(self, job_id: str, target: str, future: Future) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+            if self._active_by_target.get(target) == job_id:
+                self._active_by_target.pop(target, None)
+        error = future.exception()
+        if error is not None:
+            # The worker died without writing its own failure record
+            job = self.get(job_id) or {'id': job_id}
+            job.update({'state': 'failed', 'finished_at': _now(), 'error': f'Worker crashed: {error}'})
+            _write_job(self.state_dir, job)
+            with self._lock:
+                self._executor = None
+        else:
+            job = future.result()
+            print(f"[TRAINING] Job {job_id} {job.get('state')}: {job.get('metrics') or job.get('error')}")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        return _read_job(self.state_dir, job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll_seconds: float = 0.5) -> Dict[str, Any]:
+        """Block until the job finishes (used by background warm-up threads, never by requests)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job and job.get('state') not in _ACTIVE_STATES:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f'Training job {job_id} still {job and job.get("state")}')
+            time.sleep(poll_seconds)
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        jobs = []
+        for name in os.listdir(self.state_dir):
+            if name.endswith('.json'):
+                job = _read_job(self.state_dir, name[:-5])
+                if job:
+                    jobs.append(job)
+        jobs.sort(key=lambda j: j.get('created_at') or 0, reverse=True)
+        return jobs[:limit]
+
+
+_queue: Optional[TrainingJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_training_queue() -> TrainingJobQueue:
+    """Process-wide queue configured from TRAINING_* environment variables."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            cores = os.getenv('TRAINING_CPU_CORES')
+            _queue = TrainingJobQueue(
+                state_dir=os.getenv('TRAINING_JOBS_DIR') or None,
+                max_workers=int(os.getenv('TRAINING_WORKERS', 1)),
+                cpu_cores=int(cores) if cores else None,
+                niceness=int(os.getenv('TRAINING_NICE', 10)),
+            )
+        return _queue
@@ -0,0 +1,185 @@
+"""
+Parallel bootstrap training of the per-program career models.
+
+The training queue fits one model at a time on its CPU quota. For a fresh
+deployment (or after changing a program's subjects) every program in the
+program manifest needs a model, and fitting them back to back leaves cores
+idle during the serial parts of each job (dataset generation, warm-start
+steps, OOB scoring, publishing). This orchestrator fits all of them at once,
+one spawned process per program, each pinned to its own disjoint set of
+cores:
+
+    python -m app.services.training_orchestrator --programs IT CS --cores IT=3 CS=3
+
+Budgets not given explicitly share the remaining cores evenly. A process
+never gets more threads than its budget (n_jobs, OMP/BLAS threads and
+sched_setaffinity all follow it), so concurrent fits do not oversubscribe
+the machine. Each program's dataset and forest settings come from the
+"bootstrap" entry of its manifest entry; the width is the program's
+canonical feature count. Jobs run through training_jobs._run_job, so they
+write the same status files (poll /train-jobs/<id>) and publish with
+save_bundle like queued jobs.
+"""
+
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.services.training_jobs import DEFAULT_JOBS_DIR, _run_job, _write_job
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_core_budgets(programs: Sequence[str], budgets: Optional[Dict[str, int]] = None,
+                      cores: Optional[Sequence[int]] = None) -> Dict[str, List[int]]:
+    """Disjoint CPU ids per program: explicit budgets first, the rest split evenly (at least one each)."""
+    cores = list(cores if cores is not None else available_cores())
+    budgets = {p.upper(): int(n) for p, n in (budgets or {}).items()}
+    unknown = set(budgets) - {p.upper() for p in programs}
+    if unknown:
+        raise ValueError(f"Core budget for unknown program(s): {', '.join(sorted(unknown))}")
+    if any(n < 1 for n in budgets.values()):
+        raise ValueError('Core budgets must be at least 1')
+    rest = [p.upper() for p in programs if p.upper() not in budgets]
+    spare = len(cores) - sum(budgets.values())
+    if spare < len(rest):
+        raise ValueError(f'{len(cores)} cores cannot cover budgets {budgets} plus {len(rest)} more program(s)')
+    for i, program in enumerate(rest):
+        budgets[program] = spare // len(rest) + (1 if i < spare % len(rest) else 0)
+
+    plan, offset = {}, 0
+    for program in (p.upper() for p in programs):
+        plan[program] = cores[offset:offset + budgets[program]]
+        offset += budgets[program]
+    return plan
+
+
+def _default_labels() -> List[str]:
+    from app.routes.objective_1 import JOBS_MASTER
+    return list(JOBS_MASTER)
+
+
+def program_training_spec(program: str, labels: Optional[Sequence[str]] = None, program_registry=None,
+                          seed: int = 42) -> Dict[str, Any]:
+    """Training-job spec for a program's manifest "bootstrap" entry."""
+    from app.services.feature_builder import get_feature_builder
+
+    if program_registry is None:
+        from app.services.program_registry import get_program_registry
+        program_registry = get_program_registry()
+    program = program.upper()
+    spec = program_registry.spec(program)
+    if not spec:
+        raise ValueError(f'Unknown program {program!r}')
+    bootstrap = spec.get('bootstrap')
+    if not bootstrap:
+        raise ValueError(f'Program {program} has no bootstrap entry in the program manifest')
+    return {
+        'target_path': program_registry.model_path(program),
+        'labels': list(labels or _default_labels()),
+        'dataset': {'type': bootstrap['dataset'], 'feature_len': get_feature_builder(program).n_columns,
+                    'seed': seed},
+        'model_params': {'n_estimators': int(bootstrap.get('n_estimators', 120)),
+                         'max_depth': bootstrap.get('max_depth'), 'random_state': seed},
+    }
+
+
+def _run_pinned(state_dir: str, job_id: str, spec: Dict[str, Any], cores: List[int], niceness: int) -> Dict[str, Any]:
+    """Pool entry point: confine this fresh process to ``cores`` before sklearn starts any threads."""
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(len(cores))
+    if hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+    if niceness and hasattr(os, 'nice'):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+    return _run_job(state_dir, job_id, spec, len(cores))
+
+
+def train_programs(specs: Dict[str, Dict[str, Any]], plan: Dict[str, List[int]], parallel: bool = True,
+                   state_dir: Optional[str] = None, niceness: int = 10) -> Dict[str, Any]:
+    """Fit and publish one model per program; returns {'wall_seconds', 'jobs': {program: job}}.
+
+    parallel=False runs the same jobs one after another, each on all planned
+    cores: the queue's serial path, for comparison.
+    """
+    state_dir = os.path.abspath(state_dir or DEFAULT_JOBS_DIR)
+    os.makedirs(state_dir, exist_ok=True)
+    all_cores = sorted({c for cores in plan.values() for c in cores})
+    jobs = {}
+    for program in specs:
+        job = {'id': uuid.uuid4().hex[:16], 'kind': f'{program.lower()}_bootstrap', 'state': 'queued',
+               'progress': 0.0, 'target': os.path.basename(specs[program]['target_path']),
+               'created_at': time.time(), 'cpu_cores': len(plan[program] if parallel else all_cores),
+               'meta': {'program': program, 'orchestrated': True, 'parallel': parallel}}
+        _write_job(state_dir, job)
+        jobs[program] = job
+
+    started = time.perf_counter()
+    # One process per job (max_tasks_per_child=1) so every job starts with a clean thread setup
+    with ProcessPoolExecutor(max_workers=len(specs) if parallel else 1,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             max_tasks_per_child=1) as pool:
+        futures = {program: pool.submit(_run_pinned, state_dir, jobs[program]['id'], specs[program],
+                                        plan[program] if parallel else all_cores, niceness)
+                   for program in specs}
+        for program, future in futures.items():
+            try:
+                jobs[program] = future.result()
+            except Exception as e:
+                jobs[program].update({'state': 'failed', 'finished_at': time.time(), 'error': f'Worker crashed: {e}'})
+                _write_job(state_dir, jobs[program])
+            print(f"[TRAINING] {program} {jobs[program].get('state')}: "
+                  f"{jobs[program].get('metrics') or jobs[program].get('error')}")
+    return {'wall_seconds': round(time.perf_counter() - started, 3), 'parallel': parallel,
+            'cores': {program: plan[program] if parallel else all_cores for program in specs}, 'jobs': jobs}
+
+
+def _parse_budgets(items: Sequence[str]) -> Dict[str, int]:
+    budgets = {}
+    for item in items or []:
+        program, _, count = item.partition('=')
+        budgets[program.strip().upper()] = int(count)
+    return budgets
+
+
+def main(argv=None) -> int:
+    import argparse
+    import json
+
+    from app.services.program_registry import get_program_registry
+
+    parser = argparse.ArgumentParser(description='Bootstrap-train every program model in parallel.')
+    parser.add_argument('--programs', nargs='*', help='programs to train (default: all in the manifest)')
+    parser.add_argument('--cores', nargs='*', metavar='PROGRAM=N', help='explicit per-program core budgets')
+    parser.add_argument('--serial', action='store_true', help='train one program at a time on all cores')
+    parser.add_argument('--nice', type=int, default=int(os.getenv('TRAINING_NICE', 10)))
+    args = parser.parse_args(argv)
+
+    programs = [p.upper() for p in (args.programs or get_program_registry().programs())]
+    specs = {program: program_training_spec(program) for program in programs}
+    parallel = not args.serial and len(programs) > 1
+    if parallel and len(available_cores()) < len(programs) and not args.cores:
+        print(f"[TRAINING] Fewer cores than programs; training {', '.join(programs)} serially")
+        parallel = False
+    plan = plan_core_budgets(programs, _parse_budgets(args.cores)) if parallel else \
+        {program: available_cores() for program in programs}
+    result = train_programs(specs, plan, parallel=parallel, niceness=args.nice)
+    print(json.dumps(result, indent=2, default=str))
+    return 0 if all(job.get('state') == 'succeeded' for job in result['jobs'].values()) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+"""
+Build compact career model variants and benchmark them against the serving model.
+
+    python benchmark_career_models.py                       # IT model, all variants
+    python benchmark_career_models.py --model models/dt_career_cs.joblib \
+        --variants pruned_30x10 lowrank_r8 --samples 20000 --grades cohort.ndjson
+    python benchmark_career_models.py --publish pruned_60x12   # make a variant the live model
+
+Variants are pruned from, or distilled from the predictions of, the current
+model (see app/services/model_compaction.py) and saved under --out-dir. For the
+teacher and each variant the report shows file size, tree array bytes, cold load time
+through the model registry (load + flatten), p50/p99 single-row latency of the
+serving predictor, and top-6 agreement with the teacher on held-out grades.
+--grades takes real grade vectors (NDJSON with a "grades" field, or a JSON list
+of lists) to distil and evaluate on instead of synthetic ones only.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import numpy as np
+from joblib import dump
+
+
+def load_grade_vectors(path):
+    if not path:
+        return None
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as fh:
+            return [list(map(float, v)) for v in json.load(fh)]
+    from app.services.training_ingest import ingest_file
+    X, _, report = ingest_file(path, labels=[], fmt='ndjson')
+    print(f"Loaded {report['rows']} grade vectors from {path}")
+    return X
+
+
+def measure(name, path, X_eval, Y_ref, latency_rows):
+    from app.services.model_registry import ModelRegistry, _bundle_nbytes
+
+    registry = ModelRegistry()
+    started = time.perf_counter()
+    bundle, predict = registry.predictor(path)
+    load_seconds = time.perf_counter() - started
+    stats = registry.stats()['models'][os.path.abspath(path)]
+
+    from app.services.model_compaction import latency_profile, top_k_agreement
+    Y = np.asarray(predict(X_eval))
+    row = {
+        'variant': name,
+        'engine': stats.get('engine'),
+        'file_bytes': os.path.getsize(path),
+        'tree_array_bytes': _bundle_nbytes(bundle),
+        'load_seconds': round(load_seconds, 4),
+        **latency_profile(predict, X_eval, rows=latency_rows),
+        **({'overlap': 1.0, 'top1': 1.0, 'exact': 1.0} if Y_ref is None else top_k_agreement(Y_ref, Y)),
+    }
+    return row, Y
+
+
+def print_table(rows):
+    cols = ['variant', 'engine', 'file_bytes', 'tree_array_bytes', 'load_seconds', 'p50_ms', 'p99_ms',
+            'overlap', 'top1', 'exact', 'fit_seconds']
+    widths = {c: max(len(c), *(len(str(r.get(c, ''))) for r in rows)) for c in cols}
+    print('  '.join(c.ljust(widths[c]) for c in cols))
+    for r in rows:
+        print('  '.join(str(r.get(c, '')).ljust(widths[c]) for c in cols))
+
+
+def main():
+    from app.services.model_compaction import build_variant, distillation_inputs, variant_specs
+    from app.services.model_registry import bundle_version, get_model_registry, save_bundle
+
+    default_model = os.path.join('models', 'dt_career.joblib')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=default_model, help='serving bundle to compact (teacher)')
+    parser.add_argument('--variants', nargs='*', help='variant names (default: all)')
+    parser.add_argument('--samples', type=int, default=10000, help='distillation rows')
+    parser.add_argument('--eval-samples', type=int, default=2000, help='held-out rows for agreement')
+    parser.add_argument('--latency-rows', type=int, default=500, help='single-row predictions timed per model')
+    parser.add_argument('--grades', help='real grade vectors (.ndjson or .json) to distil/evaluate on')
+    parser.add_argument('--out-dir', default=os.path.join('.cache', 'compact_models'))
+    parser.add_argument('--n-jobs', type=int, default=1)
+    parser.add_argument('--json', dest='json_out', help='write the report as JSON to this file')
+    parser.add_argument('--publish', help='variant to publish as the new version of --model after benchmarking')
+    args = parser.parse_args()
+
+    teacher_bundle = get_model_registry().get(args.model)
+    if teacher_bundle is None:
+        print(f"Model not found: {args.model}")
+        return 1
+    teacher = teacher_bundle['model']
+    labels = teacher_bundle['labels']
+    n_features = int(teacher.n_features_in_)
+
+    real = load_grade_vectors(args.grades)
+    X_train = distillation_inputs(n_features, args.samples, seed=7, X=real)
+    # Held-out: the real vectors' tail (if any) plus fresh synthetic rows
+    X_eval = distillation_inputs(n_features, args.eval_samples, seed=11,
+                                 X=None if real is None else np.asarray(real)[-args.eval_samples // 2:])
+
+    _, teacher_predict = get_model_registry().predictor(args.model)
+    Y_train = np.asarray(teacher_predict(X_train))
+
+    rows = []
+    teacher_row, Y_ref = measure('teacher', args.model, X_eval, None, args.latency_rows)
+    teacher_row['fit_seconds'] = ''
+    rows.append(teacher_row)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    built = {}
+    for spec in variant_specs(args.variants):
+        est, fit_seconds = build_variant(spec, X_train, Y_train, n_jobs=args.n_jobs, teacher=teacher)
+        bundle = {'model': est, 'labels': labels, 'variant': spec,
+                  'distilled_from': bundle_version(teacher_bundle)}
+        path = os.path.join(args.out_dir, f"{spec['name']}.joblib")
+        dump(bundle, path)
+        built[spec['name']] = (bundle, path)
+        row, _ = measure(spec['name'], path, X_eval, Y_ref, args.latency_rows)
+        row['fit_seconds'] = round(fit_seconds, 2)
+        rows.append(row)
+
+    print_table(rows)
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as fh:
+            json.dump({'model': args.model, 'teacher_version': bundle_version(teacher_bundle),
+                       'n_features': n_features, 'rows': rows}, fh, indent=2)
+
+    if args.publish:
+        if args.publish not in built:
+            print(f"--publish {args.publish}: not among the variants built")
+            return 1
+        bundle, _ = built[args.publish]
+        report = next(r for r in rows if r['variant'] == args.publish)
+        version = save_bundle(bundle, args.model, metadata={'compaction': bundle['variant'], 'benchmark': report})
+        print(f"Published {args.publish} as {args.model} version {version}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Offline throughput / tail-latency benchmark for the LLM-backed paths.
+
+1. Record a cassette once against the real API (uses quota):
+     python benchmark_llm_replay.py --mode record --transcripts transcripts.json --pdf tor.pdf
+
+2. Replay it as often as needed with no network:
+     python benchmark_llm_replay.py --mode replay --transcripts transcripts.json --pdf tor.pdf \
+         --concurrency 8 --iterations 200 --latency recorded --rate-429 0.05
+
+transcripts.json is a list of transcript strings or grade lists
+([{"subject": ..., "grade": ...}, ...]) as sent to /api/objective-2/process.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.getcwd())
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[idx]
+
+
+def transcript_text_for(item):
+    if isinstance(item, str):
+        return item
+    if item and isinstance(item[0], dict):
+        return "\n".join(f"- {g.get('subject', 'Unknown')}: {g.get('grade', 'N/A')}" for g in item)
+    return f"{item}"
+
+
+def run_jobs(name, fn, inputs, iterations, concurrency):
+    latencies = []
+    errors = 0
+
+    def one(i):
+        started = time.perf_counter()
+        result = fn(inputs[i % len(inputs)])
+        return time.perf_counter() - started, result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, result in pool.map(one, range(iterations)):
+            latencies.append(elapsed)
+            if not result or (isinstance(result, dict) and result.get('error')):
+                errors += 1
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    report = {
+        'path': name,
+        'requests': iterations,
+        'concurrency': concurrency,
+        'errors_or_empty': errors,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(iterations / wall, 3) if wall else None,
+        'p50': round(percentile(latencies, 50), 4),
+        'p95': round(percentile(latencies, 95), 4),
+        'p99': round(percentile(latencies, 99), 4),
+        'max': round(latencies[-1], 4) if latencies else 0.0,
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['record', 'replay'], default='replay')
+    parser.add_argument('--cassette', default=None, help='JSONL cassette path (default .cache/llm_cassette.jsonl)')
+    parser.add_argument('--transcripts', help='JSON file with transcripts for calculate_riasec_with_gemini')
+    parser.add_argument('--pdf', action='append', default=[], help='TOR PDF for extract_grades_from_tor (repeatable)')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', default='0', help="seconds per call, or 'recorded'")
+    parser.add_argument('--latency-scale', type=float, default=1.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0, help='probability of an injected 429 per call')
+    parser.add_argument('--retry-delay', type=float, default=0.5, help='initial 429 backoff for the gateway')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # Configure the gateway before any route module creates it
+    os.environ['LLM_BACKEND'] = args.mode
+    os.environ['LLM_CACHE'] = 'false'  # measure the backend, not the response cache
+    os.environ['LLM_RETRY_INITIAL_DELAY'] = str(args.retry_delay)
+    if args.cassette:
+        os.environ['LLM_RECORD_PATH'] = args.cassette
+        os.environ['LLM_REPLAY_PATH'] = args.cassette
+    os.environ['LLM_REPLAY_LATENCY'] = args.latency
+    os.environ['LLM_REPLAY_LATENCY_SCALE'] = str(args.latency_scale)
+    os.environ['LLM_REPLAY_JITTER'] = str(args.jitter)
+    os.environ['LLM_REPLAY_429_RATE'] = str(args.rate_429)
+    os.environ['LLM_REPLAY_SEED'] = str(args.seed)
+
+    from app.services.llm_gateway import get_llm_gateway
+
+    iterations = args.iterations
+    concurrency = args.concurrency
+    if args.mode == 'record':
+        # One pass over the inputs is enough to fill the cassette
+        concurrency = 1
+
+    reports = []
+    if args.transcripts:
+        from app.routes.objective_2 import calculate_riasec_with_gemini
+        with open(args.transcripts, 'r', encoding='utf-8') as fh:
+            transcripts = [transcript_text_for(t) for t in json.load(fh)]
+        n = len(transcripts) if args.mode == 'record' else iterations
+        reports.append(run_jobs('calculate_riasec_with_gemini', calculate_riasec_with_gemini, transcripts, n, concurrency))
+
+    if args.pdf:
+        from app.routes.ocr_tor import extract_grades_from_tor
+        pdfs = []
+        for path in args.pdf:
+            with open(path, 'rb') as fh:
+                pdfs.append((fh.read(), os.path.basename(path)))
+        n = len(pdfs) if args.mode == 'record' else iterations
+        reports.append(run_jobs('extract_grades_from_tor', lambda p: extract_grades_from_tor(*p), pdfs, n, concurrency))
+
+    if not reports:
+        parser.error('nothing to run: pass --transcripts and/or --pdf')
+
+    gateway = get_llm_gateway()
+    print(json.dumps({'gateway': gateway.metrics(), 'backend_stats': getattr(gateway.backend, 'stats', None)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+-- Bulk write of denormalized career forecasts (batch /process-batch endpoints)
+-- payload: [{user_id, career_top_jobs, career_top_jobs_scores, career_forecast_analyzed_at}, ...]
+-- One statement instead of one PATCH round trip per student.
+
+create or replace function public.bulk_update_career_forecasts(payload jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  updated_count integer := 0;
+begin
+  update public.users u
+  set career_top_jobs = array(select jsonb_array_elements_text(p.item -> 'career_top_jobs')),
+      career_top_jobs_scores = array(select (jsonb_array_elements_text(p.item -> 'career_top_jobs_scores'))::numeric),
+      career_forecast_analyzed_at = coalesce((p.item ->> 'career_forecast_analyzed_at')::timestamptz, now())
+  from jsonb_array_elements(payload) as p(item)
+  where u.user_id = (p.item ->> 'user_id')::bigint;
+
+  get diagnostics updated_count = row_count;
+  return updated_count;
+end;
+$$;
+
+-- Postgres grants EXECUTE to PUBLIC by default; this security definer function is for the backend only
+revoke execute on function public.bulk_update_career_forecasts(jsonb) from public, anon, authenticated;
+grant execute on function public.bulk_update_career_forecasts(jsonb) to service_role;
@@ -0,0 +1,39 @@
+-- Record which model version produced each stored career forecast
+-- Versions are the ids written to models/<name>.manifest.json by save_bundle;
+-- forecasts made before versioning (or by an unversioned model file) keep null / 'unversioned'.
+
+alter table if exists public.users
+  add column if not exists career_model_version text;
+
+comment on column public.users.career_model_version is 'Model version id (manifest) that produced career_top_jobs';
+
+-- Finding stale forecasts: where career_model_version <> current version
+create index if not exists idx_users_career_model_version
+  on public.users (career_model_version);
+
+-- Bulk writer now also stores the model version
+create or replace function public.bulk_update_career_forecasts(payload jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  updated_count integer := 0;
+begin
+  update public.users u
+  set career_top_jobs = array(select jsonb_array_elements_text(p.item -> 'career_top_jobs')),
+      career_top_jobs_scores = array(select (jsonb_array_elements_text(p.item -> 'career_top_jobs_scores'))::numeric),
+      career_model_version = p.item ->> 'career_model_version',
+      career_forecast_analyzed_at = coalesce((p.item ->> 'career_forecast_analyzed_at')::timestamptz, now())
+  from jsonb_array_elements(payload) as p(item)
+  where u.user_id = (p.item ->> 'user_id')::bigint;
+
+  get diagnostics updated_count = row_count;
+  return updated_count;
+end;
+$$;
+
+-- Postgres grants EXECUTE to PUBLIC by default; this security definer function is for the backend only
+revoke execute on function public.bulk_update_career_forecasts(jsonb) from public, anon, authenticated;
+grant execute on function public.bulk_update_career_forecasts(jsonb) to service_role;
@@ -0,0 +1,36 @@
+-- Key of the stored career forecast: '<model version>:<sha256 of the normalized grade vector>'
+-- (app/services/forecast_memo.py). /api/objective-1/process compares it with the key of the
+-- request and skips rewriting the row when nothing changed. Null for unversioned models.
+
+alter table if exists public.users
+  add column if not exists career_forecast_key text;
+
+comment on column public.users.career_forecast_key is 'Model version + grade-vector hash that produced career_top_jobs';
+
+-- Bulk writer also stores the forecast key (null when the payload has none)
+create or replace function public.bulk_update_career_forecasts(payload jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  updated_count integer := 0;
+begin
+  update public.users u
+  set career_top_jobs = array(select jsonb_array_elements_text(p.item -> 'career_top_jobs')),
+      career_top_jobs_scores = array(select (jsonb_array_elements_text(p.item -> 'career_top_jobs_scores'))::numeric),
+      career_model_version = p.item ->> 'career_model_version',
+      career_forecast_key = p.item ->> 'career_forecast_key',
+      career_forecast_analyzed_at = coalesce((p.item ->> 'career_forecast_analyzed_at')::timestamptz, now())
+  from jsonb_array_elements(payload) as p(item)
+  where u.user_id = (p.item ->> 'user_id')::bigint;
+
+  get diagnostics updated_count = row_count;
+  return updated_count;
+end;
+$$;
+
+-- Postgres grants EXECUTE to PUBLIC by default; this security definer function is for the backend only
+revoke execute on function public.bulk_update_career_forecasts(jsonb) from public, anon, authenticated;
+grant execute on function public.bulk_update_career_forecasts(jsonb) to service_role;
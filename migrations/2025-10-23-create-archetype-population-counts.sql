@@ -0,0 +1,106 @@
+-- Population histogram of primary archetypes, kept up to date by a trigger so
+-- /api/objective-2/process reads a handful of rows instead of every user
+-- (app/services/archetype_population.py). Labels are capitalized the same way
+-- the endpoint always did ('investigative' -> 'Investigative').
+
+create table if not exists public.archetype_population_counts (
+  archetype text primary key,
+  user_count bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create or replace function public.archetype_label(value text)
+returns text
+language sql
+immutable
+as $$
+  select case when value is null or value = '' then null
+              else upper(left(value, 1)) || lower(substr(value, 2)) end
+$$;
+
+create or replace function public.track_archetype_population()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  old_label text;
+  new_label text;
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    old_label := public.archetype_label(old.primary_archetype);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    new_label := public.archetype_label(new.primary_archetype);
+  end if;
+  if old_label is not distinct from new_label then
+    return null;
+  end if;
+
+  if old_label is not null then
+    update public.archetype_population_counts
+    set user_count = user_count - 1, updated_at = now()
+    where archetype = old_label;
+  end if;
+  if new_label is not null then
+    insert into public.archetype_population_counts as c (archetype, user_count)
+    values (new_label, 1)
+    on conflict (archetype) do update set user_count = c.user_count + 1, updated_at = now();
+  end if;
+  return null;
+end;
+$$;
+
+-- Full recount; run once below and whenever the counters are suspected to have drifted
+create or replace function public.refresh_archetype_population_counts()
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  label_count integer := 0;
+begin
+  lock table public.archetype_population_counts in exclusive mode;
+  delete from public.archetype_population_counts;
+  insert into public.archetype_population_counts (archetype, user_count)
+  select public.archetype_label(primary_archetype), count(*)
+  from public.users
+  where public.archetype_label(primary_archetype) is not null
+  group by 1;
+  get diagnostics label_count = row_count;
+  return label_count;
+end;
+$$;
+
+create or replace function public.get_archetype_population_counts()
+returns table (archetype text, user_count bigint)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select c.archetype, c.user_count
+  from public.archetype_population_counts c
+  where c.user_count > 0
+  order by c.archetype
+$$;
+
+begin;
+-- Hold off archetype writes between installing the trigger and the initial count
+lock table public.users in share row exclusive mode;
+
+drop trigger if exists users_archetype_population on public.users;
+create trigger users_archetype_population
+  after insert or delete or update of primary_archetype on public.users
+  for each row execute function public.track_archetype_population();
+
+select public.refresh_archetype_population_counts();
+commit;
+
+-- Postgres grants EXECUTE to PUBLIC by default; these security definer functions are for the backend only
+revoke execute on function public.get_archetype_population_counts() from public, anon, authenticated;
+revoke execute on function public.refresh_archetype_population_counts() from public, anon, authenticated;
+grant execute on function public.get_archetype_population_counts() to service_role;
+grant execute on function public.refresh_archetype_population_counts() to service_role;
@@ -0,0 +1,38 @@
+-- Bulk write of archetype analyses (/api/objective-2/process-batch)
+-- payload: [{user_id, primary_archetype, archetype_<category>_percentage (x6),
+--            archetype_analyzed_at, tor_notes}, ...]
+-- tor_notes is the full notes JSON (with analysis_results.archetype_analysis),
+-- serialized by the app exactly as the single-student endpoint stores it.
+-- One statement instead of one PATCH round trip per student; the
+-- users_archetype_population trigger keeps the population counts in step.
+
+create or replace function public.bulk_update_archetypes(payload jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  updated_count integer := 0;
+begin
+  update public.users u
+  set primary_archetype = p.item ->> 'primary_archetype',
+      archetype_realistic_percentage = (p.item ->> 'archetype_realistic_percentage')::numeric,
+      archetype_investigative_percentage = (p.item ->> 'archetype_investigative_percentage')::numeric,
+      archetype_artistic_percentage = (p.item ->> 'archetype_artistic_percentage')::numeric,
+      archetype_social_percentage = (p.item ->> 'archetype_social_percentage')::numeric,
+      archetype_enterprising_percentage = (p.item ->> 'archetype_enterprising_percentage')::numeric,
+      archetype_conventional_percentage = (p.item ->> 'archetype_conventional_percentage')::numeric,
+      archetype_analyzed_at = coalesce((p.item ->> 'archetype_analyzed_at')::timestamptz, now()),
+      tor_notes = case when p.item ? 'tor_notes' then p.item ->> 'tor_notes' else u.tor_notes end
+  from jsonb_array_elements(payload) as p(item)
+  where u.user_id = (p.item ->> 'user_id')::bigint;
+
+  get diagnostics updated_count = row_count;
+  return updated_count;
+end;
+$$;
+
+-- Postgres grants EXECUTE to PUBLIC by default; this security definer function is for the backend only
+revoke execute on function public.bulk_update_archetypes(jsonb) from public, anon, authenticated;
+grant execute on function public.bulk_update_archetypes(jsonb) to service_role;
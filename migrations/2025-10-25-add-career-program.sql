@@ -0,0 +1,41 @@
+-- Program (program_models.json code, e.g. 'IT', 'CS') whose model produced each stored career forecast.
+-- The stale-forecast recompute (app/services/forecast_recompute.py) filters on it, so a run for one
+-- program no longer pages through every other program's users. Rows that predate this column stay null
+-- until a recompute (or a new forecast) stamps them.
+
+alter table if exists public.users
+  add column if not exists career_program text;
+
+comment on column public.users.career_program is 'Program whose model produced career_top_jobs';
+
+create index if not exists idx_users_career_program_user_id
+  on public.users (career_program, user_id);
+
+-- Bulk writer also stores the program (kept as is when the payload has none)
+create or replace function public.bulk_update_career_forecasts(payload jsonb)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  updated_count integer := 0;
+begin
+  update public.users u
+  set career_top_jobs = array(select jsonb_array_elements_text(p.item -> 'career_top_jobs')),
+      career_top_jobs_scores = array(select (jsonb_array_elements_text(p.item -> 'career_top_jobs_scores'))::numeric),
+      career_model_version = p.item ->> 'career_model_version',
+      career_forecast_key = p.item ->> 'career_forecast_key',
+      career_program = coalesce(p.item ->> 'career_program', u.career_program),
+      career_forecast_analyzed_at = coalesce((p.item ->> 'career_forecast_analyzed_at')::timestamptz, now())
+  from jsonb_array_elements(payload) as p(item)
+  where u.user_id = (p.item ->> 'user_id')::bigint;
+
+  get diagnostics updated_count = row_count;
+  return updated_count;
+end;
+$$;
+
+-- Postgres grants EXECUTE to PUBLIC by default; this security definer function is for the backend only
+revoke execute on function public.bulk_update_career_forecasts(jsonb) from public, anon, authenticated;
+grant execute on function public.bulk_update_career_forecasts(jsonb) to service_role;
@@ -0,0 +1,44 @@
+import sys
+import os
+
+import numpy as np
+
+# Add current directory to path so we can import app
+sys.path.append(os.getcwd())
+
+from app.routes.subject_master_list import SUBJECT_MASTER_DICT
+from app.services.feature_builder import FILL_VALUE, get_feature_builder
+
+
+def test_tor_scale_grades():
+    print("Testing TOR-scale (1.00-5.00) grade objects...")
+    builder = get_feature_builder('CS')
+    keys = builder.columns[:3]
+    grades = [
+        {'courseCode': keys[0], 'subject': SUBJECT_MASTER_DICT[keys[0]]['title'], 'grade': 1.0},
+        {'courseCode': keys[1], 'subject': SUBJECT_MASTER_DICT[keys[1]]['title'], 'grade': 4.5},
+        {'courseCode': keys[2], 'subject': SUBJECT_MASTER_DICT[keys[2]]['title'], 'grade': 5.0},
+    ]
+    values, mask, info = builder.build(grades)
+
+    # Every grade on the TOR scale is used, including 4.25-5.00
+    assert mask[:3].all(), f"grades dropped: mask={mask[:3]}, info={info}"
+    assert info['invalid'] == 0, info
+    # 1.00 (best) -> 4.0 ... 5.00 (failed) -> 0.0 on the model scale
+    assert np.allclose(values[:3], [4.0, 0.5, 0.0]), values[:3]
+    assert not mask[3:].any() and np.all(values[3:] == FILL_VALUE)
+    print("Success! 1.00, 4.50 and 5.00 are all placed on the model scale.")
+
+
+def test_plain_arrays_keep_model_scale():
+    print("Testing plain numeric arrays...")
+    values, mask, info = get_feature_builder('IT').build([3.5, 4.0, 5.0])
+    assert info['mode'] == 'positional', info
+    # Arrays are read as model-scale values (0..4) as before; 5.0 is out of range there
+    assert np.allclose(values[:2], [3.5, 4.0]) and mask[:2].all() and not mask[2], (values[:3], mask[:3])
+    print("Success! Plain arrays are unchanged.")
+
+
+if __name__ == '__main__':
+    test_tor_scale_grades()
+    test_plain_arrays_keep_model_scale()